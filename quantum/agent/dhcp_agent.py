@@ -43,6 +43,12 @@ NS_PREFIX = 'qdhcp-'
 METADATA_DEFAULT_IP = '169.254.169.254/16'
 METADATA_PORT = 80
 
+# Actions on a network, see NetworkEventQueue
+RELOAD = 'reload'
+REFRESH = 'refresh'
+ENABLE = 'enable'
+DISABLE = 'disable'
+
 
 class DhcpAgent(object):
     OPTS = [
@@ -54,7 +60,14 @@ class DhcpAgent(object):
         cfg.BoolOpt('use_namespaces', default=True,
                     help=_("Allow overlapping IP.")),
         cfg.BoolOpt('enable_isolated_metadata', default=False,
-                    help=_("Support Metadata requests on isolated networks."))
+                    help=_("Support Metadata requests on isolated networks.")),
+        cfg.FloatOpt('network_event_delay', default=0.5,
+                     help=_("Seconds to wait after the first notification "
+                            "about a network before processing it, the "
+                            "notifications received meanwhile are "
+                            "processed at once.")),
+        cfg.IntOpt('network_workers', default=8,
+                   help=_("Number of networks processed concurrently.")),
     ]
 
     def __init__(self, conf):
@@ -69,6 +82,9 @@ class DhcpAgent(object):
 
         self.device_manager = DeviceManager(self.conf, self.plugin_rpc)
         self.notifications = agent_rpc.NotificationDispatcher()
+        self.network_events = NetworkEventQueue(self.process_network_event,
+                                                conf.network_event_delay,
+                                                conf.network_workers)
         self.lease_relay = DhcpLeaseRelay(self.update_lease)
 
     def run(self):
@@ -114,11 +130,14 @@ class DhcpAgent(object):
 
         try:
             active_networks = set(self.plugin_rpc.get_active_networks())
+            # The networks are refreshed concurrently by the workers of
+            # the network events, a network whose allocations did not
+            # change is not reloaded
             for deleted_id in known_networks - active_networks:
-                self.disable_dhcp_helper(deleted_id)
+                self.network_events.add(deleted_id, DISABLE, delay=0)
 
             for network_id in active_networks:
-                self.refresh_dhcp_helper(network_id)
+                self.network_events.add(network_id, REFRESH, delay=0)
         except:
             self.needs_resync = True
             LOG.exception(_('Unable to sync network state.'))
@@ -181,6 +200,10 @@ class DhcpAgent(object):
             LOG.exception(_('Network %s RPC info call failed.'), network_id)
             return
 
+        if not network.admin_state_up:
+            self.disable_dhcp_helper(network.id)
+            return
+
         old_cidrs = set(s.cidr for s in old_network.subnets if s.enable_dhcp)
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
@@ -193,27 +216,40 @@ class DhcpAgent(object):
         else:
             self.disable_dhcp_helper(network.id)
 
+    def process_network_event(self, network_id, action):
+        """Apply the action coalesced from the events of the network."""
+        if action == ENABLE:
+            self.enable_dhcp_helper(network_id)
+        elif action == DISABLE:
+            self.disable_dhcp_helper(network_id)
+        elif action == REFRESH:
+            self.refresh_dhcp_helper(network_id)
+        else:
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                self.call_driver('reload_allocations', network)
+
     def network_create_end(self, payload):
         """Handle the network.create.end notification event."""
         network_id = payload['network']['id']
-        self.enable_dhcp_helper(network_id)
+        self.network_events.add(network_id, ENABLE)
 
     def network_update_end(self, payload):
         """Handle the network.update.end notification event."""
         network_id = payload['network']['id']
         if payload['network']['admin_state_up']:
-            self.enable_dhcp_helper(network_id)
+            self.network_events.add(network_id, ENABLE)
         else:
-            self.disable_dhcp_helper(network_id)
+            self.network_events.add(network_id, DISABLE)
 
     def network_delete_end(self, payload):
         """Handle the network.delete.end notification event."""
-        self.disable_dhcp_helper(payload['network_id'])
+        self.network_events.add(payload['network_id'], DISABLE)
 
     def subnet_update_end(self, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        self.network_events.add(network_id, REFRESH)
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
@@ -223,7 +259,7 @@ class DhcpAgent(object):
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            self.network_events.add(network.id, REFRESH)
 
     def port_update_end(self, payload):
         """Handle the port.update.end notification event."""
@@ -231,7 +267,7 @@ class DhcpAgent(object):
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self.network_events.add(network.id, RELOAD)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -242,7 +278,7 @@ class DhcpAgent(object):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.network_events.add(network.id, RELOAD)
 
     def enable_isolated_metadata_proxy(self, network):
         def callback(pid_file):
@@ -337,6 +373,64 @@ class DhcpPluginApi(proxy.RpcProxy):
                   topic=self.topic)
 
 
+class NetworkEventQueue(object):
+    """Coalesces the notifications about each network.
+
+    A network is processed delay seconds after its first notification, the
+    actions queued for it meanwhile are merged: ENABLE and DISABLE replace
+    the pending action, REFRESH replaces it unless it is a DISABLE, which
+    only an ENABLE overrides. RELOAD only applies if nothing is pending
+    since the port changes are already in the cache. So a burst of port
+    notifications leads to a single reload of the DHCP server.
+
+    Different networks are processed concurrently by a pool of workers, a
+    network is only processed by one worker at a time.
+    """
+
+    def __init__(self, process, delay, workers):
+        self.process = process
+        self.delay = delay
+        self.pool = eventlet.GreenPool(workers)
+        self.pending = {}
+        self.in_progress = set()
+
+    def add(self, network_id, action, delay=None):
+        """Queue the action for the network.
+
+        The network is processed after delay seconds, the delay of the
+        queue by default.
+        """
+        pending = self.pending.get(network_id)
+        if action == RELOAD and pending:
+            return
+        if action == REFRESH and pending == DISABLE:
+            # e.g. a subnet update following the network going down
+            return
+        self.pending[network_id] = action
+        if not pending and network_id not in self.in_progress:
+            # The worker processing the network picks the action up
+            # when it is done otherwise
+            if delay is None:
+                delay = self.delay
+            eventlet.spawn_after(delay, self.pool.spawn_n,
+                                 self._process_network, network_id)
+
+    def _process_network(self, network_id):
+        if network_id in self.in_progress:
+            return
+        self.in_progress.add(network_id)
+        try:
+            while network_id in self.pending:
+                action = self.pending.pop(network_id)
+                try:
+                    self.process(network_id, action)
+                except Exception:
+                    LOG.exception(_('Unable to process network %s.'),
+                                  network_id)
+        finally:
+            self.in_progress.discard(network_id)
+
+
 class NetworkCache(object):
     """Agent cache of the current network state."""
     def __init__(self):
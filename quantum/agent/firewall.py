@@ -82,6 +82,15 @@ class FirewallDriver(object):
         """Stop filtering port"""
         raise NotImplementedError()
 
+    def update_security_group_members(self, sg_id, member_ips):
+        """Update the IP addresses of the members of a security group
+
+        Only used by the drivers matching the members of the
+        source groups of the rules themselves.
+        member_ips maps each ethertype to a list of IP addresses.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule"""
         pass
@@ -124,6 +133,9 @@ class NoopFirewallDriver(FirewallDriver):
     def remove_port_filter(self, port):
         pass
 
+    def update_security_group_members(self, sg_id, member_ips):
+        pass
+
     def filter_defer_apply_on(self):
         pass
 
@@ -19,9 +19,12 @@
 #
 """
 
+import itertools
 import sys
+import time
 
 import eventlet
+from eventlet import queue
 from eventlet import semaphore
 import netaddr
 
@@ -50,12 +53,18 @@ NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
 
+# The updates notified by the server are processed before the resync ones
+PRIORITY_RPC = 0
+PRIORITY_SYNC = 1
+
 
 class L3PluginApi(proxy.RpcProxy):
     """Agent side of the l3 agent RPC API.
 
     API version history:
         1.0 - Initial version.
+        1.3 - Add get_changed_routers, versions 1.1 and 1.2 of the plugins
+              added the security group and device list calls.
 
     """
 
@@ -66,15 +75,28 @@ class L3PluginApi(proxy.RpcProxy):
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
 
-    def get_routers(self, context, fullsync=True, router_id=None):
+    def get_routers(self, context, fullsync=True, router_ids=None):
         """Make a remote process call to retrieve the sync data for routers."""
-        router_ids = [router_id] if router_id else None
         return self.call(context,
                          self.make_msg('sync_routers', host=self.host,
                                        fullsync=fullsync,
                                        router_ids=router_ids),
                          topic=self.topic)
 
+    def get_changed_routers(self, context, router_revisions,
+                            router_ids=None):
+        """Make a remote process call to compare the router revisions.
+
+        @return: the ids of the routers changed since router_revisions in
+                 'changed_router_ids' and of the deleted ones in
+                 'deleted_router_ids'
+        """
+        return self.call(context,
+                         self.make_msg('get_changed_routers', host=self.host,
+                                       router_revisions=router_revisions,
+                                       router_ids=router_ids),
+                         topic=self.topic, version='1.3')
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -108,6 +130,25 @@ class RouterInfo(object):
             return NS_PREFIX + self.router_id
 
 
+class RouterUpdate(object):
+    """An update of a router queued for processing.
+
+    router is the router data to process, or None if the router was
+    deleted. The updates are ordered by priority, then by sequence.
+    external is the state of the external network when the update was
+    received, see L3NATAgent._get_external_state, or None if the worker
+    has to check it.
+    """
+
+    def __init__(self, router_id, priority, seq, router=None,
+                 external=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.seq = seq
+        self.router = router
+        self.external = external
+
+
 class L3NATAgent(manager.Manager):
 
     OPTS = [
@@ -141,6 +182,11 @@ class L3NATAgent(manager.Manager):
         cfg.StrOpt('l3_agent_manager',
                    default='quantum.agent.l3_agent.L3NATAgent',
                    help=_("The Quantum L3 Agent manager.")),
+        cfg.IntOpt('router_workers', default=8,
+                   help=_("Number of routers processed concurrently.")),
+        cfg.IntOpt('sync_routers_page_size', default=100,
+                   help=_("Maximum number of routers fetched by each "
+                          "request of a resync.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -164,6 +210,16 @@ class L3NATAgent(manager.Manager):
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
         self.sync_sem = semaphore.Semaphore(1)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pool = eventlet.GreenPool(self.conf.router_workers)
+        # sequence of the last update notified for each router
+        self._router_rpc_seq = {}
+        # revision of the routers processed successfully
+        self._router_revisions = {}
+        # routers being processed and their next update
+        self._routers_in_progress = set()
+        self._pending_updates = {}
         if self.conf.use_namespaces:
             self._destroy_all_router_namespaces()
         super(L3NATAgent, self).__init__(host=self.conf.host)
@@ -272,6 +328,22 @@ class L3NATAgent(manager.Manager):
         port['ip_cidr'] = "%s/%s" % (ips[0]['ip_address'], prefixlen)
 
     def process_router(self, ri):
+        """Process the changes of the router with a single iptables apply.
+
+        The rules changed for the interfaces, the gateway and the floating
+        IPs of the router are applied at the end with one iptables-restore.
+        """
+        start = time.time()
+        ri.iptables_manager.defer_apply_on()
+        try:
+            self._process_router(ri)
+        finally:
+            ri.iptables_manager.defer_apply_off()
+        LOG.debug(_("Processed router %(router_id)s in %(seconds).3f "
+                    "seconds"),
+                  {'router_id': ri.router_id, 'seconds': time.time() - start})
+
+    def _process_router(self, ri):
 
         ex_gw_port = self._get_ex_gw_port(ri)
         internal_ports = ri.router.get(l3_constants.INTERFACE_KEY, [])
@@ -532,36 +604,103 @@ class L3NATAgent(manager.Manager):
 
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
-        with self.sync_sem:
-            if router_id in self.router_info:
-                try:
-                    self._router_removed(router_id)
-                except Exception:
-                    msg = _("Failed dealing with router "
-                            "'%s' deletion RPC message")
-                    LOG.debug(msg, router_id)
-                    self.fullsync = True
+        self._queue_router_update(router_id, PRIORITY_RPC)
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
         if not routers:
             return
-        with self.sync_sem:
-            try:
-                self._process_routers(routers)
-            except Exception:
-                msg = _("Failed dealing with routers update RPC message")
-                LOG.debug(msg)
-                self.fullsync = True
-
-    def _process_routers(self, routers):
-        if (self.conf.external_network_bridge and
-            not ip_lib.device_exists(self.conf.external_network_bridge)):
-            LOG.error(_("The external network bridge '%s' does not exist"),
-                      self.conf.external_network_bridge)
+        external = self._get_external_state(check_errors=False)
+        for r in routers:
+            self._queue_router_update(r['id'], PRIORITY_RPC, r,
+                                      external=external)
+
+    def _queue_router_update(self, router_id, priority, router=None,
+                             seq=None, external=None):
+        if seq is None:
+            seq = self._seq.next()
+        if priority == PRIORITY_RPC:
+            self._router_rpc_seq[router_id] = seq
+        update = RouterUpdate(router_id, priority, seq, router, external)
+        self._queue.put((priority, self._seq.next(), update))
+
+    def _process_router_updates(self):
+        """Hand the queued router updates over to the worker pool."""
+        while True:
+            priority, seq, update = self._queue.get()
+            # Waits for a free worker, so that the updates queued in the
+            # meantime with a higher priority are processed first
+            self._pool.spawn_n(self._process_router_update, update)
+
+    def _process_router_update(self, update):
+        router_id = update.router_id
+        if router_id in self._routers_in_progress:
+            # The worker processing the router handles the most recent
+            # update when it is done
+            pending = self._pending_updates.get(router_id)
+            if not pending or pending.seq < update.seq:
+                self._pending_updates[router_id] = update
+            return
+        self._routers_in_progress.add(router_id)
+        try:
+            while update:
+                self._apply_router_update(update)
+                update = self._pending_updates.pop(router_id, None)
+        finally:
+            self._routers_in_progress.discard(router_id)
+
+    def _apply_router_update(self, update):
+        router_id = update.router_id
+        if (update.priority == PRIORITY_SYNC and
+            self._router_rpc_seq.get(router_id, -1) > update.seq):
+            LOG.debug(_("Skipping the resync of router %s, it was updated "
+                        "since"), router_id)
+            return
+        try:
+            if update.router is None:
+                self._router_revisions.pop(router_id, None)
+                if router_id in self.router_info:
+                    self._router_removed(router_id)
+                return
+            if router_id not in self._router_revisions:
+                # The router failed or was never processed, rebuild it
+                # from scratch
+                self.router_info.pop(router_id, None)
+            self._process_routers([update.router], update.external)
+            self._router_revisions[router_id] = update.router.get('revision')
+        except Exception:
+            LOG.exception(_("Failed processing router %s"), router_id)
+            # the next resync fetches the router again
+            self._router_revisions.pop(router_id, None)
+            self.fullsync = True
+
+    def _get_external_state(self, check_errors=True):
+        """Check the external bridge and fetch the external network id.
+
+        This is done once for a batch of routers, e.g. a resync, rather than
+        once per router. Returns a (bridge_exists, external network id)
+        tuple. If check_errors is False, errors are logged and None is
+        returned, the workers then check the state themselves.
+        """
+        try:
+            if (self.conf.external_network_bridge and
+                not ip_lib.device_exists(self.conf.external_network_bridge)):
+                LOG.error(_("The external network bridge '%s' does not "
+                            "exist"), self.conf.external_network_bridge)
+                return (False, None)
+            return (True, self._fetch_external_net_id())
+        except Exception:
+            if check_errors:
+                raise
+            LOG.exception(_("Failed checking the external network"))
+            return None
+
+    def _process_routers(self, routers, external=None):
+        if external is None:
+            external = self._get_external_state()
+        bridge_exists, target_ex_net_id = external
+        if not bridge_exists:
             return
-
-        target_ex_net_id = self._fetch_external_net_id()
 
         for r in routers:
             if not r['admin_state_up']:
@@ -589,24 +728,67 @@ class L3NATAgent(manager.Manager):
 
     @periodic_task.periodic_task
     def _sync_routers_task(self, context):
-        # we need to sync with router deletion RPC message
         with self.sync_sem:
             if self.fullsync:
                 try:
                     if not self.conf.use_namespaces:
-                        router_id = self.conf.router_id
+                        router_ids = [self.conf.router_id]
                     else:
-                        router_id = None
-                    routers = self.plugin_rpc.get_routers(
-                        context, router_id)
-                    self.router_info = {}
-                    self._process_routers(routers)
+                        router_ids = None
+                    # the updates notified after this point are more
+                    # recent than the routers fetched
+                    seq = self._seq.next()
+                    self._sync_routers(context, router_ids, seq)
                     self.fullsync = False
                 except Exception:
                     LOG.exception(_("Failed synchronizing routers"))
                     self.fullsync = True
 
+    def _sync_routers(self, context, router_ids, seq):
+        # only the routers changed since these revisions are fetched, a
+        # None revision refetches the router
+        known = dict((r_id, self._router_revisions.get(r_id))
+                     for r_id in (set(self.router_info) |
+                                  set(self._router_revisions)))
+        try:
+            changes = self.plugin_rpc.get_changed_routers(
+                context, known, router_ids=router_ids)
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.info(_("The server does not report router changes, "
+                       "fetching all of the routers"))
+            routers = self.plugin_rpc.get_routers(context,
+                                                  router_ids=router_ids)
+            changed_ids = [r['id'] for r in routers]
+            deleted_ids = set(known) - set(changed_ids)
+        else:
+            changed_ids = changes['changed_router_ids']
+            deleted_ids = changes['deleted_router_ids']
+            routers = None
+        for deleted_id in deleted_ids:
+            self._queue_router_update(deleted_id, PRIORITY_SYNC, seq=seq)
+        if not changed_ids:
+            return
+        external = self._get_external_state()
+        page_size = self.conf.sync_routers_page_size
+        for i in xrange(0, len(changed_ids), page_size):
+            page = changed_ids[i:i + page_size]
+            if routers is None:
+                page_routers = self.plugin_rpc.get_routers(context,
+                                                           router_ids=page)
+            else:
+                page_routers = routers[i:i + page_size]
+            for r in page_routers:
+                self._queue_router_update(r['id'], PRIORITY_SYNC, r, seq=seq,
+                                          external=external)
+            # routers deleted since get_changed_routers
+            for deleted_id in (set(page) -
+                               set(r['id'] for r in page_routers)):
+                self._queue_router_update(deleted_id, PRIORITY_SYNC, seq=seq)
+
     def after_start(self):
+        eventlet.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
 
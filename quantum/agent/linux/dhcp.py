@@ -109,7 +109,12 @@ class DhcpLocalProcess(DhcpBase):
         interface_name = self.device_delegate.setup(self.network,
                                                     reuse_existing=True)
         if self.active:
-            self.restart()
+            if self._process_up_to_date():
+                # e.g. the agent restarted: the files are only rewritten
+                # and the process signaled if they changed
+                self.reload_allocations()
+            else:
+                self.restart()
         elif self._enable_dhcp():
             self.interface_name = interface_name
             self.spawn_process()
@@ -189,6 +194,10 @@ class DhcpLocalProcess(DhcpBase):
                                                       ensure_conf_dir=True)
         replace_file(interface_file_path, value)
 
+    def _process_up_to_date(self):
+        """Whether the running process was spawned as it would be now."""
+        return False
+
     @abc.abstractmethod
     def spawn_process(self):
         pass
@@ -215,6 +224,19 @@ class Dnsmasq(DhcpLocalProcess):
             self.conf.dhcp_lease_relay_socket
         }
 
+        cmd = self._build_cmdline()
+        self._output_hosts_file()
+        self._output_opts_file()
+
+        if self.namespace:
+            ip_wrapper = ip_lib.IPWrapper(self.root_helper, self.namespace)
+            ip_wrapper.netns.execute(cmd, addl_env=env)
+        else:
+            # For normal sudo prepend the env vars before command
+            cmd = ['%s=%s' % pair for pair in env.items()] + cmd
+            utils.execute(cmd, self.root_helper)
+
+    def _build_cmdline(self):
         cmd = [
             'dnsmasq',
             '--no-hosts',
@@ -227,8 +249,8 @@ class Dnsmasq(DhcpLocalProcess):
                 'pid', ensure_conf_dir=True),
             #TODO (mark): calculate value from cidr (defaults to 150)
             #'--dhcp-lease-max=%s' % ?,
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
-            '--dhcp-optsfile=%s' % self._output_opts_file(),
+            '--dhcp-hostsfile=%s' % self.get_conf_file_name('host'),
+            '--dhcp-optsfile=%s' % self.get_conf_file_name('opts'),
             '--dhcp-script=%s' % self._lease_relay_script_path(),
             '--leasefile-ro',
         ]
@@ -255,14 +277,24 @@ class Dnsmasq(DhcpLocalProcess):
 
         if self.conf.dhcp_domain:
             cmd.append('--domain=%s' % self.conf.dhcp_domain)
+        return cmd
 
-        if self.namespace:
-            ip_wrapper = ip_lib.IPWrapper(self.root_helper, self.namespace)
-            ip_wrapper.netns.execute(cmd, addl_env=env)
-        else:
-            # For normal sudo prepend the env vars before command
-            cmd = ['%s=%s' % pair for pair in env.items()] + cmd
-            utils.execute(cmd, self.root_helper)
+    def _process_up_to_date(self):
+        """Whether the running dnsmasq has the options it would get now.
+
+        The hosts and opts files can be reloaded, but a change of the
+        subnets, of the interface or of the configuration needs a restart.
+        """
+        cmd = ['cat', '/proc/%s/cmdline' % self.pid]
+        try:
+            cmdline = utils.execute(cmd, self.root_helper)
+        except RuntimeError:
+            return False
+        running = cmdline.rstrip('\0').split('\0')
+        expected = self._build_cmdline()
+        # rootwrap runs dnsmasq by its full path
+        return (os.path.basename(running[0]) == expected[0] and
+                running[1:] == expected[1:])
 
     def reload_allocations(self):
         """Rebuild the dnsmasq config and signal the dnsmasq to reload."""
@@ -274,8 +306,14 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
+        hosts_changed = replace_file_if_changed(
+            self.get_conf_file_name('host'), self._hosts_file_data())
+        opts_changed = replace_file_if_changed(
+            self.get_conf_file_name('opts'), self._opts_file_data())
+        if not (hosts_changed or opts_changed):
+            LOG.debug(_('Allocations unchanged for network: %s'),
+                      self.network.id)
+            return
         cmd = ['kill', '-HUP', self.pid]
 
         if self.namespace:
@@ -287,6 +325,11 @@ class Dnsmasq(DhcpLocalProcess):
 
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible hosts file."""
+        name = self.get_conf_file_name('host')
+        replace_file(name, self._hosts_file_data())
+        return name
+
+    def _hosts_file_data(self):
         r = re.compile('[:.]')
         buf = StringIO.StringIO()
 
@@ -296,14 +339,15 @@ class Dnsmasq(DhcpLocalProcess):
                                   self.conf.dhcp_domain)
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, alloc.ip_address))
-
-        name = self.get_conf_file_name('host')
-        replace_file(name, buf.getvalue())
-        return name
+        return buf.getvalue()
 
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
+        name = self.get_conf_file_name('opts')
+        replace_file(name, self._opts_file_data())
+        return name
 
+    def _opts_file_data(self):
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
 
@@ -343,9 +387,7 @@ class Dnsmasq(DhcpLocalProcess):
                 else:
                     options.append(self._format_option(i, 'router'))
 
-        name = self.get_conf_file_name('opts')
-        replace_file(name, '\n'.join(options))
-        return name
+        return '\n'.join(options)
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
@@ -419,3 +461,18 @@ def replace_file(file_name, data):
     tmp_file.close()
     os.chmod(tmp_file.name, 0644)
     os.rename(tmp_file.name, file_name)
+
+
+def replace_file_if_changed(file_name, data):
+    """Replaces the contents of file_name with data if they differ.
+
+    Returns whether the file was replaced.
+    """
+    try:
+        with open(file_name, 'r') as f:
+            if f.read() == data:
+                return False
+    except IOError:
+        pass
+    replace_file(file_name, data)
+    return True
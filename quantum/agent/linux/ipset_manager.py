@@ -0,0 +1,84 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages sets of IP addresses with ipset."""
+
+from quantum.agent.linux import utils
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+# NOTE: ipset names are limited to 31 characters
+IPSET_NAME_MAX_LENGTH = 31
+IPSET_FAMILY = {'IPv4': 'inet',
+                'IPv6': 'inet6'}
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps track of the members of the sets it created, so that updating a
+    set only adds and deletes the addresses which changed. The changes of
+    a set are applied with a single ipset restore.
+    """
+
+    def __init__(self, _execute=None, root_helper=None):
+        if _execute:
+            self.execute = _execute
+        else:
+            self.execute = utils.execute
+        self.root_helper = root_helper
+        self.sets = {}
+
+    @staticmethod
+    def get_name(ethertype, id):
+        return ('%s%s' % (ethertype, id))[:IPSET_NAME_MAX_LENGTH]
+
+    def set_members(self, name, ethertype, members):
+        """Creates or updates the named set to hold exactly members."""
+        commands = []
+        old_members = self.sets.get(name)
+        if old_members is None:
+            # The set may be left over by a previous run of the agent
+            commands.append('create %s hash:ip family %s' %
+                            (name, IPSET_FAMILY[ethertype]))
+            commands.append('flush %s' % name)
+            old_members = set()
+        new_members = set(members)
+        commands += ['add %s %s' % (name, ip)
+                     for ip in new_members - old_members]
+        commands += ['del %s %s' % (name, ip)
+                     for ip in old_members - new_members]
+        if commands:
+            # The set is only recorded once it was created, so that a
+            # failed restore creates it again on the next call
+            self._restore(commands)
+        self.sets[name] = new_members
+
+    def destroy(self, name):
+        """Destroys the named set, it must not be used by any rule."""
+        if name not in self.sets:
+            return
+        self.execute(['ipset', 'destroy', name],
+                     root_helper=self.root_helper,
+                     check_exit_code=False)
+        del self.sets[name]
+
+    def _restore(self, commands):
+        LOG.debug(_("Updating ipsets: %s"), commands)
+        self.execute(['ipset', 'restore', '-exist'],
+                     process_input='\n'.join(commands) + '\n',
+                     root_helper=self.root_helper)
@@ -18,6 +18,7 @@
 import netaddr
 
 from quantum.agent import firewall
+from quantum.agent.linux import ipset_manager
 from quantum.agent.linux import iptables_manager
 from quantum.common import constants
 from quantum.openstack.common import cfg
@@ -25,6 +26,8 @@ from quantum.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('enable_ipset', 'quantum.agent.securitygroups_rpc',
+                    group='SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -42,9 +45,15 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
             use_ipv6=True)
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        if self.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
         # list of port which has security group
         self.filtered_ports = {}
         self._add_fallback_chain_v4v6()
+        self._add_chain_by_name_v4v6(SG_CHAIN)
+        self._add_rule_to_chain_v4v6(SG_CHAIN, ['-j ACCEPT'], ['-j ACCEPT'])
 
     @property
     def ports(self):
@@ -52,10 +61,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
-        self._remove_chains()
+        old_port = self.filtered_ports.get(port['device'])
+        if old_port:
+            self._remove_chains(old_port)
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
-        self._setup_chains()
+        self._setup_chains(port)
         self.iptables.apply()
 
     def update_port_filter(self, port):
@@ -64,9 +75,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             LOG.info(_('Attempted to update port filter which is not '
                        'filtered %s'), port['device'])
             return
-        self._remove_chains()
+        self._remove_chains(self.filtered_ports[port['device']])
         self.filtered_ports[port['device']] = port
-        self._setup_chains()
+        self._setup_chains(port)
         self.iptables.apply()
 
     def remove_port_filter(self, port):
@@ -75,26 +86,52 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             LOG.info(_('Attempted to remove port filter which is not '
                        'filtered %r'), port)
             return
-        self._remove_chains()
-        self.filtered_ports.pop(port['device'], None)
-        self._setup_chains()
+        self._remove_chains(self.filtered_ports.pop(port['device']))
         self.iptables.apply()
+        if not self.iptables.iptables_apply_deferred:
+            self._remove_unused_ipsets()
 
-    def _setup_chains(self):
-        """Setup ingress and egress chain for a port. """
-        self._add_chain_by_name_v4v6(SG_CHAIN)
-        for port in self.filtered_ports.values():
-            self._setup_chain(port, INGRESS_DIRECTION)
-            self._setup_chain(port, EGRESS_DIRECTION)
-            self.iptables.ipv4['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
-            self.iptables.ipv6['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
+    def update_security_group_members(self, sg_id, member_ips):
+        if not self.enable_ipset:
+            return
+        for ethertype in (constants.IPv4, constants.IPv6):
+            self.ipset.set_members(self.ipset.get_name(ethertype, sg_id),
+                                   ethertype,
+                                   member_ips.get(ethertype, []))
 
-    def _remove_chains(self):
-        """Remove ingress and egress chain for a port"""
+    def _remove_unused_ipsets(self):
+        """Destroy the ipsets no longer matched by any rule.
+
+        This must be done once the rules using them have been applied.
+        """
+        if not self.enable_ipset:
+            return
+        used = set()
         for port in self.filtered_ports.values():
-            self._remove_chain(port, INGRESS_DIRECTION)
-            self._remove_chain(port, EGRESS_DIRECTION)
-        self._remove_chain_by_name_v4v6(SG_CHAIN)
+            for rule in port.get('security_group_rules', []):
+                if rule.get('source_group_id'):
+                    used.add(self.ipset.get_name(rule['ethertype'],
+                                                 rule['source_group_id']))
+        for name in set(self.ipset.sets) - used:
+            self.ipset.destroy(name)
+
+    def _setup_chains(self, port):
+        """Setup ingress and egress chain for a port.
+
+        Only the chains and rules of this port are added, the other
+        filtered ports are left untouched.
+        """
+        self._setup_chain(port, INGRESS_DIRECTION)
+        self._setup_chain(port, EGRESS_DIRECTION)
+
+    def _remove_chains(self, port):
+        """Remove ingress and egress chain for a port"""
+        for direction in (INGRESS_DIRECTION, EGRESS_DIRECTION):
+            self._remove_chain(port, direction)
+            # Removing the chain removes the jumps to it, the jump to
+            # SG_CHAIN is removed separately
+            jump_rule = self._physdev_jump_rule(port, direction, SG_CHAIN)
+            self._remove_rule_from_chain_v4v6('FORWARD', jump_rule)
 
     def _setup_chain(self, port, DIRECTION):
         self._add_chain(port, DIRECTION)
@@ -125,6 +162,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         for rule in ipv6_rules:
             self.iptables.ipv6['filter'].add_rule(chain_name, rule)
 
+    def _remove_rule_from_chain_v4v6(self, chain_name, rule):
+        self.iptables.ipv4['filter'].remove_rule(chain_name, rule)
+        self.iptables.ipv6['filter'].remove_rule(chain_name, rule)
+
     def _get_device_name(self, port):
         return port['device']
 
@@ -138,23 +179,25 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         # We accept the packet at the end of SG_CHAIN.
 
         # jump to the security group chain
-        device = self._get_device_name(port)
-        jump_rule = ['-m physdev --physdev-is-bridged --%s '
-                     '%s -j $%s' % (self.IPTABLES_DIRECTION[direction],
-                                    device,
-                                    SG_CHAIN)]
+        jump_rule = [self._physdev_jump_rule(port, direction, SG_CHAIN)]
         self._add_rule_to_chain_v4v6('FORWARD', jump_rule, jump_rule)
 
-        # jump to the chain based on the device
-        jump_rule = ['-m physdev --physdev-is-bridged --%s '
-                     '%s -j $%s' % (self.IPTABLES_DIRECTION[direction],
-                                    device,
-                                    chain_name)]
-        self._add_rule_to_chain_v4v6(SG_CHAIN, jump_rule, jump_rule)
+        # jump to the chain based on the device, above the final ACCEPT of
+        # SG_CHAIN so that the other rules are left untouched
+        jump_rule = [self._physdev_jump_rule(port, direction, chain_name)]
+        for table in (self.iptables.ipv4, self.iptables.ipv6):
+            table['filter'].add_rule(SG_CHAIN, jump_rule[0], top=True)
 
         if direction == EGRESS_DIRECTION:
             self._add_rule_to_chain_v4v6('INPUT', jump_rule, jump_rule)
 
+    def _physdev_jump_rule(self, port, direction, chain_name):
+        device = self._get_device_name(port)
+        return ('-m physdev --physdev-is-bridged --%s '
+                '%s -j $%s' % (self.IPTABLES_DIRECTION[direction],
+                               device,
+                               chain_name))
+
     def _split_sgr_by_ethertype(self, security_group_rules):
         ipv4_sg_rules = []
         ipv6_sg_rules = []
@@ -234,6 +277,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                         rule.get('source_ip_prefix'))
             args += self._ip_prefix_arg('d',
                                         rule.get('dest_ip_prefix'))
+            args += self._source_group_arg(rule)
             iptables_rules += [' '.join(args)]
 
         iptables_rules += ['-j $sg-fallback']
@@ -273,6 +317,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _source_group_arg(self, rule):
+        #NOTE: without ipset, source_group_id rules are converted to
+        # source_ip_prefix rules in server side
+        source_group_id = rule.get('source_group_id')
+        if not (self.enable_ipset and source_group_id):
+            return []
+        set_name = ipset_manager.IpsetManager.get_name(rule['ethertype'],
+                                                       source_group_id)
+        if rule['direction'] == INGRESS_DIRECTION:
+            return ['-m set --match-set', set_name, 'src']
+        return ['-m set --match-set', set_name, 'dst']
+
     def _port_chain_name(self, port, direction):
         #Note (nati) make chain name short less than 28 char
         # with extra prefix
@@ -285,6 +341,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
 
     def filter_defer_apply_off(self):
         self.iptables.defer_apply_off()
+        self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
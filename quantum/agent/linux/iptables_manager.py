@@ -129,13 +129,13 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
-        self.rules = filter(lambda r: r.chain != name, self.rules)
         if wrap:
             jump_snippet = '-j %s-%s' % (binary_name, name)
         else:
             jump_snippet = '-j %s' % (name,)
 
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+        self.rules = [r for r in self.rules
+                      if r.chain != name and jump_snippet not in r.rule]
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -147,6 +147,8 @@ class IptablesTable(object):
         prepend its name with a '$' which will ensure the wrapping
         is applied correctly.
 
+        The rules added with top=True come first in their chain.
+
         """
         if wrap and chain not in self.chains:
             raise LookupError(_('Unknown chain: %r') % chain)
@@ -166,9 +168,12 @@ class IptablesTable(object):
 
         Note: The rule must be exactly identical to the one that was added.
         You cannot switch arguments around like you can with the iptables
-        CLI tool.
+        CLI tool. The jumps to wrapped chains are written with a '$' like
+        in add_rule.
 
         """
+        if '$' in rule:
+            rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
         except ValueError:
@@ -343,6 +348,7 @@ class IptablesManager(object):
                     break
 
         our_rules = []
+        bot_rules = []
         for rule in rules:
             rule_str = str(rule)
             if rule.top:
@@ -351,7 +357,10 @@ class IptablesManager(object):
                 # list, so here we remove the dupes ahead of time.
                 new_filter = filter(lambda s: s.strip() != rule_str.strip(),
                                     new_filter)
-            our_rules += [rule_str]
+                our_rules += [rule_str]
+            else:
+                bot_rules += [rule_str]
+        our_rules += bot_rules
 
         new_filter[rules_index:rules_index] = our_rules
 
@@ -21,6 +21,7 @@
 import re
 
 from quantum.agent.linux import utils
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -46,6 +47,11 @@ class OVSBridge:
         self.br_name = br_name
         self.root_helper = root_helper
         self.re_id = self.re_compile_id()
+        self.defer_apply = False
+        # ordered list of [kind, [operation, ...]] where kind is 'vsctl',
+        # 'add' or 'del', consecutive operations of the same kind are
+        # applied with a single ovs-vsctl or ovs-ofctl call
+        self.deferred_ops = []
 
     def re_compile_id(self):
         external = 'external_ids\s*'
@@ -57,13 +63,15 @@ class OVSBridge:
                ' \s+ %(name)s \s+ %(port)s' % locals())
         return re.compile(_re, re.M | re.X)
 
-    def run_vsctl(self, args):
+    def run_vsctl(self, args, check_error=False):
         full_args = ["ovs-vsctl", "--timeout=2"] + args
         try:
             return utils.execute(full_args, root_helper=self.root_helper)
         except Exception, e:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': full_args, 'exception': e})
+            if check_error:
+                raise
 
     def reset_bridge(self):
         self.run_vsctl(["--", "--if-exists", "del-br", self.br_name])
@@ -80,19 +88,74 @@ class OVSBridge:
 
     def set_db_attribute(self, table_name, record, column, value):
         args = ["set", table_name, record, "%s=%s" % (column, value)]
-        self.run_vsctl(args)
+        self._run_vsctl_deferrable(args)
 
     def clear_db_attribute(self, table_name, record, column):
         args = ["clear", table_name, record, column]
-        self.run_vsctl(args)
+        self._run_vsctl_deferrable(args)
 
-    def run_ofctl(self, cmd, args):
+    def _run_vsctl_deferrable(self, args):
+        if self.defer_apply:
+            self._defer_op("vsctl", args)
+        else:
+            self.run_vsctl(args)
+
+    def run_ofctl(self, cmd, args, process_input=None, check_error=False):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
         try:
-            return utils.execute(full_args, root_helper=self.root_helper)
+            return utils.execute(full_args, root_helper=self.root_helper,
+                                 process_input=process_input)
         except Exception, e:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': full_args, 'exception': e})
+            if check_error:
+                raise
+
+    def defer_apply_on(self):
+        """Defer the flow and database modifications of the bridge.
+
+        They are applied by defer_apply_off in the order they were made,
+        with one ovs-ofctl call per sequence of flow additions and one
+        ovs-vsctl call per sequence of database modifications. The flows
+        are deleted one at a time, del-flows does not read them from a file
+        in the supported versions of Open vSwitch.
+        """
+        LOG.debug(_("defer_apply_on on bridge %s"), self.br_name)
+        self.defer_apply = True
+
+    def defer_apply_off(self):
+        """Apply the deferred modifications and stop deferring them.
+
+        Returns False if some of them could not be applied, in which case
+        the caller has to resynchronize the bridge.
+        """
+        LOG.debug(_("defer_apply_off on bridge %s"), self.br_name)
+        self.defer_apply = False
+        deferred_ops, self.deferred_ops = self.deferred_ops, []
+        applied = True
+        for kind, ops in deferred_ops:
+            try:
+                if kind == "vsctl":
+                    args = []
+                    for command in ops:
+                        args += ["--"] + command
+                    self.run_vsctl(args, check_error=True)
+                elif kind == "add":
+                    self.run_ofctl("add-flows", ["-"],
+                                   process_input="\n".join(ops) + "\n",
+                                   check_error=True)
+                else:
+                    for flow in ops:
+                        self.run_ofctl("del-flows", [flow], check_error=True)
+            except Exception:
+                applied = False
+        return applied
+
+    def _defer_op(self, kind, op):
+        if self.deferred_ops and self.deferred_ops[-1][0] == kind:
+            self.deferred_ops[-1][1].append(op)
+        else:
+            self.deferred_ops.append([kind, [op]])
 
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
@@ -149,7 +212,10 @@ class OVSBridge:
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("add-flow", [flow_str])
+        if self.defer_apply:
+            self._defer_op("add", flow_str)
+        else:
+            self.run_ofctl("add-flow", [flow_str])
 
     def delete_flows(self, **kwargs):
         kwargs['delete'] = True
@@ -157,7 +223,10 @@ class OVSBridge:
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("del-flows", [flow_str])
+        if self.defer_apply:
+            self._defer_op("del", flow_str)
+        else:
+            self.run_ofctl("del-flows", [flow_str])
 
     def add_tunnel_port(self, port_name, remote_ip):
         self.run_vsctl(["add-port", self.br_name, port_name])
@@ -188,6 +257,28 @@ class OVSBridge:
         if output:
             return output.rstrip("\n\r")
 
+    def db_list(self, table, columns):
+        """Returns the columns of all the records of table in one call.
+
+        Each record is returned as a dict mapping the column names to their
+        values: maps are converted to dicts, sets to lists.
+        """
+        args = ["--format=json", "--", "--columns=%s" % ",".join(columns),
+                "list", table]
+        output = self.run_vsctl(args)
+        if not output:
+            return []
+        try:
+            result = jsonutils.loads(output)
+            return [dict((heading, _ovsdb_json_to_value(value))
+                         for heading, value in zip(result['headings'], row))
+                    for row in result['data']]
+        except (ValueError, KeyError, TypeError), e:
+            LOG.error(_("Unable to parse the %(table)s records. "
+                        "Exception: %(exception)s"),
+                      {'table': table, 'exception': e})
+            return []
+
     def db_str_to_map(self, full_str):
         list = full_str.strip("{}").split(", ")
         ret = {}
@@ -216,42 +307,45 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
-    # returns a VIF object for each VIF port
-    def get_vif_ports(self):
-        edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
+    def _get_vif_ports_info(self):
+        """Yields (name, ofport, iface_id, mac) for the VIF ports.
+
+        The Interface records of the ports are fetched with a single call,
+        rather than with one call per port and column.
+        """
+        port_names = set(self.get_port_name_list())
+        interfaces = self.db_list("Interface",
+                                  ["name", "external_ids", "ofport"])
+        for interface in interfaces:
+            name = interface["name"]
+            if name not in port_names:
+                continue
+            external_ids = interface["external_ids"]
+            if "attached-mac" not in external_ids:
+                continue
+            if "iface-id" in external_ids:
+                iface_id = external_ids["iface-id"]
+            elif "xs-vif-uuid" in external_ids:
                 # if this is a xenserver and iface-id is not automatically
                 # synced to OVS from XAPI, we grab it from XAPI directly
                 iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
+            else:
+                continue
+            ofport = interface["ofport"]
+            if ofport == []:
+                # no ofport has been assigned to the port yet
+                ofport = -1
+            yield (name, ofport, iface_id, external_ids["attached-mac"])
 
-        return edge_ports
+    # returns a VIF object for each VIF port
+    def get_vif_ports(self):
+        return [VifPort(name, ofport, iface_id, mac, self)
+                for name, ofport, iface_id, mac in self._get_vif_ports_info()]
 
     def get_vif_port_set(self):
-        edge_ports = set()
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
-        return edge_ports
+        return set(iface_id
+                   for _name, _ofport, iface_id, _mac
+                   in self._get_vif_ports_info())
 
     def get_vif_port_by_id(self, port_id):
         args = ['--', '--columns=external_ids,name,ofport',
@@ -281,6 +375,18 @@ class OVSBridge:
             self.delete_port(port_name)
 
 
+def _ovsdb_json_to_value(value):
+    """Converts a value of the OVSDB JSON format to a python value."""
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == "map":
+            return dict((k, _ovsdb_json_to_value(v)) for k, v in value[1])
+        elif value[0] == "set":
+            return [_ovsdb_json_to_value(v) for v in value[1]]
+        elif value[0] == "uuid":
+            return value[1]
+    return value
+
+
 def get_bridge_for_iface(root_helper, iface):
     args = ["ovs-vsctl", "--timeout=2", "iface-to-br", iface]
     try:
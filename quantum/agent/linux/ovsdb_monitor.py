@@ -0,0 +1,189 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import shlex
+import signal
+import time
+
+import eventlet
+from eventlet.green import subprocess
+from eventlet import queue
+
+from quantum.agent.linux import utils as agent_utils
+from quantum.common import utils
+from quantum.openstack.common import jsonutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Row actions reported by ovsdb-client monitor. The rows present when the
+# monitor starts are reported as 'initial', a modified row is reported
+# twice, as 'old' and 'new'.
+ROW_INSERT = 'insert'
+ROW_DELETE = 'delete'
+ROW_NEW = 'new'
+
+
+class OvsdbMonitor(object):
+    """Follows the changes of an OVSDB table through ovsdb-client monitor.
+
+    A long-lived ovsdb-client process prints the changes of the table, they
+    are read by a green thread and queued as lists of
+    {'action': ..., <column>: ...} dicts until they are consumed.
+    """
+
+    def __init__(self, table, columns, root_helper=None):
+        self.table = table
+        self.columns = columns
+        self.root_helper = root_helper
+        self._process = None
+        self._reader = None
+        self._error_reader = None
+        self._events = queue.LightQueue()
+
+    def _cmd(self):
+        cmd = ['ovsdb-client', 'monitor', self.table,
+               ','.join(self.columns), '--format=json']
+        if self.root_helper:
+            cmd = shlex.split(self.root_helper) + cmd
+        return cmd
+
+    def start(self):
+        """Spawns the ovsdb-client process, unless it is already running."""
+        if self.is_active():
+            return
+        cmd = self._cmd()
+        LOG.debug(_("Running command: %s"), cmd)
+        self._process = utils.subprocess_popen(cmd,
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)
+        self._reader = eventlet.spawn(self._read_events, self._process)
+        self._error_reader = eventlet.spawn(self._read_errors, self._process)
+
+    def stop(self):
+        """Kills the ovsdb-client process."""
+        for reader in (self._reader, self._error_reader):
+            if reader:
+                reader.kill()
+        self._reader = self._error_reader = None
+        if self._process:
+            process, self._process = self._process, None
+            self._kill(process)
+
+    def _kill(self, process):
+        pid = self._get_monitor_pid(process)
+        try:
+            if self.root_helper:
+                # ovsdb-client runs as root, it is killed as the other
+                # processes the agents spawn through the root helper
+                agent_utils.execute(['kill', '-9', pid],
+                                    root_helper=self.root_helper)
+            else:
+                os.kill(int(pid), signal.SIGKILL)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+        except RuntimeError:
+            if os.path.exists('/proc/%s' % pid):
+                raise
+        process.wait()
+
+    def _get_monitor_pid(self, process):
+        # The process spawned is the root helper when there is one, a
+        # signal sent to it would not reach ovsdb-client
+        pid = str(process.pid)
+        while self.root_helper:
+            children = agent_utils.execute(['ps', '--ppid', pid, '-o', 'pid='],
+                                           check_exit_code=False).split()
+            if not children:
+                break
+            pid = children[0]
+        return pid
+
+    def is_active(self):
+        return bool(self._process and self._process.poll() is None)
+
+    def _read_events(self, process):
+        for line in iter(process.stdout.readline, ''):
+            events = self.parse_update(line)
+            if events:
+                self._events.put(events)
+        LOG.warn(_("ovsdb-client monitor of table %s exited"), self.table)
+
+    def _read_errors(self, process):
+        # stderr is drained, ovsdb-client would block once the pipe is full
+        for line in iter(process.stderr.readline, ''):
+            LOG.warn(_("ovsdb-client monitor of table %(table)s: %(line)s"),
+                     {'table': self.table, 'line': line.rstrip()})
+
+    @staticmethod
+    def parse_update(line):
+        """Parses one JSON update of ovsdb-client monitor."""
+        line = line.strip()
+        if not line:
+            return []
+        try:
+            update = jsonutils.loads(line)
+            headings = update['headings']
+            return [dict(zip(headings[1:], row[1:]))
+                    for row in update['data']]
+        except (ValueError, KeyError, TypeError):
+            LOG.debug(_("Unable to parse ovsdb-client output: %s"), line)
+            return []
+
+    def get_events(self, timeout=None):
+        """Returns the pending events.
+
+        When no event is pending, waits at most timeout seconds for new
+        events to arrive.
+        """
+        events = []
+        try:
+            events.extend(self._events.get(timeout=timeout))
+        except queue.Empty:
+            return events
+        while not self._events.empty():
+            events.extend(self._events.get_nowait())
+        return events
+
+
+class InterfaceMonitor(OvsdbMonitor):
+    """Reports the interfaces added to or removed from OVS."""
+
+    def __init__(self, root_helper=None):
+        super(InterfaceMonitor, self).__init__(
+            'Interface', ['name', 'ofport', 'external_ids'],
+            root_helper=root_helper)
+
+    def wait_for_changes(self, timeout):
+        """Waits at most timeout seconds for an interface to change.
+
+        An interface changes when it is added, removed or, as happens once
+        it is attached to the datapath, when its ofport is updated.
+        """
+        deadline = time.time() + timeout
+        while True:
+            events = self.get_events(max(deadline - time.time(), 0))
+            for event in events:
+                if event.get('action') in (ROW_INSERT, ROW_DELETE, ROW_NEW):
+                    return True
+            if not events or time.time() >= deadline:
+                return False
@@ -26,19 +26,36 @@ import struct
 from eventlet.green import subprocess
 
 from quantum.common import utils
+from quantum.openstack.common import cfg
 from quantum.openstack.common import log as logging
+from quantum.rootwrap import daemon as rootwrap_daemon
 
 
 LOG = logging.getLogger(__name__)
 
 
-def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
-    if root_helper:
-        cmd = shlex.split(root_helper) + cmd
-    cmd = map(str, cmd)
+def _get_root_helper_daemon():
+    try:
+        return cfg.CONF.AGENT.root_helper_daemon
+    except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+        return None
+
+
+def _execute_with_daemon(socket_path, cmd, process_input):
+    """Runs cmd through the root wrapper daemon.
+
+    Returns None when the daemon cannot be reached, the caller then
+    spawns the root helper as usual.
+    """
+    try:
+        return rootwrap_daemon.execute(socket_path, cmd, process_input)
+    except (socket.error, ValueError) as e:
+        LOG.warn(_("Unable to run command through the root wrapper daemon "
+                   "at %(socket)s: %(error)s"),
+                 {'socket': socket_path, 'error': e})
+
 
-    LOG.debug(_("Running command: %s"), cmd)
+def _execute_process(cmd, process_input, addl_env):
     env = os.environ.copy()
     if addl_env:
         env.update(addl_env)
@@ -52,11 +69,32 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
                         obj.communicate(process_input) or
                         obj.communicate())
     obj.stdin.close()
+    return obj.returncode, _stdout, _stderr
+
+
+def execute(cmd, root_helper=None, process_input=None, addl_env=None,
+            check_exit_code=True, return_stderr=False):
+    result = None
+    daemon_socket = _get_root_helper_daemon()
+    if root_helper and daemon_socket and not addl_env:
+        # The environment of the daemon commands comes from the filters
+        cmd = map(str, cmd)
+        LOG.debug(_("Running command through the root wrapper daemon: %s"),
+                  cmd)
+        result = _execute_with_daemon(daemon_socket, cmd, process_input)
+    if result is None:
+        if root_helper:
+            cmd = shlex.split(root_helper) + cmd
+        cmd = map(str, cmd)
+        LOG.debug(_("Running command: %s"), cmd)
+        result = _execute_process(cmd, process_input, addl_env)
+
+    returncode, _stdout, _stderr = result
     m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                    'stdout': _stdout, 'stderr': _stderr}
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
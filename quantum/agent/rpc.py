@@ -23,6 +23,7 @@ from quantum.openstack.common import log as logging
 from quantum.openstack.common.notifier import api
 from quantum.openstack.common.notifier import rpc_notifier
 from quantum.openstack.common import rpc
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.openstack.common import uuidutils
 
@@ -54,6 +55,8 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - Add get_devices_details_list and update_device_down_list,
+              version 1.1 of the plugins added the security group calls.
 
     '''
 
@@ -69,12 +72,42 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        try:
+            return self.call(context,
+                             self.make_msg('get_devices_details_list',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic, version='1.2')
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.info(_("The server does not support version 1.2, fetching "
+                       "the details of the devices one at a time"))
+            return [self.get_device_details(context, device, agent_id)
+                    for device in devices]
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_device_down_list(self, context, devices, agent_id):
+        try:
+            return self.call(context,
+                             self.make_msg('update_device_down_list',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic, version='1.2')
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.info(_("The server does not support version 1.2, updating "
+                       "the devices one at a time"))
+            return [self.update_device_down(context, device, agent_id)
+                    for device in devices]
+
     def update_device_up(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_up', device=device,
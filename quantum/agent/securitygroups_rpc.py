@@ -16,6 +16,8 @@
 #    under the License.
 #
 
+import eventlet
+
 from quantum.common import topics
 from quantum.openstack.common import cfg
 from quantum.openstack.common import importutils
@@ -27,7 +29,18 @@ SG_RPC_VERSION = "1.1"
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
-        default='quantum.agent.firewall.NoopFirewallDriver')
+        default='quantum.agent.firewall.NoopFirewallDriver'),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with ipsets '
+               'instead of one rule per member IP address')),
+    cfg.FloatOpt(
+        'refresh_firewall_delay',
+        default=0.5,
+        help=_('Seconds to wait after a security group update before '
+               'refreshing the affected ports, so that a burst of updates '
+               'is applied at once. 0 refreshes them immediately'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -44,6 +57,15 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version='1.2',
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -89,16 +111,48 @@ class SecurityGroupAgentRpcMixin(object):
         LOG.debug(_("Init firewall settings"))
         self.firewall = importutils.import_object(
             cfg.CONF.SECURITYGROUP.firewall_driver)
+        # security group id -> ids of the filtered devices, per attribute
+        self.sg_devices = {'security_groups': {},
+                           'security_group_source_groups': {}}
+        self.devices_to_refilter = set()
+        self.refresh_timer = None
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._security_group_rules_for_devices(list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
+        self._index_devices(devices.values())
+
+    def _security_group_rules_for_devices(self, device_ids):
+        if not cfg.CONF.SECURITYGROUP.enable_ipset:
+            return self.plugin_rpc.security_group_rules_for_devices(
+                self.context, device_ids)
+        info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, device_ids)
+        for sg_id, member_ips in info['sg_member_ips'].iteritems():
+            self.firewall.update_security_group_members(sg_id, member_ips)
+        return info['devices']
+
+    def _index_devices(self, devices):
+        for device in devices:
+            device_id = device['device']
+            self._unindex_devices([device_id])
+            if device_id not in self.firewall.ports:
+                continue
+            for attribute, index in self.sg_devices.iteritems():
+                for sg_id in device.get(attribute, []):
+                    index.setdefault(sg_id, set()).add(device_id)
+
+    def _unindex_devices(self, device_ids):
+        for index in self.sg_devices.values():
+            for sg_id, sg_device_ids in index.items():
+                sg_device_ids.difference_update(device_ids)
+                if not sg_device_ids:
+                    del index[sg_id]
 
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
@@ -115,13 +169,27 @@ class SecurityGroupAgentRpcMixin(object):
             'security_group_source_groups')
 
     def _security_group_updated(self, security_groups, attribute):
-        #check need update or not
-        for device in self.firewall.ports.values():
-            if set(device.get(attribute,
-                              [])).intersection(
-                    set(security_groups)):
-                    self.refresh_firewall()
-                    return
+        index = self.sg_devices[attribute]
+        device_ids = set()
+        for sg_id in security_groups:
+            device_ids.update(index.get(sg_id, ()))
+        if not device_ids:
+            return
+        self.devices_to_refilter.update(device_ids)
+        delay = cfg.CONF.SECURITYGROUP.refresh_firewall_delay
+        if delay <= 0:
+            self._refresh_devices_to_refilter()
+        elif not self.refresh_timer:
+            # The devices of the updates received until the timer fires
+            # are refreshed together
+            self.refresh_timer = eventlet.spawn_after(
+                delay, self._refresh_devices_to_refilter)
+
+    def _refresh_devices_to_refilter(self):
+        self.refresh_timer = None
+        device_ids = self.devices_to_refilter
+        self.devices_to_refilter = set()
+        self.refresh_firewall(device_ids)
 
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
@@ -137,18 +205,28 @@ class SecurityGroupAgentRpcMixin(object):
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
+        self._unindex_devices(device_ids)
 
-    def refresh_firewall(self):
-        LOG.info(_("Refresh firewall rules"))
-        device_ids = self.firewall.ports.keys()
+    def refresh_firewall(self, device_ids=None):
+        """Refreshes the filters of device_ids, or of all the devices."""
+        if device_ids is None:
+            device_ids = self.firewall.ports.keys()
+        else:
+            device_ids = [device_id for device_id in device_ids
+                          if device_id in self.firewall.ports]
         if not device_ids:
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        LOG.info(_("Refresh firewall rules for devices %s"), device_ids)
+        devices = self._security_group_rules_for_devices(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
+                if (cfg.CONF.SECURITYGROUP.enable_ipset and
+                    self.firewall.ports.get(device['device']) == device):
+                    # The member changes only touched the ipsets
+                    continue
                 LOG.debug(_("Update port filter for %s"), device)
                 self.firewall.update_port_filter(device)
+        self._index_devices(devices.values())
 
 
 class SecurityGroupAgentRpcApiMixin(object):
@@ -15,13 +15,298 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import urllib
+
 from webob import exc
 
+from quantum.common import constants
+from quantum.common import exceptions
+from quantum.openstack.common import cfg
 from quantum.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+# Query string parameters driving pagination and sorting. They are never
+# treated as resource filters.
+PAGINATION_PARAMS = ('limit', 'marker', 'page_reverse')
+SORTING_PARAMS = ('sort_key', 'sort_dir')
+
+
+def list_args(request, arg):
+    """Extracts the list of arg from request"""
+    return [v for v in request.GET.getall(arg) if v]
+
+
+def _get_pagination_max_limit():
+    max_limit = cfg.CONF.pagination_max_limit
+    return max_limit if max_limit > 0 else None
+
+
+def _get_limit_param(request, max_limit):
+    """Extract integer limit from request or fail"""
+    try:
+        limit = int(request.GET.get('limit', 0))
+        if limit >= 0:
+            limit = min(limit, max_limit) if max_limit else limit
+            return limit
+        msg = _("Limit must be an integer 0 or greater and not '%s'")
+    except ValueError:
+        msg = _("Limit must be an integer 0 or greater and not '%s'")
+    raise exceptions.BadRequest(resource='limit',
+                                msg=msg % request.GET.get('limit'))
+
+
+def get_limit_and_marker(request):
+    """Return marker, limit tuple from request.
+
+    :param request: `wsgi.Request` possibly containing 'marker' and 'limit'
+                    GET variables. 'marker' is the id of the last element
+                    the client has seen, and 'limit' is the maximum number
+                    of items to return. If limit == 0, it means we needn't
+                    pagination, then return None.
+    """
+    max_limit = _get_pagination_max_limit()
+    limit = _get_limit_param(request, max_limit)
+    if max_limit and not limit:
+        limit = max_limit
+    if not limit:
+        return None, None
+    marker = request.GET.get('marker', None)
+    return limit, marker
+
+
+def get_page_reverse(request):
+    data = request.GET.get('page_reverse', 'False')
+    return data.lower() == "true"
+
+
+def get_sorts(request, attr_info):
+    """Extract sort_key and sort_dir from request.
+
+    Returns a list of (sort_key, is_ascending) tuples, e.g.:
+
+    sort_key=name&sort_dir=asc&sort_key=id&sort_dir=desc
+
+    becomes
+
+    [('name', True), ('id', False)]
+
+    sort_dir may be omitted altogether, in which case every key is sorted
+    in ascending order.
+    """
+    sort_keys = list_args(request, 'sort_key')
+    sort_dirs = list_args(request, 'sort_dir')
+    if not sort_dirs:
+        sort_dirs = [constants.SORT_DIRECTION_ASC] * len(sort_keys)
+    if len(sort_keys) != len(sort_dirs):
+        msg = _("The number of sort_keys and sort_dirs must be same")
+        raise exceptions.BadRequest(resource='sort', msg=msg)
+    valid_dirs = [constants.SORT_DIRECTION_ASC, constants.SORT_DIRECTION_DESC]
+    absent_keys = [x for x in sort_keys
+                   if not attr_info.get(x, {}).get('is_visible')]
+    if absent_keys:
+        msg = _("%s is invalid attribute for sort_keys") % absent_keys
+        raise exceptions.BadRequest(resource='sort', msg=msg)
+    invalid_dirs = [x for x in sort_dirs if x not in valid_dirs]
+    if invalid_dirs:
+        msg = (_("%(invalid_dirs)s is invalid value for sort_dirs, "
+                 "valid value is '%(asc)s' and '%(desc)s'") %
+               {'invalid_dirs': invalid_dirs,
+                'asc': constants.SORT_DIRECTION_ASC,
+                'desc': constants.SORT_DIRECTION_DESC})
+        raise exceptions.BadRequest(resource='sort', msg=msg)
+    return zip(sort_keys,
+               [x == constants.SORT_DIRECTION_ASC for x in sort_dirs])
+
+
+def _get_page_href(request, limit, marker, page_reverse=False):
+    params = [(k, v) for k, v in request.GET.items()
+              if k not in PAGINATION_PARAMS]
+    params.append(('limit', limit))
+    params.append(('marker', marker))
+    if page_reverse:
+        params.append(('page_reverse', 'True'))
+    params = [(k, unicode(v).encode('utf-8')) for k, v in params]
+    return "%s?%s" % (request.path_url, urllib.urlencode(params))
+
+
+def get_pagination_links(request, items, limit, marker, page_reverse,
+                         has_more, key='id'):
+    """Build the 'next' and 'previous' links of a page of items.
+
+    :param has_more: True if more items exist beyond the page in the
+                     direction of the request.
+    """
+    links = []
+    if not limit or not items:
+        return links
+    if page_reverse:
+        has_next, has_previous = bool(marker), has_more
+    else:
+        has_next, has_previous = has_more, bool(marker)
+    if has_next:
+        links.append({'rel': 'next',
+                      'href': _get_page_href(request, limit,
+                                             items[-1][key])})
+    if has_previous:
+        links.append({'rel': 'previous',
+                      'href': _get_page_href(request, limit,
+                                             items[0][key], True)})
+    return links
+
+
+class PaginationHelper(object):
+    """Base pagination helper; it does not paginate at all."""
+
+    def __init__(self, request, primary_key='id'):
+        self.request = request
+        self.primary_key = primary_key
+
+    def update_fields(self, original_fields, fields_to_add):
+        pass
+
+    def update_args(self, args):
+        pass
+
+    def paginate(self, items):
+        return items
+
+    def get_links(self, items):
+        return []
+
+
+class PaginationEmulatedHelper(PaginationHelper):
+    """Paginates in the API layer the full list returned by the plugin.
+
+    The order of the items is the one produced by the plugin or by the
+    sorting helper, so the plugin is expected to return them in a stable
+    order.
+    """
+
+    def __init__(self, request, primary_key='id'):
+        super(PaginationEmulatedHelper, self).__init__(request, primary_key)
+        self.limit, self.marker = get_limit_and_marker(request)
+        self.page_reverse = get_page_reverse(request)
+        self.has_more = False
+
+    def update_fields(self, original_fields, fields_to_add):
+        if not original_fields:
+            return
+        if self.primary_key not in original_fields:
+            original_fields.append(self.primary_key)
+            fields_to_add.append(self.primary_key)
+
+    def paginate(self, items):
+        if not self.limit:
+            return items
+        if self.page_reverse:
+            end = len(items)
+            if self.marker:
+                end = self._marker_index(items)
+            start = max(end - self.limit, 0)
+            self.has_more = start > 0
+            return items[start:end]
+        start = 0
+        if self.marker:
+            start = self._marker_index(items) + 1
+        self.has_more = len(items) > start + self.limit
+        return items[start:start + self.limit]
+
+    def _marker_index(self, items):
+        for index, item in enumerate(items):
+            if item[self.primary_key] == self.marker:
+                return index
+        msg = _("Marker %s could not be found") % self.marker
+        raise exceptions.BadRequest(resource='marker', msg=msg)
+
+    def get_links(self, items):
+        return get_pagination_links(
+            self.request, items, self.limit, self.marker, self.page_reverse,
+            self.has_more, self.primary_key)
+
+
+class PaginationNativeHelper(PaginationEmulatedHelper):
+    """Pushes pagination down to the plugin.
+
+    One more item than the page size is requested from the plugin in order
+    to find out whether a following page exists.
+    """
+
+    def update_args(self, args):
+        sorts = args.setdefault('sorts', [])
+        if self.primary_key not in dict(sorts):
+            sorts.append((self.primary_key, True))
+        args.update({'limit': self.limit and self.limit + 1,
+                     'marker': self.marker,
+                     'page_reverse': self.page_reverse})
+
+    def paginate(self, items):
+        if not self.limit:
+            return items
+        self.has_more = len(items) > self.limit
+        if self.page_reverse:
+            return items[-self.limit:]
+        return items[:self.limit]
+
+
+class NoPaginationHelper(PaginationHelper):
+    pass
+
+
+class SortingHelper(object):
+    """Base sorting helper; it does not sort at all."""
+
+    def __init__(self, request, attr_info):
+        pass
+
+    def update_args(self, args):
+        pass
+
+    def update_fields(self, original_fields, fields_to_add):
+        pass
+
+    def sort(self, items):
+        return items
+
+
+class SortingEmulatedHelper(SortingHelper):
+    """Sorts in the API layer the full list returned by the plugin."""
+
+    def __init__(self, request, attr_info):
+        super(SortingEmulatedHelper, self).__init__(request, attr_info)
+        self.sort_dict = get_sorts(request, attr_info)
+
+    def update_fields(self, original_fields, fields_to_add):
+        if not original_fields:
+            return
+        for key in dict(self.sort_dict):
+            if key not in original_fields:
+                original_fields.append(key)
+                fields_to_add.append(key)
+
+    def sort(self, items):
+        # Successive stable sorts, least significant key first
+        for key, direction in reversed(self.sort_dict):
+            items = sorted(items, key=lambda item: item.get(key),
+                           reverse=not direction)
+        return items
+
+
+class SortingNativeHelper(SortingHelper):
+    """Pushes sorting down to the plugin."""
+
+    def __init__(self, request, attr_info):
+        super(SortingNativeHelper, self).__init__(request, attr_info)
+        self.sort_dict = get_sorts(request, attr_info)
+
+    def update_args(self, args):
+        args['sorts'] = self.sort_dict
+
+
+class NoSortingHelper(SortingHelper):
+    pass
+
 
 class QuantumController(object):
     """ Base controller class for Quantum API """
@@ -18,9 +18,11 @@
 import netaddr
 import webob.exc
 
+from quantum.api import api_common
 from quantum.api.v2 import attributes
 from quantum.api.v2 import resource as wsgi_resource
 from quantum.common import exceptions
+from quantum.openstack.common import excutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common.notifier import api as notifier_api
 from quantum import policy
@@ -43,7 +45,7 @@ def _fields(request):
     """
     Extracts the list of fields to return
     """
-    return [v for v in request.GET.getall('fields') if v]
+    return api_common.list_args(request, 'fields')
 
 
 def _filters(request, attr_info):
@@ -59,8 +61,10 @@ def _filters(request, attr_info):
     {'check': [u'a', u'b'], 'name': [u'Bob']}
     """
     res = {}
+    skipped = (('fields',) + api_common.PAGINATION_PARAMS +
+               api_common.SORTING_PARAMS)
     for key, values in request.GET.dict_of_lists().iteritems():
-        if key == 'fields':
+        if key in skipped:
             continue
         values = [v for v in values if v]
         key_attr_info = attr_info.get(key, {})
@@ -82,7 +86,8 @@ class Controller(object):
     DELETE = 'delete'
 
     def __init__(self, plugin, collection, resource, attr_info,
-                 allow_bulk=False, member_actions=None, parent=None):
+                 allow_bulk=False, member_actions=None, parent=None,
+                 allow_pagination=False, allow_sorting=False):
         if member_actions is None:
             member_actions = []
         self._plugin = plugin
@@ -90,7 +95,20 @@ class Controller(object):
         self._resource = resource.replace('-', '_')
         self._attr_info = attr_info
         self._allow_bulk = allow_bulk
+        self._allow_pagination = allow_pagination
+        self._allow_sorting = allow_sorting
         self._native_bulk = self._is_native_bulk_supported()
+        self._native_pagination = self._is_native_pagination_supported()
+        self._native_sorting = self._is_native_sorting_supported()
+        if self._allow_pagination and self._native_pagination:
+            # Native pagination needs the plugin to sort natively, as the
+            # marker is only meaningful with respect to an ordering
+            if not self._native_sorting:
+                raise exceptions.Invalid(
+                    _("Native pagination depends on native sorting"))
+        if self._allow_pagination:
+            # Make sure pagination links are rendered as a list in XML
+            attributes.PLURALS[self._collection + '_links'] = 'link'
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
         self._publisher_id = notifier_api.publisher_id('network')
@@ -115,6 +133,30 @@ class Controller(object):
                                  % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_bulk_attr_name, False)
 
+    def _is_native_pagination_supported(self):
+        native_pagination_attr_name = ("_%s__native_pagination_support"
+                                       % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_pagination_attr_name, False)
+
+    def _is_native_sorting_supported(self):
+        native_sorting_attr_name = ("_%s__native_sorting_support"
+                                    % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_sorting_attr_name, False)
+
+    def _get_pagination_helper(self, request):
+        if self._allow_pagination and self._native_pagination:
+            return api_common.PaginationNativeHelper(request)
+        elif self._allow_pagination:
+            return api_common.PaginationEmulatedHelper(request)
+        return api_common.NoPaginationHelper(request)
+
+    def _get_sorting_helper(self, request):
+        if self._allow_sorting and self._native_sorting:
+            return api_common.SortingNativeHelper(request, self._attr_info)
+        elif self._allow_sorting:
+            return api_common.SortingEmulatedHelper(request, self._attr_info)
+        return api_common.NoSortingHelper(request, self._attr_info)
+
     def _is_visible(self, attr):
         attr_val = self._attr_info.get(attr)
         return attr_val and attr_val['is_visible']
@@ -159,10 +201,24 @@ class Controller(object):
         original_fields, fields_to_add = self._do_field_list(_fields(request))
         kwargs = {'filters': _filters(request, self._attr_info),
                   'fields': original_fields}
+        # NOTE: sorting and pagination are either pushed down to the plugin,
+        # when it declares native support for them, or emulated here on the
+        # full list returned by the plugin.
+        sorting_helper = self._get_sorting_helper(request)
+        pagination_helper = self._get_pagination_helper(request)
+        sorting_helper.update_args(kwargs)
+        sorting_helper.update_fields(original_fields, fields_to_add)
+        pagination_helper.update_args(kwargs)
+        pagination_helper.update_fields(original_fields, fields_to_add)
         if parent_id:
             kwargs[self._parent_id_name] = parent_id
         obj_getter = getattr(self._plugin, self._plugin_handlers[self.LIST])
         obj_list = obj_getter(request.context, **kwargs)
+        obj_list = sorting_helper.sort(obj_list)
+        obj_list = pagination_helper.paginate(obj_list)
+        # Links are built on the page as returned by the plugin, as the
+        # markers must not depend on the items filtered out by the policy
+        pagination_links = pagination_helper.get_links(obj_list)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
@@ -173,9 +229,12 @@ class Controller(object):
                                         self._plugin_handlers[self.SHOW],
                                         obj,
                                         plugin=self._plugin)]
-        return {self._collection: [self._view(obj,
-                                              fields_to_strip=fields_to_add)
-                                   for obj in obj_list]}
+        collection = {self._collection:
+                      [self._view(obj, fields_to_strip=fields_to_add)
+                       for obj in obj_list]}
+        if pagination_links:
+            collection[self._collection + "_links"] = pagination_links
+        return collection
 
     def _item(self, request, id, do_authz=False, field_list=None,
               parent_id=None):
@@ -266,11 +325,9 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
@@ -278,24 +335,23 @@ class Controller(object):
                            action,
                            item[self._resource],
                            plugin=self._plugin)
-            try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        # The quota of a tenant is checked once for all its items
+        reservations = []
+        try:
+            for tenant_id, delta in deltas.iteritems():
+                reservations.append(quota.QUOTAS.make_reservation(
+                    request.context, tenant_id, self._resource, delta,
+                    self._plugin, self._collection, tenant_id))
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(request.context,
+                                                    reservation)
 
         def notify(create_result):
             notifier_api.notify(request.context,
@@ -306,23 +362,32 @@ class Controller(object):
             return create_result
 
         kwargs = {self._parent_id_name: parent_id} if parent_id else {}
-        if self._collection in body and self._native_bulk:
-            # plugin does atomic bulk create operations
-            obj_creator = getattr(self._plugin, "%s_bulk" % action)
-            objs = obj_creator(request.context, body, **kwargs)
-            return notify({self._collection: [self._view(obj)
-                                              for obj in objs]})
-        else:
-            obj_creator = getattr(self._plugin, action)
-            if self._collection in body:
-                # Emulate atomic bulk behavior
-                objs = self._emulate_bulk_create(obj_creator, request,
-                                                 body, parent_id)
-                return notify({self._collection: objs})
+        try:
+            if self._collection in body and self._native_bulk:
+                # plugin does atomic bulk create operations
+                obj_creator = getattr(self._plugin, "%s_bulk" % action)
+                objs = obj_creator(request.context, body, **kwargs)
+                result = {self._collection: [self._view(obj)
+                                             for obj in objs]}
             else:
-                kwargs.update({self._resource: body})
-                obj = obj_creator(request.context, **kwargs)
-                return notify({self._resource: self._view(obj)})
+                obj_creator = getattr(self._plugin, action)
+                if self._collection in body:
+                    # Emulate atomic bulk behavior
+                    objs = self._emulate_bulk_create(obj_creator, request,
+                                                     body, parent_id)
+                    result = {self._collection: objs}
+                else:
+                    kwargs.update({self._resource: body})
+                    obj = obj_creator(request.context, **kwargs)
+                    result = {self._resource: self._view(obj)}
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(request.context,
+                                                    reservation)
+        for reservation in reservations:
+            quota.QUOTAS.commit_reservation(request.context, reservation)
+        return notify(result)
 
     def delete(self, request, id, **kwargs):
         """Deletes the specified entity"""
@@ -346,8 +411,18 @@ class Controller(object):
             # doesn't exist
             raise webob.exc.HTTPNotFound()
 
+        reservation = None
+        if self._resource in quota.QUOTAS:
+            reservation = quota.QUOTAS.make_reservation(
+                request.context, obj['tenant_id'], self._resource, -1,
+                self._plugin, self._collection, obj['tenant_id'])
         obj_deleter = getattr(self._plugin, action)
-        obj_deleter(request.context, id, **kwargs)
+        try:
+            obj_deleter(request.context, id, **kwargs)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                quota.QUOTAS.cancel_reservation(request.context, reservation)
+        quota.QUOTAS.commit_reservation(request.context, reservation)
         notifier_api.notify(request.context,
                             self._publisher_id,
                             self._resource + '.delete.end',
@@ -525,8 +600,11 @@ class Controller(object):
 
 
 def create_resource(collection, resource, plugin, params, allow_bulk=False,
-                    member_actions=None, parent=None):
+                    member_actions=None, parent=None, allow_pagination=False,
+                    allow_sorting=False):
     controller = Controller(plugin, collection, resource, params, allow_bulk,
-                            member_actions=member_actions, parent=parent)
+                            member_actions=member_actions, parent=parent,
+                            allow_pagination=allow_pagination,
+                            allow_sorting=allow_sorting)
 
     return wsgi_resource.Resource(controller, FAULT_MAP)
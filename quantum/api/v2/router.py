@@ -82,10 +82,12 @@ class APIRouter(wsgi.Router):
 
         def _map_resource(collection, resource, params, parent=None):
             allow_bulk = cfg.CONF.allow_bulk
-            controller = base.create_resource(collection, resource,
-                                              plugin, params,
-                                              allow_bulk=allow_bulk,
-                                              parent=parent)
+            allow_pagination = cfg.CONF.allow_pagination
+            allow_sorting = cfg.CONF.allow_sorting
+            controller = base.create_resource(
+                collection, resource, plugin, params, allow_bulk=allow_bulk,
+                parent=parent, allow_pagination=allow_pagination,
+                allow_sorting=allow_sorting)
             path_prefix = None
             if parent:
                 path_prefix = "/%s/{%s_id}/%s" % (parent['collection_name'],
@@ -56,12 +56,31 @@ core_opts = [
                help=_("How many times Quantum will retry MAC generation")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
+    cfg.BoolOpt('allow_pagination', default=False,
+                help=_("Allow the usage of the pagination")),
+    cfg.BoolOpt('allow_sorting', default=False,
+                help=_("Allow the usage of the sorting")),
+    cfg.IntOpt('pagination_max_limit', default=-1,
+               help=_("The maximum number of items returned in a single "
+                      "response, value less than or equal to 0 means "
+                      "no limit")),
+    cfg.StrOpt('ipam_driver', default='quantum.db.ipam.RangeIpamDriver',
+               help=_("The driver used to track the free IP addresses of "
+                      "the subnets")),
     cfg.IntOpt('max_dns_nameservers', default=5,
                help=_("Maximum number of DNS nameservers")),
     cfg.IntOpt('max_subnet_host_routes', default=20,
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('dhcp_lease_duration', default=120,
                help=_("DHCP lease duration")),
+    cfg.IntOpt('ip_recycle_interval', default=60,
+               help=_("Seconds between the recycling of the held IP "
+                      "addresses whose lease expired, 0 disables it and "
+                      "the addresses are recycled when a subnet is "
+                      "exhausted")),
+    cfg.IntOpt('ip_recycle_batch_size', default=100,
+               help=_("Maximum number of expired IP addresses recycled in "
+                      "a single transaction")),
     cfg.BoolOpt('allow_overlapping_ips', default=False,
                 help=_("Allow overlapping IP support in Quantum")),
     cfg.StrOpt('host', default=utils.get_hostname(),
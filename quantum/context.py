@@ -58,6 +58,8 @@ class ContextBase(common_context.RequestContext):
             timestamp = datetime.utcnow()
         self.timestamp = timestamp
         self._session = None
+        # Lookups made by the policy engine while serving the request
+        self.policy_cache = {}
 
     @property
     def project_id(self):
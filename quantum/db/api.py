@@ -68,6 +68,9 @@ cfg.CONF.register_opts(database_opts, "DATABASE")
 _ENGINE = None
 _MAKER = None
 BASE = model_base.BASEV2
+# The connection pools inherited from the parent process, see
+# forget_db_connections()
+_INHERITED_POOLS = []
 
 
 class MySQLPingListener(object):
@@ -164,6 +167,30 @@ def clear_db(base=BASE):
     _ENGINE = None
 
 
+def dispose_db():
+    """Closes the pooled connections of the engine.
+
+    This is meant to be called before forking, so that the children do not
+    inherit them. The engine and the models stay configured, new
+    connections are opened on demand.
+    """
+    if _ENGINE:
+        _ENGINE.dispose()
+
+
+def forget_db_connections():
+    """Drops the pooled connections of the engine without closing them.
+
+    This is meant to be called in a forked process: the connections it
+    inherited are still used by its parent, and closing them would end
+    the parent's sessions. They are kept referenced so that they are never
+    garbage collected, new connections are opened on demand.
+    """
+    if _ENGINE:
+        _INHERITED_POOLS.append(_ENGINE.pool)
+        _ENGINE.pool = _ENGINE.pool.recreate()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session"""
     global _MAKER, _ENGINE
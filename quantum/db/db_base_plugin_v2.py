@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import datetime
 import random
 
@@ -26,8 +27,11 @@ from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import exceptions as q_exc
 from quantum.db import api as db
+from quantum.db import ipam
 from quantum.db import models_v2
+from quantum.db import sqlalchemyutils
 from quantum.openstack.common import cfg
+from quantum.openstack.common import excutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import timeutils
 from quantum.openstack.common import uuidutils
@@ -47,6 +51,20 @@ AGENT_OWNER_PREFIX = 'network:'
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = ['network:dhcp', 'network:router_interface']
 
+# Maximum number of parent ids sent in a single IN clause when the children
+# of a page of resources are loaded in bulk
+BULK_LOAD_CHUNK_SIZE = 500
+
+# Child collections of the core resources which are loaded in bulk when
+# listing; each entry maps the attribute exposed in the resource dict to the
+# model holding the children and its foreign key to the parent
+NETWORK_CHILDREN = {'subnets': (models_v2.Subnet, 'network_id')}
+SUBNET_CHILDREN = {'allocation_pools': (models_v2.IPAllocationPool,
+                                        'subnet_id'),
+                   'dns_nameservers': (models_v2.DNSNameServer, 'subnet_id'),
+                   'host_routes': (models_v2.Route, 'subnet_id')}
+PORT_CHILDREN = {'fixed_ips': (models_v2.IPAllocation, 'port_id')}
+
 
 class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     """ A class that implements the v2 Quantum plugin interface
@@ -61,6 +79,11 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     # bulk operations. Name mangling is used in order to ensure it
     # is qualified by class
     __native_bulk_support = True
+    # Likewise, these attributes state whether the plugin is able to
+    # sort and paginate list results in the database. Native pagination
+    # depends on native sorting.
+    __native_pagination_support = True
+    __native_sorting_support = True
     # Plugins, mixin classes implementing extension will register
     # hooks into the dict below for "augmenting" the "core way" of
     # building a query for retrieving objects from a model class.
@@ -199,6 +222,21 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                          if key in fields))
         return resource
 
+    @staticmethod
+    def _is_field_requested(key, fields):
+        return not fields or key in fields
+
+    def _make_columns_dict(self, obj, fields, columns):
+        # NOTE: only touch the requested attributes, since the others may
+        # have been deferred by _apply_fields_to_query and would otherwise
+        # be loaded one row at a time
+        return dict((key, obj[key]) for key in columns
+                    if self._is_field_requested(key, fields))
+
+    @staticmethod
+    def _apply_fields_to_query(query, model, fields):
+        return sqlalchemyutils.restrict_columns(query, model, fields)
+
     def _apply_filters_to_query(self, query, model, filters):
         if filters:
             for key, value in filters.iteritems():
@@ -207,30 +245,110 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                     query = query.filter(column.in_(value))
         return query
 
-    def _get_collection_query(self, context, model, filters=None):
+    @staticmethod
+    def _apply_sorts_to_query(query, model, sorts, limit=None,
+                              marker_obj=None, page_reverse=False):
+        if sorts:
+            if page_reverse:
+                # Walk backwards from the marker; the caller restores the
+                # requested order once the page has been fetched
+                sorts = [(key, not ascending) for key, ascending in sorts]
+            query = sqlalchemyutils.paginate_query(query, model, limit,
+                                                   sorts, marker_obj)
+        return query
+
+    def _get_collection_query(self, context, model, filters=None,
+                              sorts=None, limit=None, marker_obj=None,
+                              page_reverse=False):
         collection = self._model_query(context, model)
         collection = self._apply_filters_to_query(collection, model, filters)
+        collection = self._apply_sorts_to_query(collection, model, sorts,
+                                                limit, marker_obj,
+                                                page_reverse)
         return collection
 
+    @staticmethod
+    def _fetch_items(query, dict_func, fields=None, sorts=None,
+                     page_reverse=False):
+        items = [dict_func(c, fields) for c in query.all()]
+        if sorts and page_reverse:
+            items.reverse()
+        return items
+
+    def _load_children(self, context, parents, fields, relations):
+        """Fetches the children of a list of parents in a few queries.
+
+        Child collections are otherwise loaded lazily, costing one query per
+        parent and per relation. Here each requested relation is loaded with
+        a single IN query (chunked for long lists) and the rows are grouped
+        by parent id, e.g. {parent_id: {'fixed_ips': [...]}}.
+        """
+        children = collections.defaultdict(dict)
+        parent_ids = [parent['id'] for parent in parents]
+        for attr, (model, key) in relations.iteritems():
+            if not parent_ids or not self._is_field_requested(attr, fields):
+                continue
+            column = getattr(model, key)
+            for parent_id in parent_ids:
+                children[parent_id][attr] = []
+            for i in xrange(0, len(parent_ids), BULK_LOAD_CHUNK_SIZE):
+                chunk = parent_ids[i:i + BULK_LOAD_CHUNK_SIZE]
+                query = context.session.query(model).filter(column.in_(chunk))
+                for child in query:
+                    children[child[key]][attr].append(child)
+        return children
+
+    @staticmethod
+    def _get_children(parent, attr, children, relationship=None):
+        if children is not None and attr in children:
+            return children[attr]
+        # fall back to the (lazy) relationship on the model
+        return parent[relationship or attr]
+
+    def _fetch_items_with_children(self, context, query, dict_func,
+                                   relations, fields=None, sorts=None,
+                                   page_reverse=False):
+        parents = query.all()
+        children = self._load_children(context, parents, fields, relations)
+        items = [dict_func(c, fields, children.get(c['id']))
+                 for c in parents]
+        if sorts and page_reverse:
+            items.reverse()
+        return items
+
     def _get_collection(self, context, model, dict_func, filters=None,
-                        fields=None):
-        query = self._get_collection_query(context, model, filters)
-        return [dict_func(c, fields) for c in query.all()]
+                        fields=None, sorts=None, limit=None, marker_obj=None,
+                        page_reverse=False):
+        query = self._get_collection_query(context, model, filters,
+                                           sorts=sorts, limit=limit,
+                                           marker_obj=marker_obj,
+                                           page_reverse=page_reverse)
+        return self._fetch_items(query, dict_func, fields, sorts,
+                                 page_reverse)
+
+    def _get_marker_obj(self, context, resource, limit, marker):
+        if limit and marker:
+            return getattr(self, '_get_%s' % resource)(context, marker)
+        return None
 
     def _get_collection_count(self, context, model, filters=None):
         return self._get_collection_query(context, model, filters).count()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = QuantumDbPluginV2._random_mac()
             if QuantumDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -245,6 +363,31 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                   max_retries)
         raise q_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, excluded=()):
+        """Generate count MAC addresses unique on the network.
+
+        The candidates of each attempt are checked with a single query, the
+        addresses in excluded are never returned.
+        """
+        max_retries = cfg.CONF.mac_generation_retries
+        mac_addresses = set()
+        for i in range(max_retries):
+            candidates = set(QuantumDbPluginV2._random_mac()
+                             for j in xrange(count - len(mac_addresses)))
+            candidates -= mac_addresses
+            candidates -= set(excluded)
+            candidates -= QuantumDbPluginV2._get_used_macs(context,
+                                                           network_id,
+                                                           candidates)
+            mac_addresses |= candidates
+            if len(mac_addresses) == count:
+                return list(mac_addresses)
+        LOG.error(_("Unable to generate %(count)d mac addresses after "
+                    "%(max_retries)s attempts"),
+                  {'count': count, 'max_retries': max_retries})
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -255,6 +398,20 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             return True
         return False
 
+    @staticmethod
+    def _get_used_macs(context, network_id, mac_addresses):
+        """Return the MAC addresses of mac_addresses used on the network."""
+        mac_addresses = list(mac_addresses)
+        used = set()
+        for i in xrange(0, len(mac_addresses), BULK_LOAD_CHUNK_SIZE):
+            mac_qry = context.session.query(models_v2.Port.mac_address)
+            mac_qry = mac_qry.filter(
+                models_v2.Port.network_id == network_id,
+                models_v2.Port.mac_address.in_(
+                    mac_addresses[i:i + BULK_LOAD_CHUNK_SIZE]))
+            used.update(row[0] for row in mac_qry)
+        return used
+
     @staticmethod
     def _hold_ip(context, network_id, subnet_id, port_id, ip_address):
         alloc_qry = context.session.query(models_v2.IPAllocation)
@@ -277,9 +434,14 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
 
     @staticmethod
     def _recycle_expired_ip_allocations(context, network_id):
-        """Return held ip allocations with expired leases back to the pool."""
+        """Return held ip allocations with expired leases back to the pool.
+
+        This is the fallback of the periodic recycling for the requests
+        which find the addresses of a network exhausted. Returns the number
+        of allocations recycled.
+        """
         if network_id in getattr(context, '_recycled_networks', set()):
-            return
+            return 0
 
         expired_qry = context.session.query(models_v2.IPAllocation)
         expired_qry = expired_qry.filter_by(network_id=network_id,
@@ -287,7 +449,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         expired_qry = expired_qry.filter(
             models_v2.IPAllocation.expiration <= timeutils.utcnow())
 
-        for expired in expired_qry.all():
+        expired_allocations = expired_qry.with_lockmode('update').all()
+        for expired in expired_allocations:
             QuantumDbPluginV2._recycle_ip(context,
                                           network_id,
                                           expired['subnet_id'],
@@ -297,6 +460,45 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             context._recycled_networks.add(network_id)
         else:
             context._recycled_networks = set([network_id])
+        return len(expired_allocations)
+
+    def recycle_expired_ip_allocations(self, context):
+        """Return all the held ip allocations with expired leases.
+
+        The allocations are recycled in transactions of at most
+        ip_recycle_batch_size allocations, so that the locks they take are
+        held briefly. Returns the number of allocations recycled.
+        """
+        batch_size = cfg.CONF.ip_recycle_batch_size
+        recycled = 0
+        while True:
+            with context.session.begin(subtransactions=True):
+                expired_qry = context.session.query(models_v2.IPAllocation)
+                expired_qry = expired_qry.filter_by(port_id=None)
+                expired_qry = expired_qry.filter(
+                    models_v2.IPAllocation.expiration <= timeutils.utcnow())
+                # The rows are locked so that a concurrent recycling cannot
+                # return the same address to the pool twice
+                expired_qry = expired_qry.with_lockmode('update')
+                expired_allocations = expired_qry.limit(batch_size).all()
+                for expired in expired_allocations:
+                    try:
+                        QuantumDbPluginV2._recycle_ip(context,
+                                                      expired['network_id'],
+                                                      expired['subnet_id'],
+                                                      expired['ip_address'])
+                    except q_exc.InvalidInput:
+                        # The address left the allocation pools of its
+                        # subnet, it is released without being recycled
+                        QuantumDbPluginV2._delete_ip_allocation(
+                            context, expired['network_id'],
+                            expired['subnet_id'], expired['ip_address'])
+            recycled += len(expired_allocations)
+            if len(expired_allocations) < batch_size:
+                break
+        if recycled:
+            LOG.debug(_("Recycled %d expired IP allocations"), recycled)
+        return recycled
 
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
@@ -307,75 +509,17 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         pool_qry = context.session.query(models_v2.IPAllocationPool)
         allocation_pools = pool_qry.filter_by(subnet_id=subnet_id).all()
         # Find the allocation pool for the IP to recycle
-        pool_id = None
         for allocation_pool in allocation_pools:
             allocation_pool_range = netaddr.IPRange(
                 allocation_pool['first_ip'],
                 allocation_pool['last_ip'])
             if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
                 break
-        if not pool_id:
+        else:
             error_message = _("No allocation pool found for "
                               "ip address:%s") % ip_address
             raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(models_v2.IPAvailabilityRange)
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_driver().release_ip(context, allocation_pool, ip_address)
         QuantumDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -417,68 +561,30 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         """Generate an IP address.
 
         The IP address will be generated from one of the subnets defined on
-        the network.
+        the network. When they are exhausted, the expired allocations of the
+        network are recycled before trying again.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool)
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        return QuantumDbPluginV2._generate_ips(context, subnets, 1)[0]
+
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses in a single pass over the subnets.
+
+        When the subnets are exhausted, the expired allocations of the
+        network are recycled before trying again.
+        """
+        try:
+            return ipam.get_driver().generate_ips(context, subnets, count)
+        except q_exc.IpAddressGenerationFailure:
+            if not QuantumDbPluginV2._recycle_expired_ip_allocations(
+                    context, subnets[0]['network_id']):
+                raise
+        return ipam.get_driver().generate_ips(context, subnets, count)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange,
-            models_v2.IPAllocationPool).join(
-                models_v2.IPAllocationPool)
-        results = range_qry.filter_by(subnet_id=subnet_id).all()
-        for (range, pool) in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_driver().allocate_specific_ip(context, subnet_id, ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -575,8 +681,16 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 if not QuantumDbPluginV2._check_unique_ip(context, network_id,
                                                           subnet_id,
                                                           fixed['ip_address']):
-                    raise q_exc.IpAddressInUse(net_id=network_id,
-                                               ip_address=fixed['ip_address'])
+                    # The IP may be held by an expired allocation which was
+                    # not recycled yet
+                    QuantumDbPluginV2._recycle_expired_ip_allocations(
+                        context, network_id)
+                    if not QuantumDbPluginV2._check_unique_ip(
+                            context, network_id, subnet_id,
+                            fixed['ip_address']):
+                        raise q_exc.IpAddressInUse(
+                            net_id=network_id,
+                            ip_address=fixed['ip_address'])
 
                 # Ensure that the IP is valid on the subnet
                 if (not found and
@@ -847,53 +961,51 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             tenant_ids.pop() != original.tenant_id):
             raise q_exc.InvalidSharedSetting(network=original.name)
 
-    def _make_network_dict(self, network, fields=None):
-        res = {'id': network['id'],
-               'name': network['name'],
-               'tenant_id': network['tenant_id'],
-               'admin_state_up': network['admin_state_up'],
-               'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
-
-        return self._fields(res, fields)
-
-    def _make_subnet_dict(self, subnet, fields=None):
-        res = {'id': subnet['id'],
-               'name': subnet['name'],
-               'tenant_id': subnet['tenant_id'],
-               'network_id': subnet['network_id'],
-               'ip_version': subnet['ip_version'],
-               'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
-               'gateway_ip': subnet['gateway_ip'],
-               'enable_dhcp': subnet['enable_dhcp'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
-               'shared': subnet['shared']
-               }
-        return self._fields(res, fields)
-
-    def _make_port_dict(self, port, fields=None):
-        res = {"id": port["id"],
-               'name': port['name'],
-               "network_id": port["network_id"],
-               'tenant_id': port['tenant_id'],
-               "mac_address": port["mac_address"],
-               "admin_state_up": port["admin_state_up"],
-               "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
-               "device_id": port["device_id"],
-               "device_owner": port["device_owner"]}
-        return self._fields(res, fields)
+    def _make_network_dict(self, network, fields=None, children=None):
+        res = self._make_columns_dict(network, fields,
+                                      ('id', 'name', 'tenant_id',
+                                       'admin_state_up', 'status', 'shared'))
+        if self._is_field_requested('subnets', fields):
+            res['subnets'] = [subnet['id'] for subnet in
+                              self._get_children(network, 'subnets',
+                                                 children)]
+        return res
+
+    def _make_subnet_dict(self, subnet, fields=None, children=None):
+        res = self._make_columns_dict(subnet, fields,
+                                      ('id', 'name', 'tenant_id',
+                                       'network_id', 'ip_version', 'cidr',
+                                       'gateway_ip', 'enable_dhcp', 'shared'))
+        if self._is_field_requested('allocation_pools', fields):
+            pools = self._get_children(subnet, 'allocation_pools', children)
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in pools]
+        if self._is_field_requested('dns_nameservers', fields):
+            dns_servers = self._get_children(subnet, 'dns_nameservers',
+                                             children)
+            res['dns_nameservers'] = [dns['address'] for dns in dns_servers]
+        if self._is_field_requested('host_routes', fields):
+            routes = self._get_children(subnet, 'host_routes', children,
+                                        relationship='routes')
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in routes]
+        return res
+
+    def _make_port_dict(self, port, fields=None, children=None):
+        res = self._make_columns_dict(port, fields,
+                                      ('id', 'name', 'network_id',
+                                       'tenant_id', 'mac_address',
+                                       'admin_state_up', 'status',
+                                       'device_id', 'device_owner'))
+        if self._is_field_requested('fixed_ips', fields):
+            res['fixed_ips'] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in self._get_children(port,
+                                                             'fixed_ips',
+                                                             children)]
+        return res
 
     def _create_bulk(self, resource, context, request_items):
         objects = []
@@ -974,10 +1086,20 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         network = self._get_network(context, id)
         return self._make_network_dict(network, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
-        return self._get_collection(context, models_v2.Network,
-                                    self._make_network_dict,
-                                    filters=filters, fields=fields)
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None,
+                     page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'network', limit, marker)
+        query = self._get_collection_query(context, models_v2.Network,
+                                           filters=filters, sorts=sorts,
+                                           limit=limit,
+                                           marker_obj=marker_obj,
+                                           page_reverse=page_reverse)
+        query = self._apply_fields_to_query(query, models_v2.Network, fields)
+        return self._fetch_items_with_children(context, query,
+                                               self._make_network_dict,
+                                               NETWORK_CHILDREN, fields, sorts,
+                                               page_reverse)
 
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
@@ -1077,16 +1199,14 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                             destination=rt['destination'],
                                             nexthop=rt['nexthop'])
                     context.session.add(route)
+            ip_pools = []
             for pool in pools:
                 ip_pool = models_v2.IPAllocationPool(subnet=subnet,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ip_pools.append(ip_pool)
+            ipam.get_driver().create_pools(context, subnet, ip_pools)
 
         return self._make_subnet_dict(subnet)
 
@@ -1100,6 +1220,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         # _validate_subnet() expects subnet spec has 'ip_version' field.
         s['ip_version'] = self._get_subnet(context, id).ip_version
         self._validate_subnet(s)
+        routing_changed = 'gateway_ip' in s or 'host_routes' in s
 
         with context.session.begin(subtransactions=True):
             if "dns_nameservers" in s:
@@ -1146,6 +1267,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
 
             subnet = self._get_subnet(context, id)
             subnet.update(s)
+        if routing_changed:
+            self._notify_routers_using(context, subnet_id=id)
         return self._make_subnet_dict(subnet)
 
     def delete_subnet(self, context, id):
@@ -1172,17 +1295,163 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         subnet = self._get_subnet(context, id)
         return self._make_subnet_dict(subnet, fields)
 
-    def get_subnets(self, context, filters=None, fields=None):
-        return self._get_collection(context, models_v2.Subnet,
-                                    self._make_subnet_dict,
-                                    filters=filters, fields=fields)
+    def get_subnets(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'subnet', limit, marker)
+        query = self._get_collection_query(context, models_v2.Subnet,
+                                           filters=filters, sorts=sorts,
+                                           limit=limit,
+                                           marker_obj=marker_obj,
+                                           page_reverse=page_reverse)
+        query = self._apply_fields_to_query(query, models_v2.Subnet, fields)
+        return self._fetch_items_with_children(context, query,
+                                               self._make_subnet_dict,
+                                               SUBNET_CHILDREN, fields, sorts,
+                                               page_reverse)
 
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        if (getattr(self.create_port, 'im_func', None) is not
+                QuantumDbPluginV2.create_port.im_func):
+            # The create_port of the plugin has to run for every port.
+            # Plugins can override create_port_bulk to do their work around
+            # _create_ports instead.
+            return self._create_bulk('port', context, ports)
+        items = [port['port'] for port in ports['ports']]
+        try:
+            return self._create_ports(context, items)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_("An exception occured while creating "
+                                "the ports %s"), items)
+
+    def _create_ports(self, context, items):
+        """Create the ports of a bulk request together.
+
+        Unlike a create_port loop, the networks and their subnets are looked
+        up once, the MAC addresses of a network are checked in one query and
+        the IP addresses of the ports without fixed_ips are generated in one
+        pass per network.
+
+        Returns the dicts of the ports, in the order of items. The caller
+        may run it within its own transaction to create its resources of
+        the ports.
+        """
+        # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
+        #                unneeded db action if the operation raises
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in items]
+        results = [None] * len(items)
+        with context.session.begin(subtransactions=True):
+            networks = {}
+            for p in items:
+                if p['network_id'] not in networks:
+                    networks[p['network_id']] = self._get_network(
+                        context, p['network_id'])
+            mac_addresses = self._generate_macs_for_ports(context, items)
+            expiration = self._default_allocation_expiration()
+
+            # The fixed IPs requested by ports are allocated first, the IPs
+            # of the other ports are then generated from the remaining ones
+            for i, p in enumerate(items):
+                if p['fixed_ips'] is not attributes.ATTR_NOT_SPECIFIED:
+                    ips = self._allocate_ips_for_port(
+                        context, networks[p['network_id']], {'port': p})
+                    results[i] = self._add_port(context, p, tenant_ids[i],
+                                                mac_addresses[i], ips,
+                                                expiration)
+            generated_ips = self._generate_ips_for_ports(context, items)
+            for i, ips in generated_ips.iteritems():
+                results[i] = self._add_port(context, items[i], tenant_ids[i],
+                                            mac_addresses[i], ips, expiration)
+
+        return [self._make_port_dict(port, children={'fixed_ips': ips})
+                for port, ips in results]
+
+    def _add_port(self, context, p, tenant_id, mac_address, ips, expiration):
+        """Add a port of _create_ports and its IP allocations."""
+        network_id = p['network_id']
+        port_id = p.get('id') or uuidutils.generate_uuid()
+        port = models_v2.Port(
+            tenant_id=tenant_id,
+            name=p['name'],
+            id=port_id,
+            network_id=network_id,
+            mac_address=mac_address,
+            admin_state_up=p['admin_state_up'],
+            status=p.get('status', constants.PORT_STATUS_ACTIVE),
+            device_id=p['device_id'],
+            device_owner=p['device_owner'])
+        context.session.add(port)
+        for ip in ips:
+            context.session.add(models_v2.IPAllocation(
+                network_id=network_id,
+                port_id=port_id,
+                ip_address=ip['ip_address'],
+                subnet_id=ip['subnet_id'],
+                expiration=expiration))
+        return port, ips
+
+    def _generate_macs_for_ports(self, context, items):
+        """Return the MAC addresses of items, generating the missing ones."""
+        mac_addresses = [p['mac_address'] for p in items]
+        network_ports = collections.defaultdict(list)
+        for i, p in enumerate(items):
+            network_ports[p['network_id']].append(i)
+        for network_id, indexes in network_ports.iteritems():
+            requested = [mac_addresses[i] for i in indexes
+                         if mac_addresses[i] is not
+                         attributes.ATTR_NOT_SPECIFIED]
+            # Ensure that the requested macs are unique on the network
+            used = QuantumDbPluginV2._get_used_macs(context, network_id,
+                                                    requested)
+            seen = set()
+            for mac_address in requested:
+                if mac_address in used or mac_address in seen:
+                    raise q_exc.MacAddressInUse(net_id=network_id,
+                                                mac=mac_address)
+                seen.add(mac_address)
+            missing = [i for i in indexes if mac_addresses[i] is
+                       attributes.ATTR_NOT_SPECIFIED]
+            if missing:
+                generated = QuantumDbPluginV2._generate_macs(
+                    context, network_id, len(missing), seen)
+                for i, mac_address in zip(missing, generated):
+                    mac_addresses[i] = mac_address
+        return mac_addresses
+
+    def _generate_ips_for_ports(self, context, items):
+        """Generate the IPs of the items which do not request fixed_ips.
+
+        Returns a dict mapping the index of each of those items to its IPs.
+        """
+        network_ports = collections.defaultdict(list)
+        for i, p in enumerate(items):
+            if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                network_ports[p['network_id']].append(i)
+        generated_ips = {}
+        for network_id, indexes in network_ports.iteritems():
+            for i in indexes:
+                generated_ips[i] = []
+            filter = {'network_id': [network_id]}
+            subnets = self.get_subnets(context, filters=filter)
+            # One IP of each version for every port
+            for version in (4, 6):
+                version_subnets = [subnet for subnet in subnets
+                                   if subnet['ip_version'] == version]
+                if not version_subnets:
+                    continue
+                ips = QuantumDbPluginV2._generate_ips(context,
+                                                      version_subnets,
+                                                      len(indexes))
+                for i, ip in zip(indexes, ips):
+                    generated_ips[i].append({'ip_address': ip['ip_address'],
+                                             'subnet_id': ip['subnet_id']})
+        return generated_ips
 
     def create_port(self, context, port):
         p = port['port']
@@ -1194,7 +1463,6 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         tenant_id = self._get_tenant_id_for_create(context, p)
 
         with context.session.begin(subtransactions=True):
-            self._recycle_expired_ip_allocations(context, network_id)
             network = self._get_network(context, network_id)
 
             # Ensure that a MAC address is defined and it is unique on the
@@ -1255,8 +1523,6 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             port = self._get_port(context, id)
             # Check if the IPs need to be updated
             if 'fixed_ips' in p:
-                self._recycle_expired_ip_allocations(context,
-                                                     port['network_id'])
                 original = self._make_port_dict(port)
                 ips = self._update_ips_for_port(context,
                                                 port["network_id"],
@@ -1276,7 +1542,17 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
 
             port.update(p)
 
-        return self._make_port_dict(port)
+        port = self._make_port_dict(port)
+        self._notify_routers_using(context, port=port)
+        return port
+
+    def _notify_routers_using(self, context, **kwargs):
+        # The routers synced to the l3 agents include the data of their
+        # ports and subnets. The L3 mixin comes after this class in the
+        # MRO of the plugins, hence the lookup instead of an override.
+        notify = getattr(self, 'notify_routers_using', None)
+        if notify:
+            notify(context, **kwargs)
 
     def delete_port(self, context, id):
         with context.session.begin(subtransactions=True):
@@ -1318,7 +1594,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         port = self._get_port(context, id)
         return self._make_port_dict(port, fields)
 
-    def _get_ports_query(self, context, filters=None):
+    def _get_ports_query(self, context, filters=None, sorts=None, limit=None,
+                         marker_obj=None, page_reverse=False):
         Port = models_v2.Port
         IPAllocation = models_v2.IPAllocation
 
@@ -1338,11 +1615,23 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 query = query.filter(IPAllocation.subnet_id.in_(subnet_ids))
 
         query = self._apply_filters_to_query(query, Port, filters)
+        query = self._apply_sorts_to_query(query, Port, sorts, limit,
+                                           marker_obj, page_reverse)
         return query
 
-    def get_ports(self, context, filters=None, fields=None):
-        query = self._get_ports_query(context, filters)
-        return [self._make_port_dict(c, fields) for c in query.all()]
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None,
+                  page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'port', limit, marker)
+        query = self._get_ports_query(context, filters=filters,
+                                      sorts=sorts, limit=limit,
+                                      marker_obj=marker_obj,
+                                      page_reverse=page_reverse)
+        query = self._apply_fields_to_query(query, models_v2.Port, fields)
+        return self._fetch_items_with_children(context, query,
+                                               self._make_port_dict,
+                                               PORT_CHILDREN, fields, sorts,
+                                               page_reverse)
 
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
@@ -0,0 +1,488 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management drivers.
+
+An IPAM driver keeps track of the free addresses in the allocation pools of
+the subnets and hands them out to ports. QuantumDbPluginV2 remains in charge
+of validating the requests and of the IPAllocation records, the driver is
+only concerned with the availability of addresses.
+"""
+
+import bisect
+
+import netaddr
+import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import orm
+from sqlalchemy.orm import exc
+
+from quantum.common import exceptions as q_exc
+from quantum.db import model_base
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.openstack.common import importutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_DRIVERS = {}
+
+
+def get_driver():
+    """Returns the IPAM driver configured through ipam_driver."""
+    driver_class = cfg.CONF.ipam_driver
+    if driver_class not in _DRIVERS:
+        LOG.debug(_("Loading IPAM driver %s"), driver_class)
+        _DRIVERS[driver_class] = importutils.import_object(driver_class)
+    return _DRIVERS[driver_class]
+
+
+class IpamDriver(object):
+    """Base class for the drivers tracking the free addresses of subnets."""
+
+    def create_pools(self, context, subnet, ip_pools):
+        """Makes the addresses of new allocation pools available.
+
+        :param subnet: the Subnet model the pools belong to
+        :param ip_pools: a list of IPAllocationPool models, already added
+                         to the session
+        """
+        raise NotImplementedError()
+
+    def generate_ips(self, context, subnets, count=1):
+        """Allocates count addresses from the first subnets with free ones.
+
+        Subnets are tried in order, an allocation may therefore span
+        several subnets when the first ones run out of addresses.
+
+        :returns: a list of {'ip_address': ..., 'subnet_id': ...} dicts
+        :raises: IpAddressGenerationFailure when there are not enough free
+                 addresses, in which case none is allocated
+        """
+        raise NotImplementedError()
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Removes ip_address from the free addresses of the subnet.
+
+        Addresses which are not available, e.g. the gateway or an address
+        outside of the allocation pools, are ignored.
+        """
+        raise NotImplementedError()
+
+    def release_ip(self, context, allocation_pool, ip_address):
+        """Gives ip_address back to the free addresses of allocation_pool."""
+        raise NotImplementedError()
+
+
+class RangeIpamDriver(IpamDriver):
+    """Tracks free addresses with one IPAvailabilityRange row per range."""
+
+    def create_pools(self, context, subnet, ip_pools):
+        for ip_pool in ip_pools:
+            ip_range = models_v2.IPAvailabilityRange(
+                ipallocationpool=ip_pool,
+                first_ip=ip_pool['first_ip'],
+                last_ip=ip_pool['last_ip'])
+            context.session.add(ip_range)
+
+    def generate_ips(self, context, subnets, count=1):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool)
+        # Find enough free addresses before changing any range
+        ranges = []
+        available = 0
+        for subnet in subnets:
+            subnet_ranges = range_qry.filter_by(subnet_id=subnet['id']).all()
+            if not subnet_ranges:
+                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                            "allocated"),
+                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+            for range in subnet_ranges:
+                ranges.append((subnet, range))
+                available += (int(netaddr.IPAddress(range['last_ip'])) -
+                              int(netaddr.IPAddress(range['first_ip'])) + 1)
+                if available >= count:
+                    break
+            if available >= count:
+                break
+        else:
+            raise q_exc.IpAddressGenerationFailure(
+                net_id=subnets[0]['network_id'])
+
+        ips = []
+        for subnet, range in ranges:
+            first_ip = netaddr.IPAddress(range['first_ip'])
+            last_ip = netaddr.IPAddress(range['last_ip'])
+            taken = min(count - len(ips), int(last_ip) - int(first_ip) + 1)
+            ips.extend({'ip_address': str(first_ip + i),
+                        'subnet_id': subnet['id']} for i in xrange(taken))
+            LOG.debug(_("Allocated %(count)d IPs from %(first_ip)s to "
+                        "%(last_ip)s"),
+                      {'count': taken,
+                       'first_ip': range['first_ip'],
+                       'last_ip': range['last_ip']})
+            if first_ip + taken > last_ip:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(range)
+            else:
+                # increment the first free
+                range['first_ip'] = str(first_ip + taken)
+        return ips
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange,
+            models_v2.IPAllocationPool).join(
+                models_v2.IPAllocationPool)
+        results = range_qry.filter_by(subnet_id=subnet_id).all()
+        for (range, pool) in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=pool['id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, allocation_pool, ip_address):
+        pool_id = allocation_pool['id']
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(models_v2.IPAvailabilityRange)
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+
+class IPIntervalSet(object):
+    """A set of integers stored as sorted, disjoint, non adjacent intervals.
+
+    The interval holding a value is found with a binary search. The size of
+    the set, and the cost of serializing it, depend on the number of
+    intervals rather than on the number of addresses, so a large pool with
+    few holes stays small.
+    """
+
+    def __init__(self, intervals=None):
+        self._firsts = []
+        self._lasts = []
+        for first, last in sorted(intervals or []):
+            self._append(first, last)
+
+    def _append(self, first, last):
+        if self._lasts and first <= self._lasts[-1] + 1:
+            self._lasts[-1] = max(self._lasts[-1], last)
+        else:
+            self._firsts.append(first)
+            self._lasts.append(last)
+
+    @classmethod
+    def deserialize(cls, value):
+        intervals = []
+        for interval in (value or '').split(','):
+            if interval:
+                first, _sep, last = interval.partition('-')
+                intervals.append((long(first), long(last)))
+        return cls(intervals)
+
+    def serialize(self):
+        return ','.join('%d-%d' % interval for interval in self)
+
+    def __iter__(self):
+        return iter(zip(self._firsts, self._lasts))
+
+    def __len__(self):
+        return len(self._firsts)
+
+    def _index(self, value):
+        # index of the interval which would contain value, or -1
+        return bisect.bisect_right(self._firsts, value) - 1
+
+    def __contains__(self, value):
+        i = self._index(value)
+        return i >= 0 and value <= self._lasts[i]
+
+    def pop(self):
+        """Removes and returns the smallest value of the set."""
+        if not self._firsts:
+            raise KeyError('pop from an empty set')
+        value = self._firsts[0]
+        if value == self._lasts[0]:
+            del self._firsts[0]
+            del self._lasts[0]
+        else:
+            self._firsts[0] = value + 1
+        return value
+
+    def discard(self, value):
+        """Removes value from the set if it is present."""
+        i = self._index(value)
+        if i < 0 or value > self._lasts[i]:
+            return
+        first, last = self._firsts[i], self._lasts[i]
+        if first == last:
+            del self._firsts[i]
+            del self._lasts[i]
+        elif value == first:
+            self._firsts[i] = value + 1
+        elif value == last:
+            self._lasts[i] = value - 1
+        else:
+            # split the interval in two
+            self._lasts[i] = value - 1
+            self._firsts.insert(i + 1, value + 1)
+            self._lasts.insert(i + 1, last)
+
+    def add(self, value):
+        """Adds value to the set, merging it with adjacent intervals."""
+        i = self._index(value)
+        if i >= 0 and value <= self._lasts[i]:
+            return
+        joins_prev = i >= 0 and self._lasts[i] == value - 1
+        joins_next = (i + 1 < len(self._firsts) and
+                      self._firsts[i + 1] == value + 1)
+        if joins_prev and joins_next:
+            self._lasts[i] = self._lasts[i + 1]
+            del self._firsts[i + 1]
+            del self._lasts[i + 1]
+        elif joins_prev:
+            self._lasts[i] = value
+        elif joins_next:
+            self._firsts[i + 1] = value
+        else:
+            self._firsts.insert(i + 1, value)
+            self._lasts.insert(i + 1, value)
+
+
+class IPAvailabilitySet(model_base.BASEV2):
+    """Free addresses of the allocation pools of a subnet.
+
+    The addresses are stored as a serialized IPIntervalSet. An allocation
+    or a release reads and writes this single row, whose size grows with
+    the number of holes in the pools.
+    """
+    subnet_id = sa.Column(sa.String(36),
+                          sa.ForeignKey('subnets.id', ondelete="CASCADE"),
+                          primary_key=True)
+    available = sa.Column(sa.Text, nullable=False, default='')
+    subnet = orm.relationship(models_v2.Subnet,
+                              backref=orm.backref('ip_availability',
+                                                  uselist=False,
+                                                  cascade='delete'))
+
+
+class IntervalIpamDriver(IpamDriver):
+    """Tracks the free addresses of a subnet in a single row.
+
+    Compared to RangeIpamDriver, an operation issues one locked select and
+    one update instead of several range queries, inserts and deletes, and a
+    bulk allocation parses and writes the row once per subnet. The row is
+    rewritten whole each time, and the allocations of a subnet are
+    serialized by its lock, so this does not help subnets whose free
+    addresses are fragmented into many intervals or which see many
+    concurrent allocations.
+
+    Subnets created while RangeIpamDriver was in use are converted on first
+    use: their IPAvailabilityRange rows are folded into an IPAvailabilitySet
+    and removed.
+    """
+
+    def create_pools(self, context, subnet, ip_pools):
+        free = IPIntervalSet((int(netaddr.IPAddress(pool['first_ip'])),
+                              int(netaddr.IPAddress(pool['last_ip'])))
+                             for pool in ip_pools)
+        context.session.add(IPAvailabilitySet(subnet_id=subnet['id'],
+                                              available=free.serialize()))
+
+    def _migrate_ranges(self, context, subnet_id):
+        # The row is inserted first, in a savepoint: a concurrent conversion
+        # of the same subnet waits for it and then fails with a duplicate
+        # key, in which case it returns None and the caller selects the row
+        # it created.
+        availability = IPAvailabilitySet(subnet_id=subnet_id, available='')
+        try:
+            with context.session.begin_nested():
+                context.session.add(availability)
+        except sa_exc.IntegrityError:
+            LOG.debug(_("Availability ranges of subnet %s already "
+                        "converted"), subnet_id)
+            return
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id)
+        ranges = range_qry.all()
+        free = IPIntervalSet((int(netaddr.IPAddress(r['first_ip'])),
+                              int(netaddr.IPAddress(r['last_ip'])))
+                             for r in ranges)
+        LOG.debug(_("Converting the %(count)d availability ranges of subnet "
+                    "%(subnet_id)s"),
+                  {'count': len(ranges), 'subnet_id': subnet_id})
+        for r in ranges:
+            context.session.delete(r)
+        availability['available'] = free.serialize()
+        return availability
+
+    def _get_availability(self, context, subnet_id):
+        # NOTE: the row is locked so that concurrent allocations on the
+        # subnet cannot hand out the same address twice, and reloaded since
+        # another transaction may have changed it. populate_existing skips
+        # the autoflush, hence the explicit flush of our own changes.
+        context.session.flush()
+        query = context.session.query(IPAvailabilitySet)
+        query = query.filter_by(subnet_id=subnet_id).with_lockmode('update')
+        try:
+            return query.populate_existing().one()
+        except exc.NoResultFound:
+            pass
+        availability = self._migrate_ranges(context, subnet_id)
+        if availability is None:
+            availability = query.populate_existing().one()
+        return availability
+
+    @staticmethod
+    def _load(availability):
+        # the parsed set is cached on the row for as long as its serialized
+        # form does not change, e.g. during a bulk operation
+        cached = getattr(availability, '_free_ips', None)
+        if cached is None or cached[0] != availability['available']:
+            cached = (availability['available'],
+                      IPIntervalSet.deserialize(availability['available']))
+            availability._free_ips = cached
+        return cached[1]
+
+    @staticmethod
+    def _store(availability, free):
+        availability['available'] = free.serialize()
+        availability._free_ips = (availability['available'], free)
+
+    def generate_ips(self, context, subnets, count=1):
+        ips = []
+        taken = []
+        for subnet in subnets:
+            availability = self._get_availability(context, subnet['id'])
+            free = self._load(availability)
+            popped = []
+            while free and len(ips) < count:
+                popped.append(free.pop())
+                ip_address = str(netaddr.IPAddress(popped[-1]))
+                LOG.debug(_("Allocated IP - %(ip_address)s from subnet "
+                            "%(subnet_id)s"),
+                          {'ip_address': ip_address,
+                           'subnet_id': subnet['id']})
+                ips.append({'ip_address': ip_address,
+                            'subnet_id': subnet['id']})
+            self._store(availability, free)
+            if len(ips) == count:
+                return ips
+            taken.append((availability, free, popped))
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        # Give the addresses back, they may be generated again once the
+        # expired allocations are recycled
+        for availability, free, popped in taken:
+            for ip in popped:
+                free.add(ip)
+            self._store(availability, free)
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        availability = self._get_availability(context, subnet_id)
+        free = self._load(availability)
+        free.discard(int(netaddr.IPAddress(ip_address)))
+        self._store(availability, free)
+
+    def release_ip(self, context, allocation_pool, ip_address):
+        LOG.debug(_("Recycle %s"), ip_address)
+        availability = self._get_availability(context,
+                                              allocation_pool['subnet_id'])
+        free = self._load(availability)
+        free.add(int(netaddr.IPAddress(ip_address)))
+        self._store(availability, free)
@@ -52,6 +52,9 @@ class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     admin_state_up = sa.Column(sa.Boolean)
     gw_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'))
     gw_port = orm.relationship(models_v2.Port)
+    # bumped whenever the data synced to the l3 agents changes
+    revision = sa.Column(sa.Integer, nullable=False, default=0,
+                         server_default='0')
 
 
 class ExternalNetwork(model_base.BASEV2):
@@ -158,11 +161,19 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             # Ensure we actually have something to update
             if r.keys():
                 router_db.update(r)
-        routers = self.get_sync_data(context.elevated(),
-                                     [router_db['id']])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+        self._notify_routers_updated(context, [router_db['id']])
         return self._make_router_dict(router_db)
 
+    def _notify_routers_updated(self, context, router_ids):
+        """Bump the revision of the routers and notify the l3 agents."""
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Router)
+            query.filter(Router.id.in_(router_ids)).update(
+                {'revision': Router.revision + 1},
+                synchronize_session='fetch')
+        routers = self.get_sync_data(context.elevated(), router_ids)
+        l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+
     def _update_router_gw_info(self, context, router_id, info):
         # TODO(salvatore-orlando): guarantee atomic behavior also across
         # operations that span beyond the model classes handled by this
@@ -255,10 +266,17 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         router = self._get_router(context, id)
         return self._make_router_dict(router, fields)
 
-    def get_routers(self, context, filters=None, fields=None):
+    def get_routers(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'router', limit, marker)
         return self._get_collection(context, Router,
                                     self._make_router_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     def get_routers_count(self, context, filters=None):
         return self._get_collection_count(context, Router,
@@ -352,8 +370,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                  'device_owner': DEVICE_OWNER_ROUTER_INTF,
                  'name': ''}})
 
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+        self._notify_routers_updated(context, [router_id])
         info = {'port_id': port['id'],
                 'subnet_id': port['fixed_ips'][0]['subnet_id']}
         notifier_api.notify(context,
@@ -430,8 +447,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             if not found:
                 raise l3.RouterInterfaceNotFoundForSubnet(router_id=router_id,
                                                           subnet_id=subnet_id)
-        routers = self.get_sync_data(context.elevated(), [router_id])
-        l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+        self._notify_routers_updated(context, [router_id])
         notifier_api.notify(context,
                             notifier_api.publisher_id('network'),
                             'router.interface.delete',
@@ -641,8 +657,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             raise
         router_id = floatingip_db['router_id']
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_routers_updated(context, [router_id])
         return self._make_floatingip_dict(floatingip_db)
 
     def update_floatingip(self, context, id, floatingip):
@@ -663,8 +678,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         if router_id and router_id != before_router_id:
             router_ids.append(router_id)
         if router_ids:
-            routers = self.get_sync_data(context.elevated(), router_ids)
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_routers_updated(context, router_ids)
         return self._make_floatingip_dict(floatingip_db)
 
     def delete_floatingip(self, context, id):
@@ -676,17 +690,23 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                              floatingip['floating_port_id'],
                              l3_port_check=False)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_routers_updated(context, [router_id])
 
     def get_floatingip(self, context, id, fields=None):
         floatingip = self._get_floatingip(context, id)
         return self._make_floatingip_dict(floatingip, fields)
 
-    def get_floatingips(self, context, filters=None, fields=None):
+    def get_floatingips(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'floatingip', limit, marker)
         return self._get_collection(context, FloatingIP,
                                     self._make_floatingip_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     def get_floatingips_count(self, context, filters=None):
         return self._get_collection_count(context, FloatingIP,
@@ -723,8 +743,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 raise Exception(_('Multiple floating IPs found for port %s')
                                 % port_id)
         if router_id:
-            routers = self.get_sync_data(context.elevated(), [router_id])
-            l3_rpc_agent_api.L3AgentNotify.routers_updated(context, routers)
+            self._notify_routers_updated(context, [router_id])
 
     def _check_l3_view_auth(self, context, network):
         return policy.check(context,
@@ -834,7 +853,11 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         router_id_gw_port_id_dict = {}
         for router in routers:
             router_id_gw_port_id_dict[router.id] = router.gw_port_id
-        routers_list = [self._make_router_dict(c, None) for c in routers]
+        routers_list = []
+        for router in routers:
+            router_dict = self._make_router_dict(router, None)
+            router_dict['revision'] = router.revision
+            routers_list.append(router_dict)
         for router in routers_list:
             gw_port_id = router_id_gw_port_id_dict[router['id']]
             if gw_port_id:
@@ -929,6 +952,52 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             interfaces = self._get_sync_interfaces(context, router_ids)
         return self._process_sync_data(routers, interfaces, floating_ips)
 
+    def get_changed_router_ids(self, context, known_revisions,
+                               router_ids=None):
+        """Compare the revisions known by an agent with the current ones.
+
+        @param known_revisions: the revisions of the routers known by the
+                                agent, by router id.
+        @param router_ids: the list of router ids to consider, all of the
+                           routers if it is None.
+        @return: a dict with the sorted ids of the new and changed routers
+                 in 'changed_router_ids' and the known routers which do not
+                 exist any longer in 'deleted_router_ids'.
+        """
+        query = context.session.query(Router.id, Router.revision)
+        if router_ids:
+            query = query.filter(Router.id.in_(router_ids))
+        revisions = dict(query)
+        deleted_router_ids = [router_id for router_id in known_revisions
+                              if router_id not in revisions]
+        changed_router_ids = sorted(
+            router_id for router_id, revision in revisions.iteritems()
+            if known_revisions.get(router_id) != revision)
+        return {'changed_router_ids': changed_router_ids,
+                'deleted_router_ids': deleted_router_ids}
+
+    def notify_routers_using(self, context, port=None, subnet_id=None):
+        """Notify the l3 agents of a change of a router port or subnet.
+
+        The sync data of the routers includes their ports and the subnets
+        of these, which are updated through the core API rather than this
+        mixin.
+        """
+        if port is not None:
+            if port['device_owner'] not in (DEVICE_OWNER_ROUTER_INTF,
+                                            DEVICE_OWNER_ROUTER_GW):
+                return
+            router_ids = [port['device_id']]
+        else:
+            query = context.session.query(models_v2.Port.device_id)
+            query = query.join(models_v2.IPAllocation).filter(
+                models_v2.IPAllocation.subnet_id == subnet_id,
+                models_v2.Port.device_owner.in_([DEVICE_OWNER_ROUTER_INTF,
+                                                 DEVICE_OWNER_ROUTER_GW]))
+            router_ids = [router_id for router_id, in query.distinct()]
+        if router_ids:
+            self._notify_routers_updated(context, router_ids)
+
     def get_external_network_id(self, context):
         nets = self.get_networks(context, {'router:external': [True]})
         if len(nets) > 1:
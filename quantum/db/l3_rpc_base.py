@@ -29,19 +29,39 @@ class L3RpcCallbackMixin(object):
         """Sync routers according to filters to a specific agent.
 
         @param context: contain user information
-        @param kwargs: host, or router_id
+        @param kwargs: host, or router_ids
         @return: a list of routers
                  with their interfaces and floating_ips
         """
-        router_id = kwargs.get('router_id')
+        router_ids = kwargs.get('router_ids')
         # TODO(gongysh) we will use host in kwargs for multi host BP
         context = quantum_context.get_admin_context()
         plugin = manager.QuantumManager.get_plugin()
-        routers = plugin.get_sync_data(context, router_id)
+        routers = plugin.get_sync_data(context, router_ids)
         LOG.debug(_("Routers returned to l3 agent:\n %s"),
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def get_changed_routers(self, context, **kwargs):
+        """Get the routers changed since the revisions known by an agent.
+
+        @param context: contain user information
+        @param kwargs: host, router_revisions, and optionally router_ids
+        @return: the ids of the new and changed routers and of the known
+                 routers which were deleted, as returned by
+                 get_changed_router_ids
+        """
+        context = quantum_context.get_admin_context()
+        plugin = manager.QuantumManager.get_plugin()
+        changes = plugin.get_changed_router_ids(
+            context, kwargs.get('router_revisions') or {},
+            router_ids=kwargs.get('router_ids'))
+        LOG.debug(_("Router changes returned to l3 agent: %(changed)d "
+                    "changed, %(deleted)d deleted"),
+                  {'changed': len(changes['changed_router_ids']),
+                   'deleted': len(changes['deleted_router_ids'])})
+        return changes
+
     def get_external_network_id(self, context, **kwargs):
         """Get one external network id for l3 agent.
 
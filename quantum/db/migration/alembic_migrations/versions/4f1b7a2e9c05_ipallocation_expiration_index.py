@@ -0,0 +1,53 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""ipallocation expiration index
+
+Revision ID: 4f1b7a2e9c05
+Revises: 2e3c1b9a7d4f
+Create Date: 2013-02-14 15:03:22.186210
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f1b7a2e9c05'
+down_revision = '2e3c1b9a7d4f'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = ['*']
+
+from alembic import op
+
+from quantum.db import migration
+
+
+def upgrade(active_plugin=None, options=None):
+    if not migration.should_run(active_plugin, migration_for_plugins):
+        return
+
+    op.create_index('ix_ipallocations_network_id_port_id_expiration',
+                    'ipallocations',
+                    ['network_id', 'port_id', 'expiration'])
+
+
+def downgrade(active_plugin=None, options=None):
+    if not migration.should_run(active_plugin, migration_for_plugins):
+        return
+
+    op.drop_index('ix_ipallocations_network_id_port_id_expiration',
+                  'ipallocations')
@@ -90,6 +90,11 @@ class IPAllocation(model_base.BASEV2):
                                                         ondelete="CASCADE"),
                            nullable=False, primary_key=True)
     expiration = sa.Column(sa.DateTime, nullable=True)
+    __table_args__ = (
+        sa.Index('ix_ipallocations_network_id_port_id_expiration',
+                 'network_id', 'port_id', 'expiration'),
+        sa.Index('ix_ipallocations_port_id_expiration',
+                 'port_id', 'expiration'))
 
 
 class Port(model_base.BASEV2, HasId, HasTenant):
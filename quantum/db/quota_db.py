@@ -15,11 +15,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
 
 from quantum.common import exceptions
 from quantum.db import model_base
 from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+from quantum.openstack.common import uuidutils
+
+LOG = logging.getLogger(__name__)
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +42,28 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the usage of a resource by a tenant.
+
+    in_use is the number of existing resources and reserved the number of
+    resources being created. A dirty usage is counted again on its next
+    reservation.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    reserved = sa.Column(sa.Integer, nullable=False, default=0)
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represent a change of a usage not committed or cancelled yet."""
+    tenant_id = sa.Column(sa.String(255), nullable=False)
+    resource = sa.Column(sa.String(255), nullable=False)
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False, index=True)
+
+
 class DbQuotaDriver(object):
     """
     Driver to perform necessary checks to enforce quotas and obtain
@@ -184,3 +215,138 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+class DbQuotaUsageDriver(DbQuotaDriver):
+    """
+    Driver tracking the usages of the resources in the database.
+
+    The quota of a resource is checked against a quotausages row updated
+    by reservations, instead of counting the resources of the tenant on
+    each request. A usage is counted when its row is created, and again
+    after the periodic resync marked it dirty.
+
+    Only the creates and deletes going through the API make reservations.
+    The resources a plugin creates or deletes on its own, e.g. the DHCP
+    and router ports or the ports deleted along with their network, are
+    not accounted for until the next resync.
+    """
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta, count):
+        """Reserve a change of the usage of a resource.
+
+        A positive delta is checked against the quota and added to the
+        reserved resources until the reservation is committed or
+        cancelled.  If the quota is exceeded, an OverQuota exception is
+        raised.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The name of the resource.
+        :param delta: The number of resources created, negative for
+                      deleted resources.
+        :param count: A callable returning the current count of the
+                      resource.
+        :return: The ID of the reservation, or None when there is no
+                 usage to update.
+        """
+        with context.session.begin(subtransactions=True):
+            usage = self._get_usage(context, tenant_id, resource)
+            if delta < 0 and (usage is None or usage.dirty):
+                # The next count of the usage will account for it
+                return
+            if usage is None:
+                usage = self._create_usage(context, tenant_id, resource,
+                                           count)
+            if usage.dirty:
+                usage.in_use = count()
+                usage.dirty = False
+            if delta > 0:
+                limit = self.get_tenant_quotas(
+                    context, {resource: resources[resource]},
+                    tenant_id)[resource]
+                used = usage.in_use + usage.reserved
+                if limit >= 0 and used + delta > limit:
+                    raise exceptions.OverQuota(overs=[resource])
+                usage.reserved += delta
+            expiration = timeutils.utcnow() + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.reservation_expire)
+            reservation = Reservation(id=uuidutils.generate_uuid(),
+                                      tenant_id=tenant_id,
+                                      resource=resource,
+                                      delta=delta,
+                                      expiration=expiration)
+            context.session.add(reservation)
+        return reservation.id
+
+    def commit_reservation(self, context, reservation_id):
+        """Apply a reservation to the usage it was made for."""
+        self._end_reservation(context, reservation_id, True)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release the resources reserved by a reservation."""
+        self._end_reservation(context, reservation_id, False)
+
+    def resync_usages(self, context):
+        """Expire the stale reservations and mark all the usages dirty.
+
+        Each usage is counted again on its next reservation, which fixes
+        the drift left by interrupted requests or by resources created or
+        deleted without going through the API.
+        """
+        with context.session.begin(subtransactions=True):
+            expired = (context.session.query(Reservation).
+                       filter(Reservation.expiration <= timeutils.utcnow()).
+                       with_lockmode('update').all())
+            for reservation in expired:
+                self._apply_reservation(context, reservation, False)
+            context.session.query(QuotaUsage).update(
+                {'dirty': True}, synchronize_session=False)
+        if expired:
+            LOG.info(_("Expired %d quota reservations"), len(expired))
+
+    def _end_reservation(self, context, reservation_id, commit):
+        with context.session.begin(subtransactions=True):
+            reservation = (context.session.query(Reservation).
+                           filter_by(id=reservation_id).
+                           with_lockmode('update').first())
+            if not reservation:
+                # The periodic resync fixes the usage
+                LOG.warn(_("Quota reservation %s expired"), reservation_id)
+                return
+            self._apply_reservation(context, reservation, commit)
+
+    def _apply_reservation(self, context, reservation, commit):
+        usage = self._get_usage(context, reservation.tenant_id,
+                                reservation.resource)
+        if usage:
+            if reservation.delta > 0:
+                usage.reserved = max(usage.reserved - reservation.delta, 0)
+            if commit and not usage.dirty:
+                usage.in_use = max(usage.in_use + reservation.delta, 0)
+        context.session.delete(reservation)
+
+    def _create_usage(self, context, tenant_id, resource, count):
+        # There is no row to lock yet: it is inserted in a savepoint, and a
+        # concurrent reservation inserting the same usage waits for it and
+        # then fails with a duplicate key. Either way the row is selected
+        # again with the lock held.
+        try:
+            with context.session.begin_nested():
+                context.session.add(QuotaUsage(tenant_id=tenant_id,
+                                               resource=resource,
+                                               in_use=count(), reserved=0,
+                                               dirty=False))
+        except sa_exc.IntegrityError:
+            LOG.debug(_("Usage of %(resource)s by tenant %(tenant_id)s "
+                        "already created"),
+                      {'resource': resource, 'tenant_id': tenant_id})
+        return self._get_usage(context, tenant_id, resource)
+
+    @staticmethod
+    def _get_usage(context, tenant_id, resource):
+        return (context.session.query(QuotaUsage).
+                filter_by(tenant_id=tenant_id, resource=resource).
+                with_lockmode('update').first())
@@ -15,13 +15,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 import netaddr
+from sqlalchemy import sql
 
 from quantum.common import constants as q_const
 from quantum.common import utils
+from quantum.db import db_base_plugin_v2
 from quantum.db import models_v2
 from quantum.db import securitygroups_db as sg_db
 from quantum.extensions import securitygroup as ext_sg
+from quantum import manager
 from quantum.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -83,6 +88,23 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         self._extend_port_dict_security_group(context, updated_port)
         return need_notify
 
+    def notify_security_groups_member_added(self, context, ports):
+        """Notify the agents of the security groups of new ports."""
+        security_groups = set()
+        dhcp_port_added = False
+        for port in ports:
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                dhcp_port_added = True
+            else:
+                security_groups.update(port.get(ext_sg.SECURITYGROUPS) or [])
+        # Note(nati): In order to allow dhcp packets,
+        # changes for dhcp ip should be notifified
+        if dhcp_port_added:
+            self.notifier.security_groups_provider_updated(context)
+        if security_groups:
+            self.notifier.security_groups_member_updated(
+                context, list(security_groups))
+
     def is_security_group_member_updated(self, context,
                                          original_port, updated_port):
         """ check security group member updated or not
@@ -118,16 +140,101 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_from_devices(context, devices)
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """ return security group rules and remote group members
+
+        source_group_id rules are not converted, the members of the
+        source groups are returned once for all the ports instead,
+        for the agent to match them with ipsets
+
+        :params devices: list of devices
+        :returns: dict with
+          devices: port correspond to the devices with security group rules
+          sg_member_ips: {security_group_id: {ethertype: [ip, ...]}}
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_from_devices(context, devices)
+        return self._security_group_info_for_ports(context, ports)
+
+    def get_ports_from_devices(self, context, devices):
+        """ return the ports of the devices keyed by port id
 
+        This looks the devices up one by one with get_port_from_device,
+        plugins should override it to load all the devices at once with
+        _select_ports_for_devices.
+        """
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
-            if not port:
-                continue
-            if port['device_owner'].startswith('network:'):
+            if port:
+                ports[port['id']] = port
+        return ports
+
+    def _get_ports_from_devices(self, context, devices):
+        ports = self.get_ports_from_devices(context, devices)
+        return dict((port_id, port) for port_id, port in ports.iteritems()
+                    if not port['device_owner'].startswith('network:'))
+
+    def _select_ports_for_devices(self, context, port_ids,
+                                  prefix_match=False):
+        """ load the ports of devices with their security groups
+
+        The ports, their security group bindings and their fixed ips
+        are loaded with two queries whatever the number of devices.
+
+        :params port_ids: maps each device to the id of its port, or to
+                          the beginning of that id when prefix_match is set
+        :returns: port dicts, as returned by get_port_from_device,
+                  keyed by port id
+        """
+        if not port_ids:
+            return {}
+        devices_by_port_id = dict((port_id, device)
+                                  for device, port_id in port_ids.iteritems())
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+
+        query = context.session.query(models_v2.Port, sg_binding_sgid)
+        query = query.outerjoin(sg_db.SecurityGroupPortBinding,
+                                models_v2.Port.id == sg_binding_port)
+        if prefix_match:
+            query = query.filter(sql.or_(
+                *[models_v2.Port.id.startswith(port_id)
+                  for port_id in devices_by_port_id]))
+        else:
+            query = query.filter(models_v2.Port.id.in_(devices_by_port_id))
+        ports_in_db = {}
+        sgs_by_port = collections.defaultdict(list)
+        for port, sg_id in query:
+            ports_in_db[port['id']] = port
+            if sg_id:
+                sgs_by_port[port['id']].append(sg_id)
+
+        plugin = manager.QuantumManager.get_plugin()
+        children = plugin._load_children(context, ports_in_db.values(), None,
+                                         db_base_plugin_v2.PORT_CHILDREN)
+        lengths = set(len(port_id) for port_id in devices_by_port_id)
+        ports = {}
+        for port_id, port in ports_in_db.iteritems():
+            for length in lengths:
+                device = devices_by_port_id.get(port_id[:length])
+                if device:
+                    break
+            else:
                 continue
-            ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+            port_dict = plugin._make_port_dict(port,
+                                               children=children[port_id])
+            port_dict[ext_sg.SECURITYGROUPS] = sgs_by_port[port_id]
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port_dict['fixed_ips']]
+            port_dict['device'] = device
+            ports[port_id] = port_dict
+        return ports
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -279,6 +386,30 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
+        self._add_security_group_rules(context, ports)
+        return self._convert_source_group_id_to_ip_prefix(context, ports)
+
+    def _security_group_info_for_ports(self, context, ports):
+        self._add_security_group_rules(context, ports)
+        source_group_ids = self._select_source_group_ids(ports)
+        ips = self._select_ips_for_source_group(context, source_group_ids)
+        sg_member_ips = {}
+        for source_group_id, group_ips in ips.iteritems():
+            member_ips = {q_const.IPv4: [], q_const.IPv6: []}
+            for ip in group_ips:
+                version = netaddr.IPAddress(ip).version
+                member_ips['IPv%s' % version].append(ip)
+            sg_member_ips[source_group_id] = member_ips
+        for port in ports.values():
+            for rule in port['security_group_rules']:
+                source_group_id = rule.get('source_group_id')
+                if source_group_id:
+                    port['security_group_source_groups'].append(
+                        source_group_id)
+        return {'devices': ports,
+                'sg_member_ips': sg_member_ips}
+
+    def _add_security_group_rules(self, context, ports):
         rules_in_db = self._select_rules_for_ports(context, ports)
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
@@ -298,4 +429,3 @@ class SecurityGroupServerRpcCallbackMixin(object):
                     rule_dict[key] = rule_in_db[key]
             port['security_group_rules'].append(rule_dict)
         self._apply_provider_rule(context, ports)
-        return self._convert_source_group_id_to_ip_prefix(context, ports)
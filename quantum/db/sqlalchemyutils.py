@@ -0,0 +1,117 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sqlalchemy
+from sqlalchemy import orm
+from sqlalchemy.orm import properties
+
+from quantum.common import exceptions as q_exc
+
+
+def _get_sort_attr(model, sort_key):
+    sort_key_attr = getattr(model, sort_key, None)
+    if sort_key_attr is None:
+        msg = _("%s is invalid attribute for sort_key") % sort_key
+        raise q_exc.BadRequest(resource='sort', msg=msg)
+    if isinstance(getattr(sort_key_attr, 'property', None),
+                  properties.RelationshipProperty):
+        msg = (_("The attribute '%(attr)s' is reference to other resource, "
+                 "can't be used by sort '%(resource)s'") %
+               {'attr': sort_key, 'resource': model.__tablename__})
+        raise q_exc.BadRequest(resource='sort', msg=msg)
+    return sort_key_attr
+
+
+def paginate_query(query, model, limit, sorts, marker_obj=None):
+    """Returns a query with sorting and (optionally) paging applied.
+
+    Pagination works by requiring a unique sort key, specified by sorts.
+    (If sorts is not unique, then we risk looping through values.)
+    We use the last row in the previous page as the 'marker' for pagination.
+    So we must return values that follow the passed marker in the order.
+    With a single-valued sort key, this would be easy: sort_key > X.
+    With a compound-values sort key, (k1, k2, k3) we must do this to repeat
+    the lexicographical ordering:
+    (k1 > X1) or (k1 == X1 && k2 > X2) or (k1 == X1 && k2 == X2 && k3 > X3)
+    The reason of doing so is that SQL does not support tuple comparison
+    in a portable way.
+
+    :param query: the query object to which we should add paging/sorting
+    :param model: the ORM model class
+    :param limit: maximum number of items to return
+    :param sorts: a list of (sort_key, is_ascending) tuples; the last key
+                  should be a unique key of the model, e.g. 'id'
+    :param marker_obj: the last item of the previous page; we return the
+                       next results after this item.
+    :rtype: sqlalchemy.orm.query.Query
+    :return: The query with sorting/pagination added.
+    """
+    if not sorts:
+        return query
+
+    sort_attrs = []
+    for sort_key, ascending in sorts:
+        sort_key_attr = _get_sort_attr(model, sort_key)
+        sort_dir_func = sqlalchemy.asc if ascending else sqlalchemy.desc
+        query = query.order_by(sort_dir_func(sort_key_attr))
+        sort_attrs.append(sort_key_attr)
+
+    if marker_obj:
+        marker_values = [getattr(marker_obj, sort_key)
+                         for sort_key, _ascending in sorts]
+        criteria_list = []
+        for i, (_sort_key, ascending) in enumerate(sorts):
+            crit_attrs = [(sort_attrs[j] == marker_values[j])
+                          for j in xrange(i)]
+            if ascending:
+                crit_attrs.append(sort_attrs[i] > marker_values[i])
+            else:
+                crit_attrs.append(sort_attrs[i] < marker_values[i])
+            criteria_list.append(sqlalchemy.sql.and_(*crit_attrs))
+        query = query.filter(sqlalchemy.sql.or_(*criteria_list))
+
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def restrict_columns(query, model, fields):
+    """Returns a query which only loads the columns named in fields.
+
+    Every other column of the model is deferred, so the SELECT issued for
+    the query does not carry it; primary keys are always loaded since the
+    ORM needs them to build the identity of each row. A deferred column is
+    still loaded on first access, which keeps callers correct even if they
+    touch an attribute which was not requested.
+
+    :param query: the query object to restrict
+    :param model: the ORM model class
+    :param fields: a list of attribute names to load; an empty list or None
+                   leaves the query untouched
+    :rtype: sqlalchemy.orm.query.Query
+    """
+    if not fields:
+        return query
+    mapper = orm.class_mapper(model)
+    deferred = [orm.defer(prop.key)
+                for prop in mapper.iterate_properties
+                if (isinstance(prop, properties.ColumnProperty) and
+                    prop.key not in fields and
+                    not any(col.primary_key for col in prop.columns))]
+    if deferred:
+        query = query.options(*deferred)
+    return query
@@ -22,6 +22,7 @@ from quantum.api.v2 import attributes as attr
 from quantum.api.v2 import base
 from quantum.common import exceptions as qexception
 from quantum import manager
+from quantum.openstack.common import cfg
 from quantum.plugins.common import constants
 from quantum.plugins.services.service_base import ServicePluginBase
 
@@ -272,10 +273,11 @@ class Loadbalancer(extensions.ExtensionDescriptor):
             if resource_name == 'pool':
                 member_actions = {'stats': 'GET'}
 
-            controller = base.create_resource(collection_name,
-                                              resource_name,
-                                              plugin, params,
-                                              member_actions=member_actions)
+            controller = base.create_resource(
+                collection_name, resource_name, plugin, params,
+                member_actions=member_actions,
+                allow_pagination=cfg.CONF.allow_pagination,
+                allow_sorting=cfg.CONF.allow_sorting)
 
             resource = extensions.ResourceExtension(
                 collection_name,
@@ -293,10 +295,11 @@ class Loadbalancer(extensions.ExtensionDescriptor):
             params = SUB_RESOURCE_ATTRIBUTE_MAP[collection_name].get(
                 'parameters')
 
-            controller = base.create_resource(collection_name, resource_name,
-                                              plugin, params,
-                                              allow_bulk=True,
-                                              parent=parent)
+            controller = base.create_resource(
+                collection_name, resource_name, plugin, params,
+                allow_bulk=True, parent=parent,
+                allow_pagination=cfg.CONF.allow_pagination,
+                allow_sorting=cfg.CONF.allow_sorting)
 
             resource = extensions.ResourceExtension(
                 collection_name,
@@ -156,6 +156,7 @@ class Quotasv2(extensions.ExtensionDescriptor):
             return {}
 
     def check_env(self):
-        if cfg.CONF.QUOTAS.quota_driver != DB_QUOTA_DRIVER:
+        driver = importutils.import_class(cfg.CONF.QUOTAS.quota_driver)
+        if not issubclass(driver, importutils.import_class(DB_QUOTA_DRIVER)):
             msg = _('Quota driver %s is needed.') % DB_QUOTA_DRIVER
             raise exceptions.InvalidExtenstionEnv(reason=msg)
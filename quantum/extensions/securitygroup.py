@@ -297,9 +297,11 @@ class Securitygroup(extensions.ExtensionDescriptor):
             collection_name = resource_name.replace('_', '-') + "s"
             params = RESOURCE_ATTRIBUTE_MAP.get(resource_name + "s", dict())
             quota.QUOTAS.register_resource_by_name(resource_name)
-            controller = base.create_resource(collection_name,
-                                              resource_name,
-                                              plugin, params, allow_bulk=True)
+            controller = base.create_resource(
+                collection_name, resource_name, plugin, params,
+                allow_bulk=True,
+                allow_pagination=cfg.CONF.allow_pagination,
+                allow_sorting=cfg.CONF.allow_sorting)
 
             ex = extensions.ResourceExtension(collection_name,
                                               controller,
@@ -329,7 +331,9 @@ class SecurityGroupPluginBase(object):
         pass
 
     @abstractmethod
-    def get_security_groups(self, context, filters=None, fields=None):
+    def get_security_groups(self, context, filters=None, fields=None,
+                            sorts=None, limit=None, marker=None,
+                            page_reverse=False):
         pass
 
     @abstractmethod
@@ -345,7 +349,9 @@ class SecurityGroupPluginBase(object):
         pass
 
     @abstractmethod
-    def get_security_group_rules(self, context, filters=None, fields=None):
+    def get_security_group_rules(self, context, filters=None, fields=None,
+                                 sorts=None, limit=None, marker=None,
+                                 page_reverse=False):
         pass
 
     @abstractmethod
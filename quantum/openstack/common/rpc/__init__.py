@@ -205,6 +205,22 @@ def cleanup():
     return _get_impl().cleanup()
 
 
+def reset():
+    """Forget the connections opened by the RPC implementation.
+
+    This is meant to be called in a forked process: the connections it
+    inherited are shared with its parent and must not be reused, new ones
+    are opened on demand.
+
+    :returns: None
+    """
+    if _RPCIMPL is None:
+        return
+    connection_cls = getattr(_RPCIMPL, 'Connection', None)
+    if getattr(connection_cls, 'pool', None):
+        connection_cls.pool = None
+
+
 def cast_to_server(context, server_params, topic, msg):
     """Invoke a remote method that does not return anything.
 
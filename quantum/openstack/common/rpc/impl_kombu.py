@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import functools
 import itertools
 import socket
@@ -96,6 +97,9 @@ cfg.CONF.register_opts(kombu_opts)
 
 LOG = rpc_common.LOG
 
+# Most recently used publishers kept per connection
+PUBLISHER_CACHE_SIZE = 64
+
 
 def _get_queue_arguments(conf):
     """Construct the arguments for declaring a queue.
@@ -389,6 +393,11 @@ class Connection(object):
         self.consumers = []
         self.consumer_thread = None
         self.proxy_callbacks = []
+        # (publisher class, topic, options) -> Publisher bound to the
+        # current channel, so that an exchange is declared once per channel
+        self.publishers = {}
+        # the keys of the publishers, least recently used first
+        self.publisher_keys = collections.deque()
         self.conf = conf
         self.max_retries = self.conf.rabbit_max_retries
         # Try forever?
@@ -483,6 +492,7 @@ class Connection(object):
             # Kludge to speed up tests.
             self.connection.transport.polling_interval = 0.0
         self.consumer_num = itertools.count(1)
+        self._clear_publishers()
         self.connection.connect()
         self.channel = self.connection.channel()
         # work around 'memory' transport bug in 1.1.3
@@ -583,12 +593,21 @@ class Connection(object):
         """Reset a connection so it can be used again"""
         self.cancel_consumer_thread()
         self.wait_on_proxy_callbacks()
+        if not self.consumers:
+            # Nothing was declared on the channel, keep it along with the
+            # publishers bound to it
+            return
         self.channel.close()
         self.channel = self.connection.channel()
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
         self.consumers = []
+        self._clear_publishers()
+
+    def _clear_publishers(self):
+        self.publishers.clear()
+        self.publisher_keys.clear()
 
     def declare_consumer(self, consumer_cls, topic, callback):
         """Create a Consumer using the class that was passed in and
@@ -662,8 +681,18 @@ class Connection(object):
                           "'%(topic)s': %(err_str)s") % log_info)
 
         def _publish():
-            publisher = cls(self.conf, self.channel, topic, **kwargs)
+            key = (cls, topic, tuple(sorted(kwargs.items())))
+            # A publisher failing to send is dropped from the cache
+            publisher = self.publishers.pop(key, None)
+            if publisher is None:
+                publisher = cls(self.conf, self.channel, topic, **kwargs)
+            else:
+                self.publisher_keys.remove(key)
             publisher.send(msg)
+            self.publishers[key] = publisher
+            self.publisher_keys.append(key)
+            if len(self.publisher_keys) > PUBLISHER_CACHE_SIZE:
+                del self.publishers[self.publisher_keys.popleft()]
 
         self.ensure(_error_callback, _publish)
 
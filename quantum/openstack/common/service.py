@@ -141,12 +141,14 @@ class ProcessLauncher(object):
     def __init__(self):
         self.children = {}
         self.sigcaught = None
+        self.sighup_caught = False
         self.running = True
         rfd, self.writepipe = os.pipe()
         self.readpipe = eventlet.greenio.GreenPipe(rfd, 'r')
 
         signal.signal(signal.SIGTERM, self._handle_signal)
         signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGHUP, self._handle_sighup)
 
     def _handle_signal(self, signo, frame):
         self.sigcaught = signo
@@ -156,6 +158,22 @@ class ProcessLauncher(object):
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
         signal.signal(signal.SIGINT, signal.SIG_DFL)
 
+    def _handle_sighup(self, signo, frame):
+        # The children are restarted from the wait loop
+        self.sighup_caught = True
+
+    def _restart_children(self):
+        LOG.info(_('Caught SIGHUP, restarting children'))
+        self._kill_children()
+
+    def _kill_children(self):
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError as exc:
+                if exc.errno != errno.ESRCH:
+                    raise
+
     def _pipe_watcher(self):
         # This will block until the write end is closed when the parent
         # dies unexpectedly
@@ -172,8 +190,9 @@ class ProcessLauncher(object):
             raise SignalExit(signal.SIGTERM)
 
         signal.signal(signal.SIGTERM, _sigterm)
-        # Block SIGINT and let the parent send us a SIGTERM
+        # Block SIGINT and SIGHUP and let the parent send us a SIGTERM
         signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
 
         # Reopen the eventlet hub to make sure we don't share an epoll
         # fd with parent and/or siblings, which would be bad
@@ -276,6 +295,9 @@ class ProcessLauncher(object):
         CONF.log_opt_values(LOG, std_logging.DEBUG)
 
         while self.running:
+            if self.sighup_caught:
+                self.sighup_caught = False
+                self._restart_children()
             wrap = self._wait_child()
             if not wrap:
                 # Yield to other threads if no children have exited
@@ -292,12 +314,7 @@ class ProcessLauncher(object):
                        signal.SIGINT: 'SIGINT'}[self.sigcaught]
             LOG.info(_('Caught %s, stopping children'), signame)
 
-        for pid in self.children:
-            try:
-                os.kill(pid, signal.SIGTERM)
-            except OSError as exc:
-                if exc.errno != errno.ESRCH:
-                    raise
+        self._kill_children()
 
         # Wait for children to die
         if self.children:
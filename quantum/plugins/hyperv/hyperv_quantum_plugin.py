@@ -359,6 +359,12 @@ class HyperVQuantumPlugin(db_base_plugin_v2.QuantumDbPluginV2,
         port = super(HyperVQuantumPlugin, self).create_port(context, port)
         return self._extend_port_dict_binding(context, port)
 
+    def create_port_bulk(self, context, ports):
+        created = self._create_ports(
+            context, [port['port'] for port in ports['ports']])
+        return [self._extend_port_dict_binding(context, port)
+                for port in created]
+
     def get_port(self, context, id, fields=None):
         port = super(HyperVQuantumPlugin, self).get_port(context, id, fields)
         return self._fields(self._extend_port_dict_binding(context, port),
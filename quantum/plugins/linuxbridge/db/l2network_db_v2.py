@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import sqlalchemy as sql
 from sqlalchemy.orm import exc
 
 from quantum.common import exceptions as q_exc
@@ -218,6 +219,43 @@ def get_port_from_device(device):
     return port_dict
 
 
+def get_ports_and_bindings_from_devices(devices):
+    """Get ports and the bindings of their networks with a single query.
+
+    :param devices: the beginnings of the ids of the ports
+    :returns: a dict mapping the devices found to (port, binding)
+    """
+    if not devices:
+        return {}
+    session = db.get_session()
+    query = session.query(models_v2.Port, l2network_models_v2.NetworkBinding)
+    query = query.join(l2network_models_v2.NetworkBinding,
+                       models_v2.Port.network_id ==
+                       l2network_models_v2.NetworkBinding.network_id)
+    query = query.filter(sql.or_(*[models_v2.Port.id.startswith(device)
+                                   for device in devices]))
+    devices = set(devices)
+    lengths = set(len(device) for device in devices)
+    result = {}
+    for port, binding in query:
+        for length in lengths:
+            device = port['id'][:length]
+            if device in devices:
+                result[device] = (port, binding)
+    return result
+
+
+def set_ports_status(port_ids, status):
+    """Set the status of several ports with a single query."""
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin():
+        query = session.query(models_v2.Port)
+        query = query.filter(models_v2.Port.id.in_(port_ids))
+        query.update({'status': status}, synchronize_session=False)
+
+
 def set_port_status(port_id, status):
     """Set the port status"""
     LOG.debug(_("set_port_status as %s called"), status)
@@ -49,10 +49,13 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                               l3_rpc_base.L3RpcCallbackMixin,
                               sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
     # Device names start with "tap"
     # history
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_device_down_list
+    #       and security_group_info_for_devices
+    #   1.3 Support get_changed_routers
     TAP_PREFIX_LEN = 3
 
     def create_rpc_dispatcher(self):
@@ -70,6 +73,21 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    def get_ports_from_devices(self, context, devices):
+        return self._select_ports_for_devices(
+            context,
+            dict((device, device[self.TAP_PREFIX_LEN:]) for device in devices),
+            prefix_match=True)
+
+    @staticmethod
+    def _make_device_details(device, port, binding):
+        return {'device': device,
+                'physical_network': binding.physical_network,
+                'vlan_id': binding.vlan_id,
+                'network_id': port['network_id'],
+                'port_id': port['id'],
+                'admin_state_up': port['admin_state_up']}
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details"""
         agent_id = kwargs.get('agent_id')
@@ -80,12 +98,7 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         if port:
             binding = db.get_network_binding(db_api.get_session(),
                                              port['network_id'])
-            entry = {'device': device,
-                     'physical_network': binding.physical_network,
-                     'vlan_id': binding.vlan_id,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up']}
+            entry = self._make_device_details(device, port, binding)
             new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
                           else q_const.PORT_STATUS_DOWN)
             if port['status'] != new_status:
@@ -95,6 +108,40 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def _get_ports_and_bindings(self, devices):
+        ports = db.get_ports_and_bindings_from_devices(
+            [device[self.TAP_PREFIX_LEN:] for device in devices])
+        return dict((device, ports.get(device[self.TAP_PREFIX_LEN:]))
+                    for device in devices)
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices at once"""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices')
+        LOG.debug(_("Details of %(count)d devices requested from "
+                    "%(agent_id)s"),
+                  {'count': len(devices), 'agent_id': agent_id})
+        ports = self._get_ports_and_bindings(devices)
+        entries = []
+        new_statuses = {q_const.PORT_STATUS_ACTIVE: [],
+                        q_const.PORT_STATUS_DOWN: []}
+        for device in devices:
+            if ports[device]:
+                port, binding = ports[device]
+                entries.append(self._make_device_details(device, port,
+                                                         binding))
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    new_statuses[new_status].append(port['id'])
+            else:
+                entries.append({'device': device})
+                LOG.debug(_("%s can not be found in database"), device)
+        for status, port_ids in new_statuses.iteritems():
+            db.set_ports_status(port_ids, status)
+        return entries
+
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent"""
         # (TODO) garyk - live migration and port status
@@ -115,6 +162,29 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             LOG.debug(_("%s can not be found in database"), device)
         return entry
 
+    def update_device_down_list(self, rpc_context, **kwargs):
+        """Several devices no longer exist on agent"""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices')
+        LOG.debug(_("%(count)d devices no longer exist on %(agent_id)s"),
+                  {'count': len(devices), 'agent_id': agent_id})
+        ports = self._get_ports_and_bindings(devices)
+        entries = []
+        port_ids = []
+        for device in devices:
+            if ports[device]:
+                port = ports[device][0]
+                if port['status'] != q_const.PORT_STATUS_DOWN:
+                    port_ids.append(port['id'])
+                entries.append({'device': device,
+                                'exists': True})
+            else:
+                entries.append({'device': device,
+                                'exists': False})
+                LOG.debug(_("%s can not be found in database"), device)
+        db.set_ports_status(port_ids, q_const.PORT_STATUS_DOWN)
+        return entries
+
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent"""
         agent_id = kwargs.get('agent_id')
@@ -190,6 +260,9 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     # bulk operations. Name mangling is used in order to ensure it
     # is qualified by class
     __native_bulk_support = True
+    # Sorting and pagination are pushed down to the database
+    __native_pagination_support = True
+    __native_sorting_support = True
 
     supported_extension_aliases = ["provider", "router", "binding", "quotas",
                                    "security-group"]
@@ -431,12 +504,13 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_network_dict_l3(context, net)
         return self._fields(net, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
-            nets = super(LinuxBridgePluginV2, self).get_networks(context,
-                                                                 filters,
-                                                                 None)
+            nets = super(LinuxBridgePluginV2,
+                         self).get_networks(context, filters, None, sorts,
+                                            limit, marker, page_reverse)
             for net in nets:
                 self._extend_network_dict_provider(context, net)
                 self._extend_network_dict_l3(context, net)
@@ -463,12 +537,13 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         self._extend_port_dict_binding(context, port),
         return self._fields(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         res_ports = []
         with context.session.begin(subtransactions=True):
-            ports = super(LinuxBridgePluginV2, self).get_ports(context,
-                                                               filters,
-                                                               fields)
+            ports = super(LinuxBridgePluginV2,
+                          self).get_ports(context, filters, fields, sorts,
+                                          limit, marker, page_reverse)
             #TODO(nati) filter by security group
             for port in ports:
                 self._extend_port_dict_security_group(context, port)
@@ -489,13 +564,29 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._process_port_create_security_group(
                 context, port['id'], sgids)
             self._extend_port_dict_security_group(context, port)
-        if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
-            self.notifier.security_groups_provider_updated(context)
-        else:
-            self.notifier.security_groups_member_updated(
-                context, port.get(ext_sg.SECURITYGROUPS))
+        self.notify_security_groups_member_added(context, [port])
         return self._extend_port_dict_binding(context, port)
 
+    def create_port_bulk(self, context, ports):
+        session = context.session
+        with session.begin(subtransactions=True):
+            sgids = []
+            for port in ports['ports']:
+                self._ensure_default_security_group_on_port(context, port)
+                sgids.append(self._get_security_groups_on_port(context,
+                                                               port))
+                # Set port status as 'DOWN'. This will be updated by agent
+                port['port']['status'] = q_const.PORT_STATUS_DOWN
+            created = self._create_ports(
+                context, [port['port'] for port in ports['ports']])
+            for port, port_sgids in zip(created, sgids):
+                self._process_port_create_security_group(
+                    context, port['id'], port_sgids)
+                self._extend_port_dict_security_group(context, port)
+        self.notify_security_groups_member_added(context, created)
+        return [self._extend_port_dict_binding(context, port)
+                for port in created]
+
     def update_port(self, context, id, port):
         original_port = self.get_port(context, id)
         session = context.session
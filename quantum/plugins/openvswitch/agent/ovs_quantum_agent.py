@@ -27,6 +27,7 @@ import eventlet
 
 from quantum.agent.linux import ip_lib
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.agent.linux import utils
 from quantum.agent import rpc as agent_rpc
 from quantum.agent import securitygroups_rpc as sg_rpc
@@ -150,7 +151,8 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
-                 polling_interval, enable_tunneling):
+                 polling_interval, enable_tunneling,
+                 minimize_polling=False, full_scan_interval=60):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -160,6 +162,10 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         :param root_helper: utility to use when running shell cmds.
         :param polling_interval: interval (secs) to poll DB.
         :param enable_tunneling: if True enable GRE networks.
+        :param minimize_polling: if True only scan the local devices when
+               ovsdb-client monitor reports a change of the interfaces.
+        :param full_scan_interval: interval (secs) between two scans of the
+               local devices when minimize_polling is True.
         '''
         self.root_helper = root_helper
         self.available_local_vlans = set(
@@ -170,6 +176,10 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        self.full_scan_interval = full_scan_interval
+        self.ovsdb_monitor = None
+        if minimize_polling:
+            self.ovsdb_monitor = ovsdb_monitor.InterfaceMonitor(root_helper)
 
         self.enable_tunneling = enable_tunneling
         self.local_ip = local_ip
@@ -228,7 +238,7 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             return
 
         if ext_sg.SECURITYGROUPS in port:
-            self.sg_agent.refresh_firewall()
+            self.sg_agent.refresh_firewall([port['id']])
         network_type = kwargs.get('network_type')
         segmentation_id = kwargs.get('segmentation_id')
         physical_network = kwargs.get('physical_network')
@@ -574,20 +584,21 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get details of devices %(devices)s: "
+                        "%(e)s"), {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        vif_ports = dict((port.vif_id, port)
+                         for port in self.int_br.get_vif_ports())
+        for details in devices_details:
+            device = details['device']
             LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"), locals())
-                resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
+            port = vif_ports.get(device)
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          locals())
@@ -601,29 +612,28 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
+        try:
+            devices_details = self.plugin_rpc.update_device_down_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details:
+            device = details['device']
             LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          locals())
-                resync = True
-                continue
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 self.port_unbound(device)
-        return resync
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -635,6 +645,31 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         # If one of the above opertaions fails => resync with plugin
         return (resync_a | resync_b)
 
+    def _bridges(self):
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        return bridges
+
+    def process_network_ports_deferred(self, port_info):
+        """Process the port changes, batching the changes of the bridges.
+
+        The flows and database changes of all the bridges are applied at
+        the end, with a few ovs-ofctl and ovs-vsctl calls per bridge. A
+        resync is requested if some of them could not be applied.
+        """
+        bridges = self._bridges()
+        for bridge in bridges:
+            bridge.defer_apply_on()
+        try:
+            resync = self.process_network_ports(port_info)
+        finally:
+            applied = [bridge.defer_apply_off() for bridge in bridges]
+        if not all(applied):
+            LOG.warning(_("Unable to apply the deferred bridge changes"))
+            return True
+        return resync
+
     def tunnel_sync(self):
         resync = False
         try:
@@ -650,10 +685,38 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             resync = True
         return resync
 
+    def ports_changed(self, last_scan):
+        """Tells whether the local devices may have changed since last_scan.
+
+        Without an OVSDB monitor the devices are scanned at every polling
+        interval, otherwise only when the monitor reported a change, when it
+        had to be respawned and every full_scan_interval seconds.
+        """
+        if not self.ovsdb_monitor:
+            return True
+        if not self.ovsdb_monitor.is_active():
+            LOG.info(_("Starting the OVSDB monitor"))
+            self.ovsdb_monitor.start()
+            return True
+        if time.time() - last_scan >= self.full_scan_interval:
+            return True
+        return self.ovsdb_monitor.wait_for_changes(0)
+
+    def wait_for_ports_changes(self, timeout):
+        if self.ovsdb_monitor and self.ovsdb_monitor.is_active():
+            # Wake up as soon as an interface changes
+            return self.ovsdb_monitor.wait_for_changes(timeout)
+        time.sleep(timeout)
+        return False
+
     def rpc_loop(self):
         sync = True
         ports = set()
         tunnel_sync = True
+        last_scan = 0
+        changed = False
+        if self.ovsdb_monitor:
+            self.ovsdb_monitor.start()
 
         while True:
             try:
@@ -662,19 +725,24 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
                     sync = False
+                    changed = True
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                port_info = None
+                if changed or self.ports_changed(last_scan):
+                    last_scan = time.time()
+                    port_info = self.update_ports(ports)
+                changed = False
 
                 # notify plugin about port deltas
                 if port_info:
                     LOG.debug(_("Agent loop has new devices!"))
                     # If treat devices fails - must resync with plugin
-                    sync = self.process_network_ports(port_info)
+                    sync = self.process_network_ports_deferred(port_info)
                     ports = port_info['current']
 
             except:
@@ -685,7 +753,8 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                changed = self.wait_for_ports_changes(
+                    self.polling_interval - elapsed)
             else:
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
@@ -715,6 +784,8 @@ def create_agent_config_map(config):
         root_helper=config.AGENT.root_helper,
         polling_interval=config.AGENT.polling_interval,
         enable_tunneling=config.OVS.enable_tunneling,
+        minimize_polling=config.AGENT.minimize_polling,
+        full_scan_interval=config.AGENT.full_scan_interval,
     )
 
     if kwargs['enable_tunneling'] and not kwargs['local_ip']:
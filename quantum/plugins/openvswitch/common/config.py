@@ -56,6 +56,12 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('minimize_polling', default=False,
+                help=_("Watch the OVSDB with ovsdb-client monitor and only "
+                       "scan the local devices when they change.")),
+    cfg.IntOpt('full_scan_interval', default=60,
+               help=_("The number of seconds between two scans of the "
+                      "local devices when minimize_polling is enabled.")),
 ]
 
 
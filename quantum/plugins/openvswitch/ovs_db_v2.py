@@ -329,6 +329,33 @@ def get_port_from_device(port_id):
     return port_dict
 
 
+def get_ports_and_bindings(port_ids):
+    """Get ports and the bindings of their networks with a single query.
+
+    :returns: a dict mapping the ids of the ports found to (port, binding)
+    """
+    if not port_ids:
+        return {}
+    session = db.get_session()
+    query = session.query(models_v2.Port, ovs_models_v2.NetworkBinding)
+    query = query.join(ovs_models_v2.NetworkBinding,
+                       models_v2.Port.network_id ==
+                       ovs_models_v2.NetworkBinding.network_id)
+    query = query.filter(models_v2.Port.id.in_(port_ids))
+    return dict((port['id'], (port, binding)) for port, binding in query)
+
+
+def set_ports_status(port_ids, status):
+    """Set the status of several ports with a single query."""
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin():
+        query = session.query(models_v2.Port)
+        query = query.filter(models_v2.Port.id.in_(port_ids))
+        query.update({'status': status}, synchronize_session=False)
+
+
 def set_port_status(port_id, status):
     session = db.get_session()
     try:
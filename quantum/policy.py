@@ -19,6 +19,8 @@
 Policy engine for quantum.  Largely copied from nova.
 """
 
+import time
+
 from quantum.api.v2 import attributes
 from quantum.common import exceptions
 import quantum.common.utils as utils
@@ -30,6 +32,11 @@ from quantum.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_POLICY_CHECKED_AT = 0
+# Seconds between the checks for changes of the policy file
+POLICY_CHECK_INTERVAL = 1
+# The match rules of the actions, by action and enforced attributes
+_MATCH_RULES = {}
 cfg.CONF.import_opt('policy_file', 'quantum.common.config')
 
 
@@ -38,16 +45,23 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _MATCH_RULES.clear()
     policy.reset()
 
 
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _POLICY_CHECKED_AT
     if not _POLICY_PATH:
         _POLICY_PATH = utils.find_config_file({}, cfg.CONF.policy_file)
         if not _POLICY_PATH:
             raise exceptions.PolicyNotFound(path=cfg.CONF.policy_file)
+    now = time.time()
+    if _POLICY_CACHE and now - _POLICY_CHECKED_AT < POLICY_CHECK_INTERVAL:
+        # Do not stat the file for each of the objects of a list
+        return
+    _POLICY_CHECKED_AT = now
     # pass _set_brain to read_cached_file so that the policy brain
     # is reset only if the file has changed
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
@@ -63,6 +77,7 @@ def get_resource_and_action(action):
 def _set_rules(data):
     default_rule = 'default'
     policy.set_rules(policy.Rules.load_json(data, default_rule))
+    _MATCH_RULES.clear()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target):
@@ -86,12 +101,25 @@ def _build_target(action, original_target, plugin, context):
         # use the 'singular' version of the resource name
         parent_resource = hierarchy_info['parent'][:-1]
         parent_id = hierarchy_info['identified_by']
+        target['%s_tenant_id' % parent_resource] = _get_parent_tenant_id(
+            context, plugin, parent_resource, target[parent_id])
+    return target
+
+
+def _get_parent_tenant_id(context, plugin, parent_resource, parent_id):
+    """Return the tenant of a parent resource.
+
+    The lookups are remembered by the context, so that checking the
+    objects of a list fetches each of their parents once.
+    """
+    key = (parent_resource, parent_id)
+    if key not in context.policy_cache:
         f = getattr(plugin, 'get_%s' % parent_resource)
         # f *must* exist, if not found it is better to let quantum explode
         # Note: we do not use admin context
-        data = f(context, target[parent_id], fields=['tenant_id'])
-        target['%s_tenant_id' % parent_resource] = data['tenant_id']
-    return target
+        data = f(context, parent_id, fields=['tenant_id'])
+        context.policy_cache[key] = data['tenant_id']
+    return context.policy_cache[key]
 
 
 def _build_match_rule(action, target):
@@ -105,8 +133,8 @@ def _build_match_rule(action, target):
 
     """
 
-    match_rule = policy.RuleCheck('rule', action)
     resource, is_write = get_resource_and_action(action)
+    enforced_attributes = []
     if is_write:
         # assigning to variable with short name for improving readability
         res_map = attributes.RESOURCE_ATTRIBUTE_MAP
@@ -116,11 +144,20 @@ def _build_match_rule(action, target):
                                                 res_map[resource],
                                                 target):
                     attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute and is_write:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
-
+                    if 'enforce_policy' in attribute:
+                        enforced_attributes.append(attribute_name)
+
+    # The checks only hold the names of the rules, they are kept until
+    # the policy file changes
+    key = (action, tuple(enforced_attributes))
+    match_rule = _MATCH_RULES.get(key)
+    if match_rule is None:
+        match_rule = policy.RuleCheck('rule', action)
+        for attribute_name in enforced_attributes:
+            attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                         (action, attribute_name))
+            match_rule = policy.AndCheck([match_rule, attr_rule])
+        _MATCH_RULES[key] = match_rule
     return match_rule
 
 
@@ -69,7 +69,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_subnets(self, context, filters=None, fields=None):
+    def get_subnets(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of subnets.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -86,6 +87,13 @@ class QuantumPluginBaseV2(object):
             subnet dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, is_ascending) tuples; only passed
+            by the API layer when the plugin declares native sorting support.
+        : param limit: maximum number of items to return; only passed when
+            the plugin declares native pagination support.
+        : param marker: id of the last item of the previous page.
+        : param page_reverse: if True, return the items preceding the marker
+            rather than the ones following it.
         """
         pass
 
@@ -156,7 +164,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of networks.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -173,6 +182,13 @@ class QuantumPluginBaseV2(object):
             network dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, is_ascending) tuples; only passed
+            by the API layer when the plugin declares native sorting support.
+        : param limit: maximum number of items to return; only passed when
+            the plugin declares native pagination support.
+        : param marker: id of the last item of the previous page.
+        : param page_reverse: if True, return the items preceding the marker
+            rather than the ones following it.
         """
         pass
 
@@ -243,7 +259,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         """
         Retrieve a list of ports.  The contents of the list depends on
         the identity of the user making the request (as indicated by the
@@ -260,6 +277,13 @@ class QuantumPluginBaseV2(object):
             port dictionary as listed in the RESOURCE_ATTRIBUTE_MAP
             object in quantum/api/v2/attributes.py. Only these fields
             will be returned.
+        : param sorts: a list of (key, is_ascending) tuples; only passed
+            by the API layer when the plugin declares native sorting support.
+        : param limit: maximum number of items to return; only passed when
+            the plugin declares native pagination support.
+        : param marker: id of the last item of the previous page.
+        : param page_reverse: if True, return the items preceding the marker
+            rather than the ones following it.
         """
         pass
 
@@ -46,6 +46,19 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='quantum.quota.ConfDriver',
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('reservation_expire',
+               default=3600,
+               help=_('Seconds after which the reservations of a driver '
+                      'tracking the usages are released if they were '
+                      'neither committed nor cancelled')),
+    cfg.IntOpt('quota_usage_resync_interval',
+               default=600,
+               help=_('Seconds between marking the usages tracked by the '
+                      'quota driver to be counted again, which fixes their '
+                      'drift. Resources created or deleted by the plugins '
+                      'outside of the API, such as DHCP and router ports or '
+                      'the ports deleted with their network, are only '
+                      'accounted for after it. 0 disables it')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -258,6 +271,57 @@ class QuotaEngine(object):
         return self._driver.limit_check(context, tenant_id,
                                         self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta,
+                         *args, **kwargs):
+        """Reserve a change of the usage of a resource.
+
+        delta is the number of resources about to be created, negative
+        for deleted resources.  The arguments following delta are passed
+        to the count function of the resource.
+
+        Drivers tracking the usages check the quota against the tracked
+        usage and return a reservation, to commit once the resources are
+        created or deleted and to cancel if it failed.  Otherwise the
+        quota is checked against the count of the resource and None is
+        returned.
+
+        :param context: The request context, for access checks.
+        """
+
+        res = self._resources.get(resource)
+        if not res or not hasattr(res, 'count'):
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+
+        def count():
+            return res.count(context, *args, **kwargs)
+
+        if self.tracks_usages:
+            return self._driver.make_reservation(context, tenant_id,
+                                                 self._resources, resource,
+                                                 delta, count)
+        if delta > 0:
+            self.limit_check(context, tenant_id,
+                             **{resource: count() + delta})
+
+    def commit_reservation(self, context, reservation):
+        """Commit a reservation returned by make_reservation()."""
+        if reservation is not None:
+            self._driver.commit_reservation(context, reservation)
+
+    def cancel_reservation(self, context, reservation):
+        """Cancel a reservation returned by make_reservation()."""
+        if reservation is not None:
+            self._driver.cancel_reservation(context, reservation)
+
+    def resync_usages(self, context):
+        """Have the usages tracked by the driver counted again."""
+        if self.tracks_usages:
+            self._driver.resync_usages(context)
+
+    @property
+    def tracks_usages(self):
+        return hasattr(self._driver, 'make_reservation')
+
     @property
     def resources(self):
         return self._resources
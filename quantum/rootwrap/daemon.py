@@ -0,0 +1,157 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long-lived root wrapper
+
+The daemon loads the filters once and runs the commands it receives on a
+Unix socket through the same checks as quantum-rootwrap, which saves the
+interpreter start and the filter parsing of a quantum-rootwrap spawn.
+
+Each command uses its own connection: the client sends a JSON request
+{"cmd": [...], "stdin": ...} and shuts down its side of the socket, the
+daemon answers with {"returncode": ..., "stdout": ..., "stderr": ...}.
+"""
+
+import errno
+import json
+import os
+import shutil
+import socket
+import SocketServer
+import stat
+import subprocess
+import tempfile
+
+from quantum.common import utils
+from quantum.rootwrap import wrapper
+
+
+RC_UNAUTHORIZED = 99
+RC_NOCOMMAND = 98
+
+BUFSIZE = 65536
+
+
+def _recv_all(sock):
+    data = []
+    while True:
+        chunk = sock.recv(BUFSIZE)
+        if not chunk:
+            return ''.join(data)
+        data.append(chunk)
+
+
+def _reply(returncode, stdout='', stderr=''):
+    return {'returncode': returncode,
+            'stdout': stdout.decode('utf-8', 'replace'),
+            'stderr': stderr.decode('utf-8', 'replace')}
+
+
+class RootwrapRequestHandler(SocketServer.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(_recv_all(self.request))
+            userargs = [str(arg) for arg in request['cmd']]
+            process_input = request.get('stdin')
+        except (ValueError, KeyError, TypeError):
+            reply = _reply(RC_NOCOMMAND, stderr='Malformed request')
+        else:
+            reply = self.server.execute(userargs, process_input)
+        self.request.sendall(json.dumps(reply))
+
+
+class RootwrapServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    """Runs the filtered commands sent on a Unix socket.
+
+    The socket is only accessible to the owner of its directory, who is
+    the user the agents run as.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, filters_path):
+        self.filters = wrapper.load_filters(filters_path)
+        socket_path = os.path.abspath(socket_path)
+        socket_dir = os.path.dirname(socket_path)
+        owner = os.stat(socket_dir)
+        # The owner of socket_dir can replace any file in it. The socket is
+        # therefore bound in a directory only root can write to, handed
+        # over without following symlinks, and only then moved into place.
+        private_dir = tempfile.mkdtemp(dir=socket_dir)
+        try:
+            bind_path = os.path.join(private_dir, 'rootwrap.sock')
+            old_umask = os.umask(0177)
+            try:
+                SocketServer.UnixStreamServer.__init__(
+                    self, bind_path, RootwrapRequestHandler)
+            finally:
+                os.umask(old_umask)
+            try:
+                if not stat.S_ISSOCK(os.lstat(bind_path).st_mode):
+                    raise OSError(errno.ENOTSOCK, os.strerror(errno.ENOTSOCK),
+                                  bind_path)
+                os.lchown(bind_path, owner.st_uid, owner.st_gid)
+                os.rename(bind_path, socket_path)
+            except Exception:
+                self.server_close()
+                raise
+        finally:
+            shutil.rmtree(private_dir, ignore_errors=True)
+        self.server_address = socket_path
+
+    def execute(self, userargs, process_input=None):
+        filtermatch = wrapper.match_filter(self.filters, userargs)
+        if not filtermatch:
+            return _reply(RC_UNAUTHORIZED,
+                          stderr='Unauthorized command: %s' %
+                          ' '.join(userargs))
+        try:
+            obj = utils.subprocess_popen(
+                filtermatch.get_command(userargs),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=filtermatch.get_environment(userargs))
+        except OSError as e:
+            return _reply(RC_NOCOMMAND, stderr=str(e))
+        stdout, stderr = obj.communicate(process_input)
+        return _reply(obj.returncode, stdout, stderr)
+
+
+def execute(socket_path, cmd, process_input=None):
+    """Runs cmd through the daemon listening on socket_path.
+
+    Returns a (returncode, stdout, stderr) tuple. socket.error is raised
+    when the daemon cannot be reached and ValueError when its reply is
+    invalid.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'cmd': cmd, 'stdin': process_input}))
+        sock.shutdown(socket.SHUT_WR)
+        reply = json.loads(_recv_all(sock))
+    finally:
+        sock.close()
+    try:
+        return (reply['returncode'],
+                reply['stdout'].encode('utf-8'),
+                reply['stderr'].encode('utf-8'))
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError('Invalid reply from the root wrapper daemon')
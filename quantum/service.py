@@ -22,11 +22,13 @@ import random
 
 from quantum.common import config
 from quantum import context
+from quantum import manager
 from quantum.openstack.common import cfg
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import loopingcall
 from quantum.openstack.common.rpc import service
+from quantum import quota
 from quantum import wsgi
 
 
@@ -44,6 +46,10 @@ service_opts = [
                help=_('range of seconds to randomly delay when starting the'
                       ' periodic task scheduler to reduce stampeding.'
                       ' (Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate worker processes for the API '
+                      'server, 0 runs the API in the server process')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -90,6 +96,39 @@ class QuantumApiService(WsgiService):
         service = cls(app_name)
         return service
 
+    def start(self):
+        super(QuantumApiService, self).start()
+        self.ip_recycler = None
+        if cfg.CONF.ip_recycle_interval > 0:
+            plugin = manager.QuantumManager.get_plugin()
+            if hasattr(plugin, 'recycle_expired_ip_allocations'):
+                self.ip_recycler = loopingcall.LoopingCall(
+                    _recycle_expired_ip_allocations, plugin)
+                self.ip_recycler.start(
+                    interval=cfg.CONF.ip_recycle_interval,
+                    initial_delay=cfg.CONF.ip_recycle_interval)
+        self.quota_resyncer = None
+        interval = cfg.CONF.QUOTAS.quota_usage_resync_interval
+        if interval > 0 and quota.QUOTAS.tracks_usages:
+            self.quota_resyncer = loopingcall.LoopingCall(
+                _resync_quota_usages)
+            self.quota_resyncer.start(interval=interval,
+                                      initial_delay=interval)
+
+
+def _recycle_expired_ip_allocations(plugin):
+    try:
+        plugin.recycle_expired_ip_allocations(context.get_admin_context())
+    except Exception:
+        LOG.exception(_('Failed to recycle the expired IP allocations'))
+
+
+def _resync_quota_usages():
+    try:
+        quota.QUOTAS.resync_usages(context.get_admin_context())
+    except Exception:
+        LOG.exception(_('Failed to resync the quota usages'))
+
 
 def serve_wsgi(cls):
     try:
@@ -109,7 +148,8 @@ def _run_wsgi(app_name):
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Quantum")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Quantum service started, listening on %(host)s:%(port)s"),
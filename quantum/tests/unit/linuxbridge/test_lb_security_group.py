@@ -19,7 +19,9 @@ import mock
 from mock import call
 
 from quantum.api.v2 import attributes
+from quantum import context
 from quantum.extensions import securitygroup as ext_sg
+from quantum import manager
 from quantum.plugins.linuxbridge.db import l2network_db_v2 as lb_db
 from quantum.tests.unit import test_extension_security_group as test_sg
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -97,6 +99,24 @@ class TestLinuxBridgeSecurityGroupsDB(LinuxBridgeSecurityGroupsTestCase):
         port_dict = lb_db.get_port_from_device('bad_device_id')
         self.assertEqual(None, port_dict)
 
+    def test_security_group_get_ports_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                res = self._create_port(self.fmt, n['network']['id'])
+                port = self.deserialize(self.fmt, res)['port']
+                device = 'tap' + port['id'][:11]
+                plugin = manager.QuantumManager.get_plugin()
+                ports = plugin.callbacks.get_ports_from_devices(
+                    context.get_admin_context(), [device, 'tapbad_device'])
+                self.assertEqual(ports.keys(), [port['id']])
+                port_dict = ports[port['id']]
+                self.assertEqual(device, port_dict['device'])
+                self.assertEqual(port[ext_sg.SECURITYGROUPS],
+                                 port_dict[ext_sg.SECURITYGROUPS])
+                self.assertEqual([port['fixed_ips'][0]['ip_address']],
+                                 port_dict['fixed_ips'])
+                self._delete('ports', port['id'])
+
 
 class TestLinuxBridgeSecurityGroupsDBXML(TestLinuxBridgeSecurityGroupsDB):
     fmt = 'xml'
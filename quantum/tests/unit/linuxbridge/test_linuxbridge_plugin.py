@@ -13,7 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from quantum import context
 from quantum.extensions import portbindings
+from quantum import manager
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 
@@ -55,3 +57,34 @@ class TestLinuxBridgePortsV2(test_plugin.TestPortsV2,
 class TestLinuxBridgeNetworksV2(test_plugin.TestNetworksV2,
                                 LinuxBridgePluginV2TestCase):
     pass
+
+
+class TestLinuxBridgeRpcCallbacks(LinuxBridgePluginV2TestCase):
+
+    def test_get_devices_details_list(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with self.port() as port:
+            port_id = port['port']['id']
+            device = 'tap' + port_id[:11]
+            entries = plugin.callbacks.get_devices_details_list(
+                None, devices=[device, 'tapunknown'], agent_id='agent')
+            self.assertEqual(entries[0]['device'], device)
+            self.assertEqual(entries[0]['port_id'], port_id)
+            self.assertEqual(entries[1], {'device': 'tapunknown'})
+            port = plugin.get_port(context.get_admin_context(), port_id)
+            self.assertEqual(port['status'], 'ACTIVE')
+
+    def test_update_device_down_list(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with self.port() as port:
+            port_id = port['port']['id']
+            device = 'tap' + port_id[:11]
+            plugin.callbacks.update_device_up(None, device=device,
+                                              agent_id='agent')
+            entries = plugin.callbacks.update_device_down_list(
+                None, devices=[device, 'tapunknown'], agent_id='agent')
+            self.assertEqual(entries,
+                             [{'device': device, 'exists': True},
+                              {'device': 'tapunknown', 'exists': False}])
+            port = plugin.get_port(context.get_admin_context(), port_id)
+            self.assertEqual(port['status'], 'DOWN')
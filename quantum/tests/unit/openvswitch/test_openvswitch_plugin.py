@@ -13,7 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from quantum import context
 from quantum.extensions import portbindings
+from quantum import manager
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 
@@ -54,3 +56,32 @@ class TestOpenvswitchPortsV2(test_plugin.TestPortsV2,
 class TestOpenvswitchNetworksV2(test_plugin.TestNetworksV2,
                                 OpenvswitchPluginV2TestCase):
     pass
+
+
+class TestOpenvswitchRpcCallbacks(OpenvswitchPluginV2TestCase):
+
+    def test_get_devices_details_list(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with self.port() as port:
+            port_id = port['port']['id']
+            entries = plugin.callbacks.get_devices_details_list(
+                None, devices=[port_id, 'unknown'], agent_id='agent')
+            self.assertEqual(entries[0]['port_id'], port_id)
+            self.assertEqual(entries[0]['network_type'], 'local')
+            self.assertEqual(entries[1], {'device': 'unknown'})
+            port = plugin.get_port(context.get_admin_context(), port_id)
+            self.assertEqual(port['status'], 'ACTIVE')
+
+    def test_update_device_down_list(self):
+        plugin = manager.QuantumManager.get_plugin()
+        with self.port() as port:
+            port_id = port['port']['id']
+            plugin.callbacks.update_device_up(None, device=port_id,
+                                              agent_id='agent')
+            entries = plugin.callbacks.update_device_down_list(
+                None, devices=[port_id, 'unknown'], agent_id='agent')
+            self.assertEqual(entries,
+                             [{'device': port_id, 'exists': True},
+                              {'device': 'unknown', 'exists': False}])
+            port = plugin.get_port(context.get_admin_context(), port_id)
+            self.assertEqual(port['status'], 'DOWN')
@@ -19,6 +19,7 @@ import mox
 import unittest2 as unittest
 
 from quantum.agent.linux import ovs_lib, utils
+from quantum.openstack.common import jsonutils
 from quantum.openstack.common import uuidutils
 
 
@@ -92,30 +93,36 @@ class OVS_Lib_Test(unittest.TestCase):
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,dl_src=ca:fe:de:ad:be:ef"
                        ",actions=strip_vlan,output:0"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=1,actions=normal"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,actions=drop"],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=2,in_port=%s,actions=drop" % ofport],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=4,in_port=%s,dl_vlan=%s,"
                        "actions=strip_vlan,set_tunnel:%s,normal"
                        % (ofport, vid, lsw_id)],
-                      root_helper=self.root_helper)
+                      root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "add-flow", self.BR_NAME,
                        "hard_timeout=0,idle_timeout=0,"
                        "priority=3,tun_id=%s,actions="
                        "mod_vlan_vid:%s,output:%s"
-                       % (lsw_id, vid, ofport)], root_helper=self.root_helper)
+                       % (lsw_id, vid, ofport)], root_helper=self.root_helper,
+                      process_input=None)
         self.mox.ReplayAll()
 
         self.br.add_flow(priority=2, dl_src="ca:fe:de:ad:be:ef",
@@ -132,6 +139,58 @@ class OVS_Lib_Test(unittest.TestCase):
                          (vid, ofport))
         self.mox.VerifyAll()
 
+    def test_defer_apply_flows(self):
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                                    "priority=1,actions=normal\n"
+                                    "hard_timeout=0,idle_timeout=0,"
+                                    "priority=2,in_port=1,actions=drop\n")
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "in_port=1"],
+                      root_helper=self.root_helper,
+                      process_input=None)
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "in_port=2"],
+                      root_helper=self.root_helper,
+                      process_input=None)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1",
+                       "--", "clear", "Port", "tap2", "tag"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                                    "priority=2,actions=drop\n")
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions="normal")
+        self.br.add_flow(priority=2, in_port=1, actions="drop")
+        self.br.delete_flows(in_port=1)
+        self.br.delete_flows(in_port=2)
+        self.br.set_db_attribute("Port", "tap1", "tag", "1")
+        self.br.clear_db_attribute("Port", "tap2", "tag")
+        self.br.add_flow(priority=2, actions="drop")
+        self.assertTrue(self.br.defer_apply_off())
+        # nothing is left to apply
+        self.br.defer_apply_on()
+        self.assertTrue(self.br.defer_apply_off())
+        self.mox.VerifyAll()
+
+    def test_defer_apply_flows_failure(self):
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "in_port=1"],
+                      root_helper=self.root_helper,
+                      process_input=None).AndRaise(Exception)
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", "tap1", "tag=1"],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.delete_flows(in_port=1)
+        self.br.set_db_attribute("Port", "tap1", "tag", "1")
+        self.assertFalse(self.br.defer_apply_off())
+        self.mox.VerifyAll()
+
     def test_get_port_ofport(self):
         pname = "tap99"
         ofport = "6"
@@ -155,8 +214,8 @@ class OVS_Lib_Test(unittest.TestCase):
 
     def test_count_flows(self):
         utils.execute(["ovs-ofctl", "dump-flows", self.BR_NAME],
-                      root_helper=self.root_helper).AndReturn('ignore'
-                                                              '\nflow-1\n')
+                      root_helper=self.root_helper,
+                      process_input=None).AndReturn('ignore\nflow-1\n')
         self.mox.ReplayAll()
 
         # counts the number of flows as total lines of output - 2
@@ -168,11 +227,14 @@ class OVS_Lib_Test(unittest.TestCase):
         lsw_id = 40
         vid = 39
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "in_port=" + ofport], root_helper=self.root_helper)
+                       "in_port=" + ofport], root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "tun_id=%s" % lsw_id], root_helper=self.root_helper)
+                       "tun_id=%s" % lsw_id], root_helper=self.root_helper,
+                      process_input=None)
         utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME,
-                       "dl_vlan=%s" % vid], root_helper=self.root_helper)
+                       "dl_vlan=%s" % vid], root_helper=self.root_helper,
+                      process_input=None)
         self.mox.ReplayAll()
 
         self.br.delete_flows(in_port=ofport)
@@ -228,7 +290,7 @@ class OVS_Lib_Test(unittest.TestCase):
 
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
@@ -236,18 +298,21 @@ class OVS_Lib_Test(unittest.TestCase):
                       root_helper=self.root_helper).AndReturn("%s\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = ["map", [["xs-vif-uuid", vif_id],
+                                    ["attached-mac", mac]]]
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
-
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+            external_ids = ["map", [["iface-id", vif_id],
+                                    ["attached-mac", mac]]]
+        interfaces = {"headings": ["name", "external_ids", "ofport"],
+                      "data": [[pname, external_ids, ofport],
+                               ["br-int", ["map", []], 65534],
+                               ["other-br-port", external_ids, 7]]}
+
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,external_ids,ofport",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                            "param-key=nicira-iface-id", "uuid=" + vif_id],
@@ -269,6 +334,52 @@ class OVS_Lib_Test(unittest.TestCase):
     def test_get_vif_ports_xen(self):
         self._test_get_vif_ports(True)
 
+    def test_get_vif_ports_without_ofport(self):
+        vif_id = uuidutils.generate_uuid()
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("tap99\n")
+        external_ids = ["map", [["iface-id", vif_id],
+                                ["attached-mac", "ca:fe:de:ad:be:ef"]]]
+        interfaces = {"headings": ["name", "external_ids", "ofport"],
+                      "data": [["tap99", external_ids, ["set", []]]]}
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,external_ids,ofport",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
+        self.mox.ReplayAll()
+        ports = self.br.get_vif_ports()
+        self.assertEqual(1, len(ports))
+        self.assertEqual(ports[0].ofport, -1)
+        self.mox.VerifyAll()
+
+    def test_get_vif_port_set(self):
+        vif_id = uuidutils.generate_uuid()
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "tap99\ntun22\n")
+        external_ids = ["map", [["iface-id", vif_id],
+                                ["attached-mac", "ca:fe:de:ad:be:ef"]]]
+        interfaces = {"headings": ["name", "external_ids", "ofport"],
+                      "data": [["tap99", external_ids, 1],
+                               ["tun22", ["map", []], ["set", []]]]}
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,external_ids,ofport",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
+        self.mox.ReplayAll()
+        self.assertEqual(self.br.get_vif_port_set(), set([vif_id]))
+        self.mox.VerifyAll()
+
+    def test_db_list_with_invalid_output(self):
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name", "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn("garbage")
+        self.mox.ReplayAll()
+        self.assertEqual(self.br.db_list("Interface", ["name"]), [])
+        self.mox.VerifyAll()
+
     def test_clear_db_attribute(self):
         pname = "tap77"
         utils.execute(["ovs-vsctl", self.TO, "clear", "Port",
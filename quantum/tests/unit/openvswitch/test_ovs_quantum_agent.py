@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import mock
 import unittest2 as unittest
 
@@ -96,56 +98,77 @@ class TestOvsQuantumAgent(unittest.TestCase):
         self.assertEqual(expected, actual)
 
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_added([{}]))
+            self.assertTrue(self.agent.treat_devices_added(['dev']))
 
     def mock_treat_devices_added(self, details, port, func_name):
         """
 
         :param details: the details to return for the device
-        :param port: the port that get_vif_port_by_id should return
+        :param port: the port that get_vif_ports should return
         :param func_name: the function that should be called
         :returns: whether the named function was called
         """
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                               return_value=details):
-            with mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
-                                   return_value=port):
+        port.vif_id = details['device']
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
+                               return_value=[details]):
+            with mock.patch.object(self.agent.int_br, 'get_vif_ports',
+                                   return_value=[port]):
                 with mock.patch.object(self.agent, func_name) as func:
-                    self.assertFalse(self.agent.treat_devices_added([{}]))
+                    self.assertFalse(self.agent.treat_devices_added(
+                        [details['device']]))
         return func.called
 
     def test_treat_devices_added_ignores_invalid_ofport(self):
         port = mock.Mock()
         port.ofport = -1
-        self.assertFalse(self.mock_treat_devices_added(mock.MagicMock(), port,
-                                                       'port_dead'))
+        self.assertFalse(self.mock_treat_devices_added({'device': 'dev'},
+                                                       port, 'port_dead'))
 
     def test_treat_devices_added_marks_unknown_port_as_dead(self):
         port = mock.Mock()
         port.ofport = 1
-        self.assertTrue(self.mock_treat_devices_added(mock.MagicMock(), port,
-                                                      'port_dead'))
+        self.assertTrue(self.mock_treat_devices_added({'device': 'dev'},
+                                                      port, 'port_dead'))
 
     def test_treat_devices_added_updates_known_port(self):
-        details = mock.MagicMock()
-        details.__contains__.side_effect = lambda x: True
+        details = {'device': 'dev', 'port_id': 'dev', 'network_id': 'net',
+                   'network_type': 'local', 'physical_network': None,
+                   'segmentation_id': None, 'admin_state_up': True}
         self.assertTrue(self.mock_treat_devices_added(details,
                                                       mock.Mock(),
                                                       'treat_vif_port'))
 
+    def test_treat_devices_added_fetches_ports_once(self):
+        details = [{'device': 'dev1'}, {'device': 'dev2'}]
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
+                               return_value=details) as details_list:
+            with mock.patch.object(self.agent.int_br, 'get_vif_ports',
+                                   return_value=[]) as get_vif_ports:
+                self.assertFalse(self.agent.treat_devices_added(
+                    ['dev1', 'dev2']))
+        details_list.assert_called_once_with(self.agent.context,
+                                             ['dev1', 'dev2'],
+                                             self.agent.agent_id)
+        get_vif_ports.assert_called_once_with()
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'update_device_down_list',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_removed([{}]))
+            self.assertTrue(self.agent.treat_devices_removed(['dev']))
 
     def mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='dev', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'update_device_down_list',
+                               return_value=[details]):
             with mock.patch.object(self.agent, 'port_unbound') as func:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
+                self.assertFalse(self.agent.treat_devices_removed(['dev']))
         self.assertEqual(func.called, not port_exists)
 
     def test_treat_devices_removed_unbinds_port(self):
@@ -153,3 +176,52 @@ class TestOvsQuantumAgent(unittest.TestCase):
 
     def test_treat_devices_removed_ignores_missing_port(self):
         self.mock_treat_devices_removed(False)
+
+    def test_ports_changed_without_monitor(self):
+        self.assertIsNone(self.agent.ovsdb_monitor)
+        self.assertTrue(self.agent.ports_changed(0))
+
+    def mock_ports_changed(self, active=True, changes=False, last_scan=None):
+        monitor = mock.Mock()
+        monitor.is_active.return_value = active
+        monitor.wait_for_changes.return_value = changes
+        self.agent.ovsdb_monitor = monitor
+        if last_scan is None:
+            last_scan = time.time()
+        return self.agent.ports_changed(last_scan)
+
+    def test_ports_changed_respawns_monitor(self):
+        self.assertTrue(self.mock_ports_changed(active=False))
+        self.agent.ovsdb_monitor.start.assert_called_once_with()
+
+    def test_ports_changed_when_monitor_reports_changes(self):
+        self.assertTrue(self.mock_ports_changed(changes=True))
+
+    def test_ports_unchanged_when_monitor_is_idle(self):
+        self.assertFalse(self.mock_ports_changed())
+
+    def test_ports_changed_after_full_scan_interval(self):
+        self.assertTrue(self.mock_ports_changed(last_scan=0))
+
+    def test_process_network_ports_deferred(self):
+        port_info = {'added': set(['dev'])}
+        with mock.patch.object(self.agent, 'process_network_ports',
+                               return_value=False) as process:
+            self.assertFalse(
+                self.agent.process_network_ports_deferred(port_info))
+            process.assert_called_once_with(port_info)
+        self.agent.int_br.defer_apply_on.assert_called_once_with()
+        self.agent.int_br.defer_apply_off.assert_called_once_with()
+
+    def test_process_network_ports_deferred_resyncs_on_apply_failure(self):
+        self.agent.int_br.defer_apply_off.return_value = False
+        with mock.patch.object(self.agent, 'process_network_ports',
+                               return_value=False):
+            self.assertTrue(self.agent.process_network_ports_deferred({}))
+
+    def test_process_network_ports_deferred_applies_on_error(self):
+        with mock.patch.object(self.agent, 'process_network_ports',
+                               side_effect=RuntimeError()):
+            self.assertRaises(RuntimeError,
+                              self.agent.process_network_ports_deferred, {})
+        self.agent.int_br.defer_apply_off.assert_called_once_with()
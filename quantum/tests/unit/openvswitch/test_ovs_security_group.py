@@ -18,6 +18,7 @@
 import mock
 
 from quantum.api.v2 import attributes
+from quantum import context
 from quantum.extensions import securitygroup as ext_sg
 from quantum import manager
 from quantum.tests.unit import test_extension_security_group as test_sg
@@ -83,11 +84,54 @@ class TestOpenvswitchSecurityGroups(OpenvswitchSecurityGroupsTestCase,
                                      port_dict['fixed_ips'])
                     self._delete('ports', port_id)
 
+    def test_create_port_bulk_notifies_members_once(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    res = self._create_port_bulk(
+                        self.fmt, 2, n['network']['id'], 'test', True,
+                        override={0: {ext_sg.SECURITYGROUPS:
+                                      [security_group_id]},
+                                  1: {ext_sg.SECURITYGROUPS:
+                                      [security_group_id]}})
+                    ports = self.deserialize(self.fmt, res)['ports']
+                    for port in ports:
+                        self.assertEqual([security_group_id],
+                                         port[ext_sg.SECURITYGROUPS])
+                    self.notifier.assert_has_calls(
+                        [mock.call.security_groups_member_updated(
+                            mock.ANY, [security_group_id])])
+                    self.assertEqual(
+                        1,
+                        self.notifier.security_groups_member_updated.
+                        call_count)
+                    for port in ports:
+                        self._delete('ports', port['id'])
+
     def test_security_group_get_port_from_device_with_no_port(self):
         plugin = manager.QuantumManager.get_plugin()
         port_dict = plugin.callbacks.get_port_from_device('bad_device_id')
         self.assertEqual(None, port_dict)
 
+    def test_security_group_get_ports_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                res = self._create_port(self.fmt, n['network']['id'])
+                port = self.deserialize(self.fmt, res)['port']
+                plugin = manager.QuantumManager.get_plugin()
+                ports = plugin.callbacks.get_ports_from_devices(
+                    context.get_admin_context(),
+                    [port['id'], 'bad_device_id'])
+                self.assertEqual(ports.keys(), [port['id']])
+                port_dict = ports[port['id']]
+                self.assertEqual(port['id'], port_dict['device'])
+                self.assertEqual(port[ext_sg.SECURITYGROUPS],
+                                 port_dict[ext_sg.SECURITYGROUPS])
+                self.assertEqual([port['fixed_ips'][0]['ip_address']],
+                                 port_dict['fixed_ips'])
+                self._delete('ports', port['id'])
+
 
 class TestOpenvswitchSecurityGroupsXML(TestOpenvswitchSecurityGroups):
     fmt = 'xml'
@@ -15,6 +15,7 @@
 #    under the License.
 # @author: Dan Wendlandt, Nicira, Inc.
 
+import socket
 import unittest
 
 import mock
@@ -61,6 +62,41 @@ class AgentUtilsExecuteTest(unittest.TestCase):
         self.assertEqual(result, "%s\n" % self.test_file)
 
 
+class AgentUtilsExecuteDaemonTest(unittest.TestCase):
+    def setUp(self):
+        daemon_p = mock.patch.object(utils, '_get_root_helper_daemon',
+                                     return_value='/tmp/rootwrap.sock')
+        daemon_p.start()
+        self.addCleanup(daemon_p.stop)
+        execute_p = mock.patch.object(utils.rootwrap_daemon, 'execute')
+        self.daemon_execute = execute_p.start()
+        self.addCleanup(execute_p.stop)
+
+    def test_with_daemon(self):
+        self.daemon_execute.return_value = (0, 'out', '')
+        result = utils.execute(['ls', 1], 'sudo', process_input='in')
+        self.assertEqual(result, 'out')
+        self.daemon_execute.assert_called_once_with('/tmp/rootwrap.sock',
+                                                    ['ls', '1'], 'in')
+
+    def test_daemon_check_exit_code(self):
+        self.daemon_execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['ls'], 'sudo')
+
+    def test_without_helper_skips_daemon(self):
+        utils.execute(['true'])
+        self.assertFalse(self.daemon_execute.called)
+
+    def test_with_addl_env_skips_daemon(self):
+        utils.execute(['true'], 'echo', addl_env={'foo': 'bar'})
+        self.assertFalse(self.daemon_execute.called)
+
+    def test_unreachable_daemon_spawns_helper(self):
+        self.daemon_execute.side_effect = socket.error()
+        result = utils.execute(['ls', '/'], 'echo')
+        self.assertEqual(result, 'ls /\n')
+
+
 class AgentUtilsGetInterfaceMAC(unittest.TestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
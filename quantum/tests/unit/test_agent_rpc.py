@@ -22,6 +22,7 @@ import mock
 from quantum.agent import rpc
 from quantum.openstack.common import cfg
 from quantum.openstack.common import context
+from quantum.openstack.common.rpc import common as rpc_common
 
 
 class AgentRPCPluginApi(unittest.TestCase):
@@ -44,9 +45,47 @@ class AgentRPCPluginApi(unittest.TestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_update_device_down_list(self):
+        self._test_rpc_call('update_device_down_list')
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def _test_list_call_fallback(self, method, device_method, exc_type):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        error = rpc_common.RemoteError(exc_type=exc_type)
+        with mock.patch('quantum.openstack.common.rpc.call') as rpc_call:
+            rpc_call.side_effect = [error, 'foo', 'bar']
+            func_obj = getattr(agent, method)
+            actual_val = func_obj(ctxt, ['dev1', 'dev2'], 'fake_agent_id')
+        self.assertEqual(actual_val, ['foo', 'bar'])
+        methods = [c[0][2]['method'] for c in rpc_call.call_args_list]
+        self.assertEqual(methods, [method, device_method, device_method])
+
+    def test_get_devices_details_list_fallback(self):
+        self._test_list_call_fallback('get_devices_details_list',
+                                      'get_device_details',
+                                      'UnsupportedRpcVersion')
+
+    def test_update_device_down_list_fallback(self):
+        self._test_list_call_fallback('update_device_down_list',
+                                      'update_device_down',
+                                      'UnsupportedRpcVersion')
+
+    def test_list_call_other_error(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('quantum.openstack.common.rpc.call') as rpc_call:
+            rpc_call.side_effect = rpc_common.RemoteError(exc_type='Timeout')
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list,
+                              ctxt, ['dev1'], 'fake_agent_id')
+        self.assertEqual(rpc_call.call_count, 1)
+
 
 class AgentRPCMethods(unittest.TestCase):
     def test_create_consumers(self):
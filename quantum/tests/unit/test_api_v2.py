@@ -35,6 +35,7 @@ from quantum.manager import QuantumManager
 from quantum.openstack.common import cfg
 from quantum.openstack.common.notifier import api as notifer_api
 from quantum.openstack.common import uuidutils
+from quantum import quota
 from quantum.tests.unit import testlib_api
 from quantum import wsgi
 
@@ -271,6 +272,92 @@ class APIv2TestCase(APIv2TestBase):
                                                    filters=filters,
                                                    fields=mock.ANY)
 
+    def _setup_pagination_and_sorting(self, native=False):
+        cfg.CONF.set_override('allow_pagination', True)
+        cfg.CONF.set_override('allow_sorting', True)
+        instance = self.plugin.return_value
+        instance._QuantumPluginBaseV2__native_pagination_support = native
+        instance._QuantumPluginBaseV2__native_sorting_support = native
+        self.api = webtest.TestApp(router.APIRouter())
+        return instance
+
+    def test_pagination_and_sorting_native(self):
+        instance = self._setup_pagination_and_sorting(native=True)
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'), {'limit': '2',
+                                             'marker': 'foo',
+                                             'sort_key': 'name',
+                                             'sort_dir': 'desc'})
+        instance.get_networks.assert_called_once_with(
+            mock.ANY, filters={}, fields=[],
+            sorts=[('name', False), ('id', True)],
+            limit=3, marker='foo', page_reverse=False)
+
+    def test_pagination_native_next_link(self):
+        instance = self._setup_pagination_and_sorting(native=True)
+        # one more item than requested means a following page exists
+        instance.get_networks.return_value = [{'id': 'a'}, {'id': 'b'},
+                                              {'id': 'c'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '2'})
+        self.assertEqual([net['id'] for net in res.json['networks']],
+                         ['a', 'b'])
+        links = res.json['networks_links']
+        self.assertEqual([link['rel'] for link in links], ['next'])
+        self.assertTrue('marker=b' in links[0]['href'])
+
+    def test_pagination_and_sorting_emulated(self):
+        instance = self._setup_pagination_and_sorting()
+        instance.get_networks.return_value = [{'id': 'c', 'name': 'n1'},
+                                              {'id': 'a', 'name': 'n3'},
+                                              {'id': 'b', 'name': 'n2'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '1',
+                                                   'marker': 'a',
+                                                   'sort_key': 'name',
+                                                   'sort_dir': 'desc'})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters={},
+                                                      fields=[])
+        self.assertEqual([net['id'] for net in res.json['networks']], ['b'])
+        links = res.json['networks_links']
+        self.assertEqual([link['rel'] for link in links],
+                         ['next', 'previous'])
+
+    def test_pagination_emulated_last_page_has_no_next_link(self):
+        instance = self._setup_pagination_and_sorting()
+        instance.get_networks.return_value = [{'id': 'a'}, {'id': 'b'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '2'})
+        self.assertEqual(len(res.json['networks']), 2)
+        self.assertFalse('networks_links' in res.json)
+
+    def test_pagination_invalid_limit(self):
+        self._setup_pagination_and_sorting()
+        res = self.api.get(_get_path('networks'), {'limit': 'foo'},
+                           expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+
+    def test_sorting_invalid_sort_dir(self):
+        self._setup_pagination_and_sorting()
+        res = self.api.get(_get_path('networks'), {'sort_key': 'name',
+                                                   'sort_dir': 'foo'},
+                           expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+
+    def test_pagination_params_are_not_filters(self):
+        instance = self._setup_pagination_and_sorting()
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'), {'limit': '2',
+                                             'page_reverse': 'True',
+                                             'sort_key': 'name',
+                                             'foo': 'bar'})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters={'foo': ['bar']},
+                                                      fields=[])
+
 
 # Note: since all resources use the same controller and validation
 # logic, we actually get really good coverage from testing just networks.
@@ -868,6 +955,45 @@ class QuotaTest(APIv2TestBase):
         self.assertTrue("Quota exceeded for resources" in
                         res.json['QuantumError'])
 
+    def _test_create_network_bulk_quota(self, tenant_ids, count, limit):
+        cfg.CONF.set_override('quota_network', limit, group='QUOTAS')
+        data = {'networks': [{'name': 'net%d' % i,
+                              'admin_state_up': True,
+                              'tenant_id': tenant_id}
+                             for i, tenant_id in enumerate(tenant_ids)]}
+
+        def side_effect(context, network):
+            net = network.copy()
+            net['network'].update({'subnets': []})
+            return net['network']
+
+        instance = self.plugin.return_value
+        instance.create_network.side_effect = side_effect
+        instance.get_networks_count.return_value = count
+        res = self.api.post_json(_get_path('networks'), data,
+                                 expect_errors=True)
+        # The networks of a tenant are counted once
+        self.assertEqual(instance.get_networks_count.call_count,
+                         len(set(tenant_ids)))
+        return res
+
+    def test_create_network_bulk_quota(self):
+        tenant_id = _uuid()
+        res = self._test_create_network_bulk_quota([tenant_id] * 3, 1, 4)
+        self.assertEqual(res.status_int, exc.HTTPCreated.code)
+
+    def test_create_network_bulk_quota_exceeded(self):
+        tenant_id = _uuid()
+        res = self._test_create_network_bulk_quota([tenant_id] * 3, 2, 4)
+        self.assertTrue("Quota exceeded for resources" in
+                        res.json['QuantumError'])
+        self.assertFalse(self.plugin.return_value.create_network.called)
+
+    def test_create_network_bulk_quota_per_tenant(self):
+        tenant_ids = [_uuid(), _uuid()]
+        res = self._test_create_network_bulk_quota(tenant_ids * 2, 2, 4)
+        self.assertEqual(res.status_int, exc.HTTPCreated.code)
+
     def test_create_network_quota_without_limit(self):
         cfg.CONF.set_override('quota_network', -1, group='QUOTAS')
         initial_input = {'network': {'name': 'net1', 'tenant_id': _uuid()}}
@@ -877,6 +1003,43 @@ class QuotaTest(APIv2TestBase):
             _get_path('networks'), initial_input)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
 
+    def _test_create_network_reservation(self, create_side_effect):
+        tenant_id = _uuid()
+        initial_input = {'network': {'name': 'net1', 'tenant_id': tenant_id}}
+        instance = self.plugin.return_value
+        instance.create_network.side_effect = create_side_effect
+        with mock.patch.object(quota.QUOTAS, 'make_reservation',
+                               return_value='reservation') as reserve:
+            with mock.patch.object(quota.QUOTAS,
+                                   'commit_reservation') as commit:
+                with mock.patch.object(quota.QUOTAS,
+                                       'cancel_reservation') as cancel:
+                    res = self.api.post_json(_get_path('networks'),
+                                             initial_input,
+                                             expect_errors=True)
+        reserve.assert_called_once_with(mock.ANY, tenant_id, 'network', 1,
+                                        instance, 'networks', tenant_id)
+        return res, commit, cancel
+
+    def test_create_network_commits_reservation(self):
+        def side_effect(context, network):
+            net = network['network'].copy()
+            net.update({'id': _uuid(), 'subnets': []})
+            return net
+
+        res, commit, cancel = self._test_create_network_reservation(
+            side_effect)
+        self.assertEqual(res.status_int, exc.HTTPCreated.code)
+        commit.assert_called_once_with(mock.ANY, 'reservation')
+        self.assertFalse(cancel.called)
+
+    def test_create_network_failure_cancels_reservation(self):
+        res, commit, cancel = self._test_create_network_reservation(
+            q_exc.InvalidInput(error_message='failure'))
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+        cancel.assert_called_once_with(mock.ANY, 'reservation')
+        self.assertFalse(commit.called)
+
 
 class ExtensionTestCase(unittest.TestCase):
     # NOTE(jkoelker) This potentially leaks the mock object if the setUp
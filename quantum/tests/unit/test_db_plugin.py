@@ -30,6 +30,7 @@ import quantum
 from quantum.api.extensions import PluginAwareExtensionManager
 from quantum.api.v2 import attributes
 from quantum.api.v2.attributes import ATTR_NOT_SPECIFIED
+from quantum.api.v2 import base
 from quantum.api.v2.router import APIRouter
 from quantum.common import config
 from quantum.common import exceptions as q_exc
@@ -97,6 +98,8 @@ class QuantumDbPluginV2TestCase(testlib_api.WebTestCase):
         cfg.CONF.set_override('base_mac', "12:34:56:78:90:ab")
         cfg.CONF.set_override('max_dns_nameservers', 2)
         cfg.CONF.set_override('max_subnet_host_routes', 2)
+        cfg.CONF.set_override('allow_pagination', True)
+        cfg.CONF.set_override('allow_sorting', True)
         self.api = APIRouter()
         # Set the defualt port status
         self.port_create_status = 'ACTIVE'
@@ -439,6 +442,78 @@ class QuantumDbPluginV2TestCase(testlib_api.WebTestCase):
         self.assertItemsEqual([i['id'] for i in res['%ss' % resource]],
                               [i[resource]['id'] for i in items])
 
+    def _count_list_queries(self, resource):
+        """Returns the number of SQL statements run to list a resource.
+
+        The base plugin implementation is invoked directly so that the
+        count is not affected by plugin specific extensions.
+        """
+        plugin = QuantumManager.get_plugin()
+        list_func = getattr(db_base_plugin_v2.QuantumDbPluginV2,
+                            'get_%ss' % resource)
+        dialect = db._ENGINE.dialect
+        with mock.patch.object(dialect, 'do_execute',
+                               wraps=dialect.do_execute) as do_execute:
+            list_func(plugin, context.get_admin_context())
+        return do_execute.call_count
+
+    def _emulate_pagination_and_sorting(self):
+        # Rebuild the API router so that its controllers use the emulated
+        # sorting and pagination helpers
+        with contextlib.nested(
+            mock.patch.object(base.Controller,
+                              '_is_native_pagination_supported',
+                              return_value=False),
+            mock.patch.object(base.Controller,
+                              '_is_native_sorting_supported',
+                              return_value=False)):
+            self.api = APIRouter()
+
+    def _test_list_with_sort(self, resource, items, sorts, query_params=''):
+        query_str = query_params
+        for key, direction in sorts:
+            query_str = query_str + "&sort_key=%s&sort_dir=%s" % (
+                key, direction)
+        req = self.new_list_request('%ss' % resource, params=query_str)
+        api = self._api_for_resource('%ss' % resource)
+        res = self.deserialize(self.fmt, req.get_response(api))
+        self.assertEqual([item[resource]['id'] for item in items],
+                         [n['id'] for n in res['%ss' % resource]])
+
+    def _test_list_with_pagination(self, resource, items, sort, limit,
+                                   expected_page_num, query_params='',
+                                   page_reverse=False):
+        query_str = query_params + '&' if query_params else ''
+        query_str = query_str + ("limit=%s&sort_key=%s&sort_dir=%s" %
+                                 (limit, sort[0], sort[1]))
+        if page_reverse:
+            query_str = query_str + '&page_reverse=True'
+            rel = 'previous'
+        else:
+            rel = 'next'
+        req = self.new_list_request('%ss' % resource, params=query_str)
+        api = self._api_for_resource('%ss' % resource)
+        items_res = []
+        page_num = 0
+        while req:
+            page_num = page_num + 1
+            res = self.deserialize(self.fmt, req.get_response(api))
+            page = res['%ss' % resource]
+            self.assertTrue(len(page) <= limit)
+            if page_reverse:
+                items_res = page + items_res
+            else:
+                items_res = items_res + page
+            req = None
+            for link in res.get('%ss_links' % resource, []):
+                if link['rel'] == rel:
+                    self.assertEqual(len(page), limit)
+                    req = testlib_api.create_request(
+                        link['href'], '', 'application/%s' % self.fmt)
+        self.assertEqual(page_num, expected_page_num)
+        self.assertEqual([item[resource]['id'] for item in items],
+                         [n['id'] for n in items_res])
+
     @contextlib.contextmanager
     def network(self, name='net1',
                 admin_status_up=True,
@@ -701,6 +776,99 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                 for p in self.deserialize(self.fmt, res)['ports']:
                     self._delete('ports', p['id'])
 
+    def test_create_ports_bulk_native_allocates_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual([p['fixed_ips'] for p in ports],
+                             [[{'subnet_id': subnet['subnet']['id'],
+                                'ip_address': '10.0.0.2'}],
+                              [{'subnet_id': subnet['subnet']['id'],
+                                'ip_address': '10.0.0.3'}]])
+            self.assertNotEqual(ports[0]['mac_address'],
+                                ports[1]['mac_address'])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def _skip_unless_ports_created_together(self):
+        plugin = QuantumManager.get_plugin()
+        base_class = db_base_plugin_v2.QuantumDbPluginV2
+        if (self._skip_native_bulk or
+                (plugin.create_port.im_func is not
+                 base_class.create_port.im_func and
+                 plugin.create_port_bulk.im_func is
+                 base_class.create_port_bulk.im_func)):
+            self.skipTest("Plugin does not create the ports of a bulk "
+                          "request together")
+
+    def test_create_ports_bulk_native_checks_macs_once(self):
+        self._skip_unless_ports_created_together()
+        base_class = db_base_plugin_v2.QuantumDbPluginV2
+        with self.network() as net:
+            with contextlib.nested(
+                mock.patch.object(base_class, '_check_unique_mac'),
+                mock.patch.object(base_class, '_get_used_macs',
+                                  return_value=set())
+            ) as (check_unique_mac, get_used_macs):
+                res = self._create_port_bulk(self.fmt, 3,
+                                             net['network']['id'],
+                                             'test', True)
+            self.assertEqual(res.status_int, 201)
+            self.assertFalse(check_unique_mac.called)
+            # once for the requested macs, once for the generated ones
+            self.assertEqual(get_used_macs.call_count, 2)
+            for p in self.deserialize(self.fmt, res)['ports']:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_requested_ips_first(self):
+        self._skip_unless_ports_created_together()
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            # the addresses requested by a port are not generated for the
+            # ports before it
+            overrides = {0: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.3'}]},
+                         2: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.2'}]}}
+            res = self._create_port_bulk(self.fmt, 4,
+                                         subnet['subnet']['network_id'],
+                                         'test', True, override=overrides)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual([p['fixed_ips'][0]['ip_address']
+                              for p in ports],
+                             ['10.0.0.3', '10.0.0.4', '10.0.0.2', '10.0.0.5'])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_requested_ip_in_use(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            fixed_ips = {'fixed_ips': [{'subnet_id': subnet['subnet']['id'],
+                                        'ip_address': '10.0.0.5'}]}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True,
+                                         override={0: fixed_ips,
+                                                   1: fixed_ips})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
+    def test_create_ports_bulk_native_duplicate_mac(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.network() as net:
+            mac = {'mac_address': '00:16:3e:00:00:01'}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True,
+                                         override={0: mac, 1: mac})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
     def test_create_ports_bulk_wrong_input(self):
         with self.network() as net:
             overrides = {1: {'admin_state_up': 'doh'}}
@@ -769,6 +937,40 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                                self.port()) as ports:
             self._test_list_resources('port', ports)
 
+    def test_list_ports_with_sort_native(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with contextlib.nested(self.port(admin_state_up='True',
+                                         mac_address='00:00:00:00:00:01'),
+                               self.port(admin_state_up='False',
+                                         mac_address='00:00:00:00:00:02'),
+                               self.port(admin_state_up='False',
+                                         mac_address='00:00:00:00:00:03')
+                               ) as (port1, port2, port3):
+            self._test_list_with_sort('port', (port3, port2, port1),
+                                      [('admin_state_up', 'asc'),
+                                       ('mac_address', 'desc')])
+
+    def test_list_ports_with_pagination_native(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with contextlib.nested(self.port(mac_address='00:00:00:00:00:01'),
+                               self.port(mac_address='00:00:00:00:00:02'),
+                               self.port(mac_address='00:00:00:00:00:03')
+                               ) as (port1, port2, port3):
+            self._test_list_with_pagination('port',
+                                            (port1, port2, port3),
+                                            ('mac_address', 'asc'), 2, 2)
+
+    def test_list_ports_with_pagination_reverse_native(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with contextlib.nested(self.port(mac_address='00:00:00:00:00:01'),
+                               self.port(mac_address='00:00:00:00:00:02'),
+                               self.port(mac_address='00:00:00:00:00:03')
+                               ) as (port1, port2, port3):
+            self._test_list_with_pagination('port',
+                                            (port1, port2, port3),
+                                            ('mac_address', 'asc'), 2, 2,
+                                            page_reverse=True)
+
     def test_list_ports_filtered_by_fixed_ip(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
@@ -782,6 +984,44 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             self._test_list_resources('port', [port1],
                                       query_params=query_params)
 
+    def test_list_ports_query_count_does_not_depend_on_size(self):
+        # for this test we need to enable overlapping ips
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with self.port():
+            single = self._count_list_queries('port')
+            with contextlib.nested(self.port(), self.port()):
+                self.assertEqual(single, self._count_list_queries('port'))
+
+    def test_list_ports_with_fields(self):
+        with self.port() as port:
+            req = self.new_list_request('ports',
+                                        params='fields=id&fields=name')
+            res = self.deserialize(self.fmt, req.get_response(self.api))
+            self.assertEqual(1, len(res['ports']))
+            self.assertEqual(res['ports'][0]['id'], port['port']['id'])
+            self.assertEqual(res['ports'][0]['name'], port['port']['name'])
+            self.assertNotIn('fixed_ips', res['ports'][0])
+            self.assertNotIn('mac_address', res['ports'][0])
+
+    def test_make_port_dict_only_reads_requested_fields(self):
+        plugin = QuantumManager.get_plugin()
+        # fixed_ips and the other attributes are deliberately missing, so
+        # reading them would raise a KeyError
+        port = {'id': 'fake_id', 'status': 'ACTIVE'}
+        res = plugin._make_port_dict(port, ['id', 'status'])
+        self.assertEqual(res, port)
+
+    def test_fields_restrict_selected_columns(self):
+        plugin = QuantumManager.get_plugin()
+        ctx = context.get_admin_context()
+        query = plugin._apply_fields_to_query(
+            ctx.session.query(models_v2.Port), models_v2.Port,
+            ['id', 'status'])
+        statement = str(query)
+        self.assertIn('ports.status', statement)
+        self.assertNotIn('ports.mac_address', statement)
+        self.assertNotIn('ports.device_owner', statement)
+
     def test_list_ports_public_network(self):
         with self.network(shared=True) as network:
             with self.subnet(network) as subnet:
@@ -1304,7 +1544,8 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
         reference = datetime.datetime(2012, 8, 13, 23, 11, 0)
         cfg.CONF.set_override('dhcp_lease_duration', 0)
 
-        with self.subnet(cidr='10.0.1.0/24') as subnet:
+        # The expired addresses are recycled once the subnet is exhausted
+        with self.subnet(cidr='10.0.1.0/28') as subnet:
             with self.port(subnet=subnet) as port:
                 with mock.patch.object(timeutils, 'utcnow') as mock_utcnow:
                     mock_utcnow.return_value = reference
@@ -1315,11 +1556,11 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                                      subnet['subnet']['id'])
                     net_id = port['port']['network_id']
                     ports = []
-                    for i in range(16 - 3):
+                    for i in range(16 - 4):
                         res = self._create_port(self.fmt, net_id=net_id)
                         p = self.deserialize(self.fmt, res)
                         ports.append(p)
-                    for i in range(16 - 3):
+                    for i in range(16 - 4):
                         x = random.randrange(0, len(ports), 1)
                         p = ports.pop(x)
                         self._delete('ports', p['port']['id'])
@@ -1481,6 +1722,44 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     self.assertEqual(update_context._recycled_networks,
                                      set([subnet['subnet']['network_id']]))
 
+    def test_create_port_does_not_recycle_before_exhaustion(self):
+        cfg.CONF.set_override('dhcp_lease_duration', 0)
+        base_class = db_base_plugin_v2.QuantumDbPluginV2
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet):
+                with mock.patch.object(base_class,
+                                       '_recycle_expired_ip_allocations'
+                                       ) as recycle:
+                    with self.port(subnet=subnet):
+                        self.assertFalse(recycle.called)
+
+    def test_recycle_expired_ip_allocations_in_batches(self):
+        reference = datetime.datetime(2012, 8, 13, 23, 11, 0)
+        cfg.CONF.set_override('dhcp_lease_duration', 0)
+        cfg.CONF.set_override('ip_recycle_batch_size', 2)
+        plugin = QuantumManager.get_plugin()
+        base_class = db_base_plugin_v2.QuantumDbPluginV2
+        admin_context = context.get_admin_context()
+        q = admin_context.session.query(models_v2.IPAllocation)
+        with mock.patch.object(timeutils, 'utcnow', return_value=reference):
+            with self.subnet(cidr='10.0.1.0/29') as subnet:
+                # The addresses of the deleted ports are held
+                for i in range(5):
+                    with self.port(subnet=subnet):
+                        pass
+                self.assertEqual(q.filter_by(port_id=None).count(), 5)
+                with mock.patch.object(base_class, '_recycle_ip',
+                                       wraps=base_class._recycle_ip) as rc:
+                    self.assertEqual(
+                        plugin.recycle_expired_ip_allocations(admin_context),
+                        5)
+                self.assertEqual(rc.call_count, 5)
+                self.assertEqual(q.filter_by(port_id=None).count(), 0)
+                # The recycled addresses can be allocated again
+                for i in range(5):
+                    with self.port(subnet=subnet):
+                        pass
+
 
 class TestNetworksV2(QuantumDbPluginV2TestCase):
     # NOTE(cerberus): successful network update and delete are
@@ -1755,6 +2034,108 @@ class TestNetworksV2(QuantumDbPluginV2TestCase):
                                self.network()) as networks:
             self._test_list_resources('network', networks)
 
+    def test_list_networks_query_count_does_not_depend_on_size(self):
+        with self.subnet():
+            single = self._count_list_queries('network')
+            with contextlib.nested(self.subnet(cidr='10.0.1.0/24'),
+                                   self.subnet(cidr='10.0.2.0/24')):
+                self.assertEqual(single,
+                                 self._count_list_queries('network'))
+
+    def test_list_networks_with_sort_native(self):
+        with contextlib.nested(self.network(admin_status_up=True,
+                                            name='net1'),
+                               self.network(admin_status_up=False,
+                                            name='net2'),
+                               self.network(admin_status_up=False,
+                                            name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_sort('network', (net3, net2, net1),
+                                      [('admin_state_up', 'asc'),
+                                       ('name', 'desc')])
+
+    def test_list_networks_with_sort_emulated(self):
+        self._emulate_pagination_and_sorting()
+        with contextlib.nested(self.network(admin_status_up=True,
+                                            name='net1'),
+                               self.network(admin_status_up=False,
+                                            name='net2'),
+                               self.network(admin_status_up=False,
+                                            name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_sort('network', (net3, net2, net1),
+                                      [('admin_state_up', 'asc'),
+                                       ('name', 'desc')])
+
+    def test_list_networks_with_pagination_native(self):
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_pagination('network',
+                                            (net1, net2, net3),
+                                            ('name', 'asc'), 2, 2)
+
+    def test_list_networks_with_pagination_emulated(self):
+        self._emulate_pagination_and_sorting()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_pagination('network',
+                                            (net1, net2, net3),
+                                            ('name', 'asc'), 2, 2)
+
+    def test_list_networks_with_pagination_reverse_native(self):
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_pagination('network',
+                                            (net1, net2, net3),
+                                            ('name', 'asc'), 2, 2,
+                                            page_reverse=True)
+
+    def test_list_networks_with_pagination_reverse_emulated(self):
+        self._emulate_pagination_and_sorting()
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            self._test_list_with_pagination('network',
+                                            (net1, net2, net3),
+                                            ('name', 'asc'), 2, 2,
+                                            page_reverse=True)
+
+    def test_list_networks_with_pagination_exact_page(self):
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2')
+                               ) as (net1, net2):
+            self._test_list_with_pagination('network', (net1, net2),
+                                            ('name', 'asc'), 2, 1)
+
+    def test_list_networks_with_pagination_max_limit(self):
+        cfg.CONF.set_override('pagination_max_limit', 2)
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2'),
+                               self.network(name='net3')
+                               ) as (net1, net2, net3):
+            res = self._list('networks', query_params='limit=10')
+            self.assertEqual(len(res['networks']), 2)
+            self.assertEqual([link['rel'] for link in res['networks_links']],
+                             ['next'])
+
+    def test_list_networks_with_invalid_limit_returns_400(self):
+        req = self.new_list_request('networks', params='limit=-1')
+        res = req.get_response(self.api)
+        self.assertEqual(res.status_int, 400)
+
+    def test_list_networks_with_invalid_sort_key_returns_400(self):
+        req = self.new_list_request('networks',
+                                    params='sort_key=bogus_attr&sort_dir=asc')
+        res = req.get_response(self.api)
+        self.assertEqual(res.status_int, 400)
+
     def test_list_networks_with_parameters(self):
         with contextlib.nested(self.network(name='net1',
                                             admin_status_up=False),
@@ -2551,6 +2932,51 @@ class TestSubnetsV2(QuantumDbPluginV2TestCase):
                 self.assertEqual(res['subnet']['network_id'],
                                  network['network']['id'])
 
+    def test_list_subnets_with_sort_native(self):
+        with self.network() as network:
+            with contextlib.nested(self.subnet(network=network,
+                                               gateway_ip='10.0.0.1',
+                                               cidr='10.0.0.0/24'),
+                                   self.subnet(network=network,
+                                               gateway_ip='10.0.1.1',
+                                               cidr='10.0.1.0/24'),
+                                   self.subnet(network=network,
+                                               gateway_ip='10.0.2.1',
+                                               cidr='10.0.2.0/24')
+                                   ) as (subnet1, subnet2, subnet3):
+                self._test_list_with_sort('subnet',
+                                          (subnet3, subnet2, subnet1),
+                                          [('cidr', 'desc')])
+
+    def test_list_subnets_with_pagination_native(self):
+        with self.network() as network:
+            with contextlib.nested(self.subnet(network=network,
+                                               gateway_ip='10.0.0.1',
+                                               cidr='10.0.0.0/24'),
+                                   self.subnet(network=network,
+                                               gateway_ip='10.0.1.1',
+                                               cidr='10.0.1.0/24'),
+                                   self.subnet(network=network,
+                                               gateway_ip='10.0.2.1',
+                                               cidr='10.0.2.0/24')
+                                   ) as (subnet1, subnet2, subnet3):
+                self._test_list_with_pagination('subnet',
+                                                (subnet1, subnet2, subnet3),
+                                                ('cidr', 'asc'), 2, 2)
+
+    def test_list_subnets_query_count_does_not_depend_on_size(self):
+        with self.network() as network:
+            with self.subnet(network=network, cidr='10.0.0.0/24',
+                             dns_nameservers=['1.2.3.4']):
+                single = self._count_list_queries('subnet')
+                with contextlib.nested(
+                    self.subnet(network=network, cidr='10.0.1.0/24',
+                                dns_nameservers=['1.2.3.4']),
+                    self.subnet(network=network, cidr='10.0.2.0/24',
+                                dns_nameservers=['1.2.3.4'])):
+                    self.assertEqual(single,
+                                     self._count_list_queries('subnet'))
+
     def test_list_subnets(self):
         with self.network() as network:
             with contextlib.nested(self.subnet(network=network,
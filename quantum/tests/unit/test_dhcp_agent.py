@@ -206,22 +206,23 @@ class TestDhcpAgent(unittest.TestCase):
             dhcp = dhcp_agent.DhcpAgent(cfg.CONF)
 
             attrs_to_mock = dict(
-                [(a, mock.DEFAULT) for a in
-                 ['refresh_dhcp_helper', 'disable_dhcp_helper', 'cache']])
+                [(a, mock.DEFAULT) for a in ['network_events', 'cache']])
 
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
                 mocks['cache'].get_network_ids.return_value = known_networks
                 dhcp.sync_state()
 
-                exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
-
                 diff = set(known_networks) - set(active_networks)
-                exp_disable = [mock.call(net_id) for net_id in diff]
+                exp_disable = [mock.call(net_id, dhcp_agent.DISABLE, delay=0)
+                               for net_id in diff]
+                exp_refresh = [mock.call(net_id, dhcp_agent.REFRESH, delay=0)
+                               for net_id in active_networks]
 
                 mocks['cache'].assert_has_calls([mock.call.get_network_ids()])
-                mocks['refresh_dhcp_helper'].assert_has_called(exp_refresh)
-                mocks['disable_dhcp_helper'].assert_has_called(exp_disable)
+                mocks['network_events'].add.assert_has_calls(
+                    exp_disable + exp_refresh)
+                self.assertEqual(mocks['network_events'].add.call_count,
+                                 len(exp_disable) + len(exp_refresh))
 
     def test_sync_state_initial(self):
         self._test_sync_state_helper([], ['a'])
@@ -286,6 +287,10 @@ class TestDhcpAgentEventHandler(unittest.TestCase):
         cache_cls.return_value = self.cache
 
         self.dhcp = dhcp_agent.DhcpAgent(cfg.CONF)
+        # process the network events without delay
+        self.dhcp.network_events = mock.Mock()
+        self.dhcp.network_events.add.side_effect = (
+            self.dhcp.process_network_event)
         self.call_driver_p = mock.patch.object(self.dhcp, 'call_driver')
 
         self.call_driver = self.call_driver_p.start()
@@ -458,6 +463,20 @@ class TestDhcpAgentEventHandler(unittest.TestCase):
             self.cache.assert_has_calls(
                 [mock.call.get_network_by_id('net-id')])
 
+    def test_refresh_dhcp_helper_down_network(self):
+        network = FakeModel('net-id',
+                            tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                            admin_state_up=False,
+                            subnets=[fake_subnet1],
+                            ports=[])
+
+        self.cache.get_network_by_id.return_value = network
+        self.plugin.get_network_info.return_value = network
+        with mock.patch.object(self.dhcp, 'disable_dhcp_helper') as disable:
+            self.dhcp.refresh_dhcp_helper(network.id)
+            disable.assert_called_once_with('net-id')
+            self.assertFalse(self.call_driver.called)
+
     def test_refresh_dhcp_helper_exception_during_rpc(self):
         network = FakeModel('net-id',
                             tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
@@ -558,6 +577,84 @@ class TestDhcpAgentEventHandler(unittest.TestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_process_network_event_reload_unknown_network(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp.process_network_event('unknown', dhcp_agent.RELOAD)
+        self.assertFalse(self.call_driver.called)
+
+
+class TestNetworkEventQueue(unittest.TestCase):
+    def setUp(self):
+        self.process = mock.Mock()
+        self.queue = dhcp_agent.NetworkEventQueue(self.process, 0.5, 2)
+        self.spawn_after_p = mock.patch('eventlet.spawn_after')
+        self.spawn_after = self.spawn_after_p.start()
+
+    def tearDown(self):
+        self.spawn_after_p.stop()
+
+    def test_add_schedules_network_once(self):
+        self.queue.add('net1', dhcp_agent.RELOAD)
+        self.queue.add('net1', dhcp_agent.RELOAD)
+        self.queue.add('net1', dhcp_agent.REFRESH)
+        self.spawn_after.assert_called_once_with(
+            0.5, self.queue.pool.spawn_n, self.queue._process_network,
+            'net1')
+        self.assertEqual(self.queue.pending, {'net1': dhcp_agent.REFRESH})
+
+    def test_add_with_delay(self):
+        self.queue.add('net1', dhcp_agent.REFRESH, delay=0)
+        self.spawn_after.assert_called_once_with(
+            0, self.queue.pool.spawn_n, self.queue._process_network, 'net1')
+
+    def test_add_different_networks(self):
+        self.queue.add('net1', dhcp_agent.RELOAD)
+        self.queue.add('net2', dhcp_agent.RELOAD)
+        self.assertEqual(self.spawn_after.call_count, 2)
+
+    def test_reload_does_not_replace_pending_action(self):
+        self.queue.add('net1', dhcp_agent.DISABLE)
+        self.queue.add('net1', dhcp_agent.RELOAD)
+        self.queue._process_network('net1')
+        self.process.assert_called_once_with('net1', dhcp_agent.DISABLE)
+        self.assertFalse(self.queue.pending)
+        self.assertFalse(self.queue.in_progress)
+
+    def test_refresh_does_not_replace_pending_disable(self):
+        self.queue.add('net1', dhcp_agent.DISABLE)
+        self.queue.add('net1', dhcp_agent.REFRESH, delay=0)
+        self.queue._process_network('net1')
+        self.process.assert_called_once_with('net1', dhcp_agent.DISABLE)
+
+    def test_enable_replaces_pending_disable(self):
+        self.queue.add('net1', dhcp_agent.DISABLE)
+        self.queue.add('net1', dhcp_agent.ENABLE)
+        self.queue._process_network('net1')
+        self.process.assert_called_once_with('net1', dhcp_agent.ENABLE)
+
+    def test_action_added_while_processing(self):
+        def process(network_id, action):
+            if action == dhcp_agent.ENABLE:
+                self.queue.add(network_id, dhcp_agent.RELOAD)
+                self.queue.add(network_id, dhcp_agent.RELOAD)
+
+        self.process.side_effect = process
+        self.queue.add('net1', dhcp_agent.ENABLE)
+        self.queue._process_network('net1')
+        self.assertEqual(self.spawn_after.call_count, 1)
+        self.process.assert_has_calls(
+            [mock.call('net1', dhcp_agent.ENABLE),
+             mock.call('net1', dhcp_agent.RELOAD)])
+        self.assertEqual(self.process.call_count, 2)
+
+    def test_process_network_failure(self):
+        self.process.side_effect = RuntimeError()
+        self.queue.add('net1', dhcp_agent.REFRESH)
+        with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
+            self.queue._process_network('net1')
+        self.assertTrue(log.called)
+        self.assertFalse(self.queue.in_progress)
+
 
 class TestDhcpPluginApiProxy(unittest.TestCase):
     def setUp(self):
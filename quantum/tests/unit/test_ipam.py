@@ -0,0 +1,131 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest2
+
+from quantum.common import exceptions as q_exc
+from quantum import context
+from quantum.db import ipam
+from quantum.db import models_v2
+from quantum.openstack.common import cfg
+from quantum.tests.unit import test_db_plugin
+
+
+INTERVAL_DRIVER = 'quantum.db.ipam.IntervalIpamDriver'
+RANGE_DRIVER = 'quantum.db.ipam.RangeIpamDriver'
+
+
+class TestIPIntervalSet(unittest2.TestCase):
+
+    def test_merges_adjacent_intervals(self):
+        free = ipam.IPIntervalSet([(5, 9), (1, 3), (4, 4), (20, 20)])
+        self.assertEqual(list(free), [(1, 9), (20, 20)])
+
+    def test_pop_returns_smallest_value(self):
+        free = ipam.IPIntervalSet([(1, 2), (5, 5)])
+        self.assertEqual([free.pop(), free.pop(), free.pop()], [1, 2, 5])
+        self.assertEqual(len(free), 0)
+        self.assertRaises(KeyError, free.pop)
+
+    def test_discard_splits_interval(self):
+        free = ipam.IPIntervalSet([(1, 10)])
+        free.discard(5)
+        free.discard(1)
+        free.discard(10)
+        free.discard(42)
+        self.assertEqual(list(free), [(2, 4), (6, 9)])
+        self.assertNotIn(5, free)
+        self.assertIn(6, free)
+
+    def test_add_merges_neighbours(self):
+        free = ipam.IPIntervalSet([(1, 3), (5, 7)])
+        free.add(4)
+        self.assertEqual(list(free), [(1, 7)])
+        free.add(9)
+        free.add(8)
+        free.add(0)
+        free.add(3)
+        self.assertEqual(list(free), [(0, 9)])
+
+    def test_serialize_round_trip(self):
+        ipv6 = 0x20010db8000000000000000000000001
+        free = ipam.IPIntervalSet([(1, 3), (ipv6, ipv6 + 10)])
+        value = free.serialize()
+        self.assertEqual(list(ipam.IPIntervalSet.deserialize(value)),
+                         list(free))
+        self.assertEqual(len(ipam.IPIntervalSet.deserialize('')), 0)
+
+
+class IntervalIpamTestCase(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(IntervalIpamTestCase, self).setUp()
+        cfg.CONF.set_override('ipam_driver', INTERVAL_DRIVER)
+
+
+class TestIntervalIpamPortsV2(IntervalIpamTestCase,
+                              test_db_plugin.TestPortsV2):
+
+    def test_generate_ips_in_one_pass(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            ctx = context.get_admin_context()
+            subnets = [subnet['subnet']]
+            ips = ipam.get_driver().generate_ips(ctx, subnets, 3)
+            self.assertEqual([ip['ip_address'] for ip in ips],
+                             ['10.0.0.2', '10.0.0.3', '10.0.0.4'])
+            # only 10.0.0.5 and 10.0.0.6 are left
+            self.assertRaises(q_exc.IpAddressGenerationFailure,
+                              ipam.get_driver().generate_ips,
+                              ctx, subnets, 3)
+
+    def test_subnet_created_with_range_driver_is_converted(self):
+        cfg.CONF.set_override('ipam_driver', RANGE_DRIVER)
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(ips[0]['ip_address'], '10.0.0.2')
+            cfg.CONF.set_override('ipam_driver', INTERVAL_DRIVER)
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                # 10.0.0.2 is still held by the expired allocation
+                self.assertEqual(ips[0]['ip_address'], '10.0.0.3')
+            ctx = context.get_admin_context()
+            ranges = ctx.session.query(models_v2.IPAvailabilityRange).all()
+            self.assertEqual(ranges, [])
+
+    def test_concurrent_conversion_of_ranges(self):
+        cfg.CONF.set_override('ipam_driver', RANGE_DRIVER)
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            # another transaction converted the ranges in the meantime
+            other_ctx = context.get_admin_context()
+            with other_ctx.session.begin():
+                other_ctx.session.add(ipam.IPAvailabilitySet(
+                    subnet_id=subnet_id, available=''))
+            ctx = context.get_admin_context()
+            driver = ipam.IntervalIpamDriver()
+            with ctx.session.begin():
+                self.assertIsNone(driver._migrate_ranges(ctx, subnet_id))
+                availability = driver._get_availability(ctx, subnet_id)
+            self.assertEqual(availability['subnet_id'], subnet_id)
+            ranges = ctx.session.query(models_v2.IPAvailabilityRange).all()
+            self.assertNotEqual(ranges, [])
+
+
+class TestIntervalIpamSubnetsV2(IntervalIpamTestCase,
+                                test_db_plugin.TestSubnetsV2):
+    pass
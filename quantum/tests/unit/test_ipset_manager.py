@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.agent.linux import ipset_manager
+
+
+class IpsetManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(_execute=self.execute,
+                                                root_helper='sudo')
+
+    def _restored(self):
+        args, kwargs = self.execute.call_args
+        self.assertEqual(args, (['ipset', 'restore', '-exist'],))
+        self.assertEqual(kwargs['root_helper'], 'sudo')
+        return kwargs['process_input'].splitlines()
+
+    def test_get_name(self):
+        name = self.ipset.get_name('IPv4', 'a' * 36)
+        self.assertEqual(name, 'IPv4' + 'a' * 27)
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.1'])
+        self.assertEqual(self._restored(),
+                         ['create IPv4sg hash:ip family inet',
+                          'flush IPv4sg',
+                          'add IPv4sg 10.0.0.1'])
+
+    def test_set_members_updates_changed_members(self):
+        self.ipset.set_members('IPv6sg', 'IPv6', ['fe80::1', 'fe80::2'])
+        self.ipset.set_members('IPv6sg', 'IPv6', ['fe80::2', 'fe80::3'])
+        self.assertEqual(self._restored(),
+                         ['add IPv6sg fe80::3', 'del IPv6sg fe80::1'])
+        self.assertEqual(self.ipset.sets['IPv6sg'],
+                         set(['fe80::2', 'fe80::3']))
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_set_members_create_failure(self):
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.ipset.set_members,
+                          'IPv4sg', 'IPv4', ['10.0.0.1'])
+        self.assertEqual(self.ipset.sets, {})
+        self.execute.side_effect = None
+        self.ipset.set_members('IPv4sg', 'IPv4', ['10.0.0.1'])
+        self.assertEqual(self._restored(),
+                         ['create IPv4sg hash:ip family inet',
+                          'flush IPv4sg',
+                          'add IPv4sg 10.0.0.1'])
+
+    def test_destroy(self):
+        self.ipset.set_members('IPv4sg', 'IPv4', [])
+        self.ipset.destroy('IPv4sg')
+        self.execute.assert_called_with(['ipset', 'destroy', 'IPv4sg'],
+                                        root_helper='sudo',
+                                        check_exit_code=False)
+        self.assertEqual(self.ipset.sets, {})
@@ -19,7 +19,9 @@ import mock
 from mock import call
 import unittest2 as unittest
 
+from quantum.agent.linux.ipset_manager import IpsetManager
 from quantum.agent.linux.iptables_firewall import IptablesFirewallDriver
+from quantum.openstack.common import cfg
 from quantum.tests.unit import test_api_v2
 
 _uuid = test_api_v2._uuid
@@ -62,8 +64,8 @@ class IptablesFirewallTestCase(unittest.TestCase):
         self.firewall.prepare_port_filter(port)
         calls = [call.add_chain('sg-fallback'),
                  call.add_rule('sg-fallback', '-j DROP'),
-                 call.ensure_remove_chain('sg-chain'),
                  call.add_chain('sg-chain'),
+                 call.add_rule('sg-chain', '-j ACCEPT'),
                  call.add_chain('ifake_dev'),
                  call.add_rule('FORWARD',
                                '-m physdev --physdev-is-bridged '
@@ -72,7 +74,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule('sg-chain',
                                '-m physdev --physdev-is-bridged '
                                '--physdev-out tapfake_dev '
-                               '-j $ifake_dev'),
+                               '-j $ifake_dev', top=True),
                  call.add_rule(
                      'ifake_dev', '-m state --state INVALID -j DROP'),
                  call.add_rule(
@@ -87,7 +89,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule('sg-chain',
                                '-m physdev --physdev-is-bridged '
                                '--physdev-in tapfake_dev '
-                               '-j $ofake_dev'),
+                               '-j $ofake_dev', top=True),
                  call.add_rule('INPUT',
                                '-m physdev --physdev-is-bridged '
                                '--physdev-in tapfake_dev '
@@ -106,8 +108,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule(
                      'ofake_dev',
                      '-m state --state ESTABLISHED,RELATED -j RETURN'),
-                 call.add_rule('ofake_dev', '-j $sg-fallback'),
-                 call.add_rule('sg-chain', '-j ACCEPT')]
+                 call.add_rule('ofake_dev', '-j $sg-fallback')]
 
         self.v4filter_inst.assert_has_calls(calls)
 
@@ -712,8 +713,8 @@ class IptablesFirewallTestCase(unittest.TestCase):
         self.firewall.prepare_port_filter(port)
         calls = [call.add_chain('sg-fallback'),
                  call.add_rule('sg-fallback', '-j DROP'),
-                 call.ensure_remove_chain('sg-chain'),
                  call.add_chain('sg-chain'),
+                 call.add_rule('sg-chain', '-j ACCEPT'),
                  call.add_chain('ifake_dev'),
                  call.add_rule('FORWARD',
                                '-m physdev --physdev-is-bridged '
@@ -722,7 +723,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule('sg-chain',
                                '-m physdev --physdev-is-bridged '
                                '--physdev-out tapfake_dev '
-                               '-j $ifake_dev'),
+                               '-j $ifake_dev', top=True),
                  call.add_rule(
                      'ifake_dev', '-m state --state INVALID -j DROP'),
                  call.add_rule(
@@ -741,7 +742,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                   call.add_rule('sg-chain',
                                 '-m physdev --physdev-is-bridged '
                                 '--physdev-in tapfake_dev '
-                                '-j $ofake_dev'),
+                                '-j $ofake_dev', top=True),
                   call.add_rule('INPUT',
                                 '-m physdev --physdev-is-bridged '
                                 '--physdev-in tapfake_dev '
@@ -766,8 +767,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
         if egress_expected_call:
             calls.append(egress_expected_call)
 
-        calls += [call.add_rule('ofake_dev', '-j $sg-fallback'),
-                  call.add_rule('sg-chain', '-j ACCEPT')]
+        calls += [call.add_rule('ofake_dev', '-j $sg-fallback')]
 
         filter_inst.assert_has_calls(calls)
 
@@ -784,8 +784,8 @@ class IptablesFirewallTestCase(unittest.TestCase):
         self.firewall.remove_port_filter({'device': 'no-exist-device'})
         calls = [call.add_chain('sg-fallback'),
                  call.add_rule('sg-fallback', '-j DROP'),
-                 call.ensure_remove_chain('sg-chain'),
                  call.add_chain('sg-chain'),
+                 call.add_rule('sg-chain', '-j ACCEPT'),
                  call.add_chain('ifake_dev'),
                  call.add_rule(
                      'FORWARD',
@@ -794,7 +794,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule(
                      'sg-chain',
                      '-m physdev --physdev-is-bridged '
-                     '--physdev-out tapfake_dev -j $ifake_dev'),
+                     '--physdev-out tapfake_dev -j $ifake_dev', top=True),
                  call.add_rule(
                      'ifake_dev', '-m state --state INVALID -j DROP'),
                  call.add_rule(
@@ -810,7 +810,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule(
                      'sg-chain',
                      '-m physdev --physdev-is-bridged '
-                     '--physdev-in tapfake_dev -j $ofake_dev'),
+                     '--physdev-in tapfake_dev -j $ofake_dev', top=True),
                  call.add_rule(
                      'INPUT',
                      '-m physdev --physdev-is-bridged '
@@ -833,11 +833,16 @@ class IptablesFirewallTestCase(unittest.TestCase):
                      'ofake_dev',
                      '-m state --state ESTABLISHED,RELATED -j RETURN'),
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
-                 call.add_rule('sg-chain', '-j ACCEPT'),
                  call.ensure_remove_chain('ifake_dev'),
+                 call.remove_rule(
+                     'FORWARD',
+                     '-m physdev --physdev-is-bridged '
+                     '--physdev-out tapfake_dev -j $sg-chain'),
                  call.ensure_remove_chain('ofake_dev'),
-                 call.ensure_remove_chain('sg-chain'),
-                 call.add_chain('sg-chain'),
+                 call.remove_rule(
+                     'FORWARD',
+                     '-m physdev --physdev-is-bridged '
+                     '--physdev-in tapfake_dev -j $sg-chain'),
                  call.add_chain('ifake_dev'),
                  call.add_rule(
                      'FORWARD',
@@ -846,7 +851,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule(
                      'sg-chain',
                      '-m physdev --physdev-is-bridged '
-                     '--physdev-out tapfake_dev -j $ifake_dev'),
+                     '--physdev-out tapfake_dev -j $ifake_dev', top=True),
                  call.add_rule(
                      'ifake_dev',
                      '-m state --state INVALID -j DROP'),
@@ -862,7 +867,7 @@ class IptablesFirewallTestCase(unittest.TestCase):
                  call.add_rule(
                      'sg-chain',
                      '-m physdev --physdev-is-bridged '
-                     '--physdev-in tapfake_dev -j $ofake_dev'),
+                     '--physdev-in tapfake_dev -j $ofake_dev', top=True),
                  call.add_rule(
                      'INPUT',
                      '-m physdev --physdev-is-bridged '
@@ -883,14 +888,96 @@ class IptablesFirewallTestCase(unittest.TestCase):
                      '-m state --state ESTABLISHED,RELATED -j RETURN'),
                  call.add_rule('ofake_dev', '-j RETURN'),
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
-                 call.add_rule('sg-chain', '-j ACCEPT'),
                  call.ensure_remove_chain('ifake_dev'),
+                 call.remove_rule(
+                     'FORWARD',
+                     '-m physdev --physdev-is-bridged '
+                     '--physdev-out tapfake_dev -j $sg-chain'),
                  call.ensure_remove_chain('ofake_dev'),
-                 call.ensure_remove_chain('sg-chain'),
-                 call.add_chain('sg-chain')]
+                 call.remove_rule(
+                     'FORWARD',
+                     '-m physdev --physdev-is-bridged '
+                     '--physdev-in tapfake_dev -j $sg-chain')]
 
         self.v4filter_inst.assert_has_calls(calls)
 
+    def test_prepare_port_filter_leaves_other_ports(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        other_port = self._fake_port()
+        other_port['device'] = 'tapother_dev'
+        self.v4filter_inst.reset_mock()
+        self.firewall.prepare_port_filter(other_port)
+        self.assertFalse(self.v4filter_inst.ensure_remove_chain.called)
+        added_chains = [args[0] for args, kwargs in
+                        self.v4filter_inst.add_chain.call_args_list]
+        self.assertEqual(added_chains, ['iother_dev', 'oother_dev'])
+        self.assertEqual(self.firewall.ports,
+                         {'tapfake_dev': port, 'tapother_dev': other_port})
+
+    def test_remove_port_filter_leaves_other_ports(self):
+        port = self._fake_port()
+        other_port = self._fake_port()
+        other_port['device'] = 'tapother_dev'
+        self.firewall.prepare_port_filter(port)
+        self.firewall.prepare_port_filter(other_port)
+        self.v4filter_inst.reset_mock()
+        self.firewall.remove_port_filter(other_port)
+        self.v4filter_inst.ensure_remove_chain.assert_has_calls(
+            [call('iother_dev'), call('oother_dev')])
+        self.assertFalse(self.v4filter_inst.add_chain.called)
+        self.assertEqual(self.firewall.ports, {'tapfake_dev': port})
+
+    def _ipset_firewall(self):
+        cfg.CONF.set_override('enable_ipset', True, group='SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        with mock.patch('quantum.agent.linux.ipset_manager.'
+                        'IpsetManager.__init__', return_value=None):
+            firewall = IptablesFirewallDriver()
+        firewall.iptables = self.iptables_inst
+        firewall.ipset = mock.Mock()
+        firewall.ipset.get_name.side_effect = IpsetManager.get_name
+        return firewall
+
+    def test_source_group_rule_with_ipset(self):
+        firewall = self._ipset_firewall()
+        rules = [{'ethertype': 'IPv4', 'direction': 'ingress',
+                  'source_group_id': 'sg2'},
+                 {'ethertype': 'IPv6', 'direction': 'egress',
+                  'source_group_id': 'sg2'}]
+        self.assertEqual(firewall._convert_sgr_to_iptables_rules(rules)[2:4],
+                         ['-j RETURN -m set --match-set IPv4sg2 src',
+                          '-j RETURN -m set --match-set IPv6sg2 dst'])
+
+    def test_source_group_rule_without_ipset(self):
+        rule = {'ethertype': 'IPv4', 'direction': 'ingress',
+                'source_group_id': 'sg2',
+                'source_ip_prefix': '10.0.0.2/32'}
+        self.assertEqual(
+            self.firewall._convert_sgr_to_iptables_rules([rule])[2],
+            '-j RETURN -s 10.0.0.2/32')
+
+    def test_update_security_group_members(self):
+        firewall = self._ipset_firewall()
+        firewall.update_security_group_members(
+            'sg2', {'IPv4': ['10.0.0.2'], 'IPv6': []})
+        firewall.ipset.set_members.assert_has_calls(
+            [call('IPv4sg2', 'IPv4', ['10.0.0.2']),
+             call('IPv6sg2', 'IPv6', [])])
+
+    def test_remove_port_filter_destroys_unused_ipsets(self):
+        firewall = self._ipset_firewall()
+        self.iptables_inst.iptables_apply_deferred = False
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'ingress',
+                                         'source_group_id': 'sg2'}]
+        firewall.ipset.sets = {'IPv4sg2': set(), 'IPv6sg2': set()}
+        firewall.prepare_port_filter(port)
+        firewall.remove_port_filter(port)
+        firewall.ipset.destroy.assert_has_calls(
+            [call('IPv4sg2'), call('IPv6sg2')], any_order=True)
+
     def test_remove_unknown_port(self):
         port = self._fake_port()
         self.firewall.remove_port_filter(port)
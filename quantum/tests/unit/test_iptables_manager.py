@@ -284,6 +284,26 @@ class IptablesManagerStateFulTestCase(unittest.TestCase):
         self.iptables.ipv4['filter'].remove_rule('nonexistent', '-j DROP')
         self.mox.VerifyAll()
 
+    def test_remove_rule_with_wrapped_target(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('test-chain')
+        table.add_rule('FORWARD', '-j $test-chain')
+        table.remove_rule('FORWARD', '-j $test-chain')
+        self.assertFalse([rule for rule in table.rules
+                          if 'test-chain' in rule.rule])
+
+    def test_top_rules_come_first(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('test-chain')
+        table.add_rule('test-chain', '-j ACCEPT')
+        table.add_rule('test-chain', '-s 10.0.0.1 -j DROP', top=True)
+        bn = iptables_manager.binary_name
+        rules = [line for line in
+                 self.iptables._modify_rules([], table)
+                 if line.startswith('-A %s-test-chain' % bn)]
+        self.assertEqual(rules, ['-A %s-test-chain -s 10.0.0.1 -j DROP' % bn,
+                                 '-A %s-test-chain -j ACCEPT' % bn])
+
 
 class IptablesManagerStateLessTestCase(unittest.TestCase):
 
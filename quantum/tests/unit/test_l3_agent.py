@@ -26,6 +26,7 @@ from quantum.agent.linux import interface
 from quantum.common import config as base_config
 from quantum.common import constants as l3_constants
 from quantum.openstack.common import cfg
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common import uuidutils
 
 
@@ -257,6 +258,46 @@ class TestBasicRouterOperations(unittest2.TestCase):
         del router['gw_port']
         agent.process_router(ri)
 
+    def testProcessRouterAppliesIptablesOnce(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        ex_gw_port = {'id': _uuid(),
+                      'network_id': _uuid(),
+                      'fixed_ips': [{'ip_address': '19.4.4.4',
+                                     'subnet_id': _uuid()}],
+                      'subnet': {'cidr': '19.4.4.0/24',
+                                 'gateway_ip': '19.4.4.1'}}
+        floating_ips = [{'id': _uuid(),
+                         'floating_ip_address': '8.8.8.%d' % i,
+                         'fixed_ip_address': '7.7.7.%d' % i,
+                         'port_id': _uuid()} for i in range(3)]
+        router = {'id': router_id,
+                  l3_constants.FLOATINGIP_KEY: floating_ips,
+                  'gw_port': ex_gw_port}
+        ri = l3_agent.RouterInfo(router_id, self.conf.root_helper,
+                                 self.conf.use_namespaces, router=router)
+        with mock.patch.object(ri.iptables_manager, '_apply') as apply:
+            agent.process_router(ri)
+            self.assertEqual(apply.call_count, 1)
+            self.assertEqual(len(ri.floating_ips), 3)
+
+            del router[l3_constants.FLOATINGIP_KEY]
+            agent.process_router(ri)
+            self.assertEqual(apply.call_count, 2)
+            self.assertFalse(ri.floating_ips)
+
+    def testProcessRouterAppliesIptablesOnError(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        ri = l3_agent.RouterInfo(router_id, self.conf.root_helper,
+                                 self.conf.use_namespaces, router={})
+        with mock.patch.object(ri.iptables_manager, '_apply') as apply:
+            with mock.patch.object(agent, '_process_router',
+                                   side_effect=RuntimeError()):
+                self.assertRaises(RuntimeError, agent.process_router, ri)
+        apply.assert_called_once_with()
+        self.assertFalse(ri.iptables_manager.iptables_apply_deferred)
+
     def testRoutersWithAdminStateDown(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = None
@@ -278,12 +319,139 @@ class TestBasicRouterOperations(unittest2.TestCase):
         agent._process_routers(routers)
 
         agent.router_deleted(None, routers[0]['id'])
+        priority, seq, update = agent._queue.get()
+        agent._process_router_update(update)
         # verify that remove is called
         self.assertEqual(self.mock_ip.get_devices.call_count, 1)
 
         self.device_exists.assert_has_calls(
             [mock.call(self.conf.external_network_bridge)])
 
+    def testRoutersUpdatedBeforeResync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_changed_routers.return_value = {
+            'changed_router_ids': ['r1'], 'deleted_router_ids': []}
+        self.plugin_api.get_routers.return_value = [{'id': 'r1'}]
+        agent._sync_routers_task(None)
+        agent.routers_updated(None, [{'id': 'r2'}])
+        updates = [agent._queue.get()[2] for i in range(2)]
+        self.assertEqual([u.router_id for u in updates], ['r2', 'r1'])
+        self.assertEqual([u.priority for u in updates],
+                         [l3_agent.PRIORITY_RPC, l3_agent.PRIORITY_SYNC])
+        self.assertFalse(agent.fullsync)
+
+    def testResyncFetchesChangedRouters(self):
+        self.conf.set_override('sync_routers_page_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info = {'r1': None, 'r2': None}
+        agent._router_revisions = {'r1': 3}
+        self.plugin_api.get_changed_routers.return_value = {
+            'changed_router_ids': ['r3', 'r4', 'r5'],
+            'deleted_router_ids': ['r2']}
+        self.plugin_api.get_routers.side_effect = [
+            [{'id': 'r3', 'revision': 0}, {'id': 'r4', 'revision': 1}],
+            # r5 was deleted in the meantime
+            []]
+        agent._sync_routers_task(None)
+        self.plugin_api.get_changed_routers.assert_called_once_with(
+            None, {'r1': 3, 'r2': None}, router_ids=None)
+        self.plugin_api.get_routers.assert_has_calls([
+            mock.call(None, router_ids=['r3', 'r4']),
+            mock.call(None, router_ids=['r5'])])
+        updates = [agent._queue.get()[2] for i in range(4)]
+        self.assertEqual([(u.router_id, u.router) for u in updates],
+                         [('r2', None),
+                          ('r3', {'id': 'r3', 'revision': 0}),
+                          ('r4', {'id': 'r4', 'revision': 1}),
+                          ('r5', None)])
+        self.assertFalse(agent.fullsync)
+
+    def testResyncChecksExternalNetworkOnce(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [{'id': r_id, 'admin_state_up': False}
+                   for r_id in ('r1', 'r2', 'r3')]
+        self.plugin_api.get_changed_routers.return_value = {
+            'changed_router_ids': ['r1', 'r2', 'r3'],
+            'deleted_router_ids': []}
+        self.plugin_api.get_routers.return_value = routers
+        self.plugin_api.get_external_network_id.return_value = 'ext'
+        agent._sync_routers_task(None)
+        for i in range(3):
+            agent._process_router_update(agent._queue.get()[2])
+        self.assertEqual(
+            1, self.plugin_api.get_external_network_id.call_count)
+        self.device_exists.assert_called_once_with(
+            self.conf.external_network_bridge)
+        self.assertEqual(3, len(agent._router_revisions))
+
+    def testResyncFallsBackToFullSync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info = {'r1': None, 'r2': None}
+        self.plugin_api.get_changed_routers.side_effect = (
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+        self.plugin_api.get_routers.return_value = [{'id': 'r1'}]
+        agent._sync_routers_task(None)
+        self.plugin_api.get_routers.assert_called_once_with(
+            None, router_ids=None)
+        updates = [agent._queue.get()[2] for i in range(2)]
+        self.assertEqual([(u.router_id, u.router) for u in updates],
+                         [('r2', None), ('r1', {'id': 'r1'})])
+        self.assertFalse(agent.fullsync)
+
+    def testRouterRevisionRecorded(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        update = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 0,
+                                       {'id': 'r1', 'revision': 2})
+        with mock.patch.object(agent, '_process_routers'):
+            agent._apply_router_update(update)
+        self.assertEqual(agent._router_revisions, {'r1': 2})
+        deletion = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 1)
+        agent._apply_router_update(deletion)
+        self.assertEqual(agent._router_revisions, {})
+
+    def testRouterUpdatesNotProcessedConcurrently(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        update1 = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 1, {})
+        update2 = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 2, {})
+        update3 = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 3, {})
+        applied = []
+
+        def apply_update(update):
+            if update is update1:
+                # updates received while the router is being processed
+                agent._process_router_update(update3)
+                agent._process_router_update(update2)
+            applied.append(update)
+
+        with mock.patch.object(agent, '_apply_router_update',
+                               side_effect=apply_update):
+            agent._process_router_update(update1)
+        # only the most recent pending update is processed
+        self.assertEqual(applied, [update1, update3])
+        self.assertFalse(agent._routers_in_progress)
+        self.assertFalse(agent._pending_updates)
+
+    def testResyncSkippedAfterRouterUpdate(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        sync_update = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC, 0,
+                                            {'id': 'r1'})
+        agent.routers_updated(None, [{'id': 'r1'}])
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._apply_router_update(sync_update)
+        self.assertFalse(process.called)
+
+    def testRouterUpdateFailureTriggersResync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        update = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC, 0,
+                                       {'id': 'r1'})
+        agent._router_revisions['r1'] = 1
+        with mock.patch.object(agent, '_process_routers',
+                               side_effect=RuntimeError()):
+            agent._apply_router_update(update)
+        self.assertTrue(agent.fullsync)
+        self.assertNotIn('r1', agent._router_revisions)
+
     def testDestroyNamespace(self):
 
         class FakeDev(object):
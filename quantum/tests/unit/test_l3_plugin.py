@@ -1489,6 +1489,70 @@ class L3NatDBTestCase(test_db_plugin.QuantumDbPluginV2TestCase):
             self.assertTrue(floatingips[0]['fixed_ip_address'] is not None)
             self.assertTrue(floatingips[0]['router_id'] is not None)
 
+    def test_l3_agent_routers_query_changes(self):
+        with contextlib.nested(self.router(),
+                               self.router()) as (r1, r2):
+            plugin = TestL3NatPlugin()
+            ctx = context.get_admin_context()
+            router_ids = sorted([r1['router']['id'], r2['router']['id']])
+            changes = plugin.get_changed_router_ids(ctx, {})
+            self.assertEqual(router_ids, changes['changed_router_ids'])
+            self.assertEqual([], changes['deleted_router_ids'])
+            known = dict((r['id'], r['revision'])
+                         for r in plugin.get_sync_data(ctx, router_ids))
+            known['deleted_router'] = 0
+            changes = plugin.get_changed_router_ids(ctx, known)
+            self.assertEqual([], changes['changed_router_ids'])
+            self.assertEqual(['deleted_router'],
+                             changes['deleted_router_ids'])
+
+            self._update('routers', r1['router']['id'],
+                         {'router': {'name': 'renamed'}})
+            changes = plugin.get_changed_router_ids(ctx, known)
+            self.assertEqual([r1['router']['id']],
+                             changes['changed_router_ids'])
+            changes = plugin.get_changed_router_ids(
+                ctx, known, router_ids=[r2['router']['id']])
+            self.assertEqual([], changes['changed_router_ids'])
+
+    def _router_revision(self, router_id):
+        plugin = TestL3NatPlugin()
+        ctx = context.get_admin_context()
+        return plugin.get_sync_data(ctx, [router_id])[0]['revision']
+
+    def test_router_port_update_bumps_revision(self):
+        with self.router() as r:
+            with self.subnet() as s:
+                router_id = r['router']['id']
+                body = self._router_interface_action('add', router_id,
+                                                     s['subnet']['id'],
+                                                     None)
+                revision = self._router_revision(router_id)
+                self._update('ports', body['port_id'],
+                             {'port': {'admin_state_up': False}})
+                self.assertEqual(revision + 1,
+                                 self._router_revision(router_id))
+                self._router_interface_action('remove', router_id,
+                                              s['subnet']['id'], None)
+
+    def test_router_subnet_update_bumps_revision(self):
+        with self.router() as r:
+            with self.subnet() as s:
+                router_id = r['router']['id']
+                self._router_interface_action('add', router_id,
+                                              s['subnet']['id'], None)
+                revision = self._router_revision(router_id)
+                self._update('subnets', s['subnet']['id'],
+                             {'subnet': {'name': 'renamed'}})
+                self.assertEqual(revision,
+                                 self._router_revision(router_id))
+                self._update('subnets', s['subnet']['id'],
+                             {'subnet': {'gateway_ip': '10.0.0.254'}})
+                self.assertEqual(revision + 1,
+                                 self._router_revision(router_id))
+                self._router_interface_action('remove', router_id,
+                                              s['subnet']['id'], None)
+
 
 class L3NatDBTestCaseXML(L3NatDBTestCase):
     fmt = 'xml'
@@ -154,6 +154,29 @@ class TestDhcpBase(unittest.TestCase):
                     chmod.assert_called_once_with('/baz', 0644)
                     rename.assert_called_once_with('/baz', '/foo')
 
+    def _test_replace_file_if_changed(self, old_data, data):
+        with mock.patch('__builtin__.open') as mock_open:
+            mock_open.return_value = mock.MagicMock()
+            read = mock_open.return_value.__enter__.return_value.read
+            read.return_value = old_data
+            with mock.patch.object(dhcp, 'replace_file') as replace:
+                changed = dhcp.replace_file_if_changed('/foo', data)
+        mock_open.assert_called_once_with('/foo', 'r')
+        self.assertEqual(changed, replace.called)
+        return changed
+
+    def test_replace_file_if_changed(self):
+        self.assertTrue(self._test_replace_file_if_changed('bar', 'baz'))
+
+    def test_replace_file_if_changed_unchanged(self):
+        self.assertFalse(self._test_replace_file_if_changed('bar', 'bar'))
+
+    def test_replace_file_if_changed_missing_file(self):
+        with mock.patch('__builtin__.open', side_effect=IOError()):
+            with mock.patch.object(dhcp, 'replace_file') as replace:
+                self.assertTrue(dhcp.replace_file_if_changed('/foo', 'bar'))
+        replace.assert_called_once_with('/foo', 'bar')
+
     def test_restart(self):
         class SubClass(dhcp.DhcpBase):
             def __init__(self):
@@ -279,6 +302,20 @@ class TestDhcpLocalProcess(TestBase):
 
             self.assertEqual(lp.called, ['restart'])
 
+    def test_enable_already_active_up_to_date(self):
+        delegate = mock.Mock()
+        delegate.setup.return_value = 'tap0'
+        attrs_to_mock = dict([(a, mock.DEFAULT) for a in
+                              ['active', '_process_up_to_date']])
+        with mock.patch.multiple(LocalChild, **attrs_to_mock) as mocks:
+            mocks['active'].__get__ = mock.Mock(return_value=True)
+            mocks['_process_up_to_date'].return_value = True
+            lp = LocalChild(self.conf, FakeV4Network(),
+                            device_delegate=delegate)
+            lp.enable()
+
+            self.assertEqual(lp.called, ['reload'])
+
     def test_enable(self):
         delegate = mock.Mock(return_value='tap0')
         attrs_to_mock = dict(
@@ -482,6 +519,41 @@ class TestDnsmasq(TestBase):
                           '--server=8.8.8.8',
                           '--domain=openstacklocal'])
 
+    def _test_process_up_to_date(self, spawned_network, expected,
+                                 executable='dnsmasq'):
+        attrs_to_mock = dict([(a, mock.DEFAULT) for a in
+                              ['pid', 'interface_name']])
+        with mock.patch.multiple(dhcp.Dnsmasq, **attrs_to_mock) as mocks:
+            mocks['pid'].__get__ = mock.Mock(return_value=5)
+            mocks['interface_name'].__get__ = mock.Mock(return_value='tap0')
+            with mock.patch('os.path.isdir', return_value=True):
+                spawned = dhcp.Dnsmasq(self.conf, spawned_network,
+                                       namespace='qdhcp-ns')
+                cmdline = spawned._build_cmdline()
+                cmdline[0] = executable
+                self.execute.return_value = '\0'.join(cmdline) + '\0'
+                dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                                  namespace='qdhcp-ns')
+                self.assertEqual(dm._process_up_to_date(), expected)
+        self.execute.assert_called_once_with(['cat', '/proc/5/cmdline'],
+                                             'sudo')
+
+    def test_process_up_to_date(self):
+        self._test_process_up_to_date(FakeDualNetwork(), True)
+
+    def test_process_up_to_date_full_path(self):
+        # rootwrap resolved the path of the executable
+        self._test_process_up_to_date(FakeDualNetwork(), True,
+                                      executable='/usr/sbin/dnsmasq')
+
+    def test_process_not_up_to_date_other_executable(self):
+        self._test_process_up_to_date(FakeDualNetwork(), False,
+                                      executable='/usr/sbin/dnsmasq-other')
+
+    def test_process_not_up_to_date(self):
+        # the second subnet was added while the agent was down
+        self._test_process_up_to_date(FakeDualNetworkSingleDHCP(), False)
+
     def test_output_opts_file(self):
         fake_v6 = 'gdca:3ba5:a17a:4ba3::1'
         fake_v6_cidr = 'gdca:3ba5:a17a:4ba3::/64'
@@ -570,6 +642,20 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
         self.execute.assert_called_once_with(exp_args, root_helper='sudo',
                                              check_exit_code=True)
 
+    def test_reload_allocations_unchanged(self):
+        with mock.patch('os.path.isdir') as isdir:
+            isdir.return_value = True
+            dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                              namespace='qdhcp-ns')
+            with mock.patch.object(dhcp, 'replace_file_if_changed',
+                                   return_value=False) as replace:
+                with mock.patch.object(dhcp.Dnsmasq,
+                                       '_make_subnet_interface_ip_map',
+                                       return_value={}):
+                    dm.reload_allocations()
+        self.assertEqual(replace.call_count, 2)
+        self.assertFalse(self.execute.called)
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('quantum.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
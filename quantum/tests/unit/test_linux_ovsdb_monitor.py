@@ -0,0 +1,137 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.agent.linux import ovsdb_monitor
+from quantum.openstack.common import jsonutils
+
+
+def _update(*rows):
+    return jsonutils.dumps(
+        {'headings': ['row', 'action', 'name', 'ofport', 'external_ids'],
+         'data': [['uuid-%d' % i] + list(row) for i, row in enumerate(rows)]})
+
+
+class TestOvsdbMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = ovsdb_monitor.InterfaceMonitor(root_helper='sudo')
+
+    def test_cmd(self):
+        self.assertEqual(self.monitor._cmd(),
+                         ['sudo', 'ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport,external_ids', '--format=json'])
+
+    def test_parse_update(self):
+        events = self.monitor.parse_update(
+            _update(['insert', 'tap0', 1, ['map', []]]))
+        self.assertEqual(events, [{'action': 'insert', 'name': 'tap0',
+                                   'ofport': 1,
+                                   'external_ids': ['map', []]}])
+
+    def test_parse_update_ignores_garbage(self):
+        self.assertEqual(self.monitor.parse_update(''), [])
+        self.assertEqual(self.monitor.parse_update('not json'), [])
+
+    def test_start_spawns_process_once(self):
+        with mock.patch.object(ovsdb_monitor.utils,
+                               'subprocess_popen') as popen:
+            with mock.patch.object(ovsdb_monitor.eventlet, 'spawn'):
+                popen.return_value.poll.return_value = None
+                self.monitor.start()
+                self.monitor.start()
+                self.assertEqual(popen.call_count, 1)
+                self.assertTrue(self.monitor.is_active())
+
+    def test_read_events(self):
+        process = mock.Mock()
+        process.stdout.readline.side_effect = [
+            _update(['initial', 'br-int', 65534, ['map', []]]),
+            _update(['insert', 'tap0', [], ['map', []]]),
+            '']
+        self.monitor._read_events(process)
+        self.assertEqual([e['name'] for e in self.monitor.get_events()],
+                         ['br-int', 'tap0'])
+
+    def test_start_reads_stderr(self):
+        with mock.patch.object(ovsdb_monitor.utils,
+                               'subprocess_popen') as popen:
+            with mock.patch.object(ovsdb_monitor.eventlet, 'spawn') as spawn:
+                self.monitor.start()
+                spawn.assert_any_call(self.monitor._read_errors,
+                                      popen.return_value)
+                with mock.patch.object(self.monitor, '_kill') as kill:
+                    self.monitor.stop()
+                kill.assert_called_once_with(popen.return_value)
+                self.assertEqual(spawn.return_value.kill.call_count, 2)
+
+    def _test_stop(self, execute_side_effect=None):
+        with mock.patch.object(ovsdb_monitor.utils,
+                               'subprocess_popen') as popen:
+            with mock.patch.object(ovsdb_monitor.eventlet, 'spawn'):
+                popen.return_value.pid = 10
+                self.monitor.start()
+        with mock.patch.object(ovsdb_monitor.agent_utils,
+                               'execute') as execute:
+            # sudo (10) runs ovsdb-client (11)
+            execute.side_effect = ['11\n', '', execute_side_effect]
+            self.monitor.stop()
+        execute.assert_has_calls(
+            [mock.call(['ps', '--ppid', '10', '-o', 'pid='],
+                       check_exit_code=False),
+             mock.call(['ps', '--ppid', '11', '-o', 'pid='],
+                       check_exit_code=False),
+             mock.call(['kill', '-9', '11'], root_helper='sudo')])
+        popen.return_value.wait.assert_called_once_with()
+        self.assertFalse(popen.return_value.kill.called)
+        self.assertFalse(self.monitor.is_active())
+
+    def test_stop_kills_monitor_through_root_helper(self):
+        self._test_stop()
+
+    def test_stop_monitor_already_exited(self):
+        with mock.patch('os.path.exists', return_value=False):
+            self._test_stop(RuntimeError('No such process'))
+
+    def test_stop_kill_failure(self):
+        with mock.patch('os.path.exists', return_value=True):
+            self.assertRaises(RuntimeError, self._test_stop,
+                              RuntimeError('Unauthorized command'))
+
+    def test_read_errors(self):
+        process = mock.Mock()
+        process.stderr.readline.side_effect = ['connection refused\n', '']
+        with mock.patch.object(ovsdb_monitor, 'LOG') as log:
+            self.monitor._read_errors(process)
+        self.assertEqual(log.warn.call_count, 1)
+        self.assertEqual(log.warn.call_args[0][1]['line'],
+                         'connection refused')
+
+    def test_wait_for_changes_ignores_initial_rows(self):
+        self.monitor._events.put(
+            self.monitor.parse_update(
+                _update(['initial', 'br-int', 65534, ['map', []]])))
+        self.assertFalse(self.monitor.wait_for_changes(0))
+
+    def test_wait_for_changes(self):
+        self.monitor._events.put(
+            self.monitor.parse_update(
+                _update(['old', 'tap0', [], None],
+                        ['new', 'tap0', 5, ['map', []]])))
+        self.assertTrue(self.monitor.wait_for_changes(0))
@@ -129,6 +129,17 @@ class PolicyTestCase(unittest.TestCase):
         result = policy.enforce(self.context, action, self.target)
         self.assertEqual(result, True)
 
+    def test_policy_file_checked_once_per_interval(self):
+        action = "example:allowed"
+        with mock.patch.object(quantum.common.utils,
+                               'read_cached_file') as read_cached_file:
+            policy.enforce(self.context, action, self.target)
+            self.assertFalse(read_cached_file.called)
+            policy._POLICY_CHECKED_AT -= policy.POLICY_CHECK_INTERVAL
+            policy.enforce(self.context, action, self.target)
+            policy.enforce(self.context, action, self.target)
+        self.assertEqual(read_cached_file.call_count, 1)
+
     def test_enforce_http_true(self):
 
         def fakeurlopen(url, post_data):
@@ -326,3 +337,26 @@ class QuantumPolicyTestCase(unittest.TestCase):
             target = {'network_id': 'whatever'}
             result = policy.enforce(self.context, action, target, self.plugin)
             self.assertTrue(result)
+
+    def test_match_rule_reused(self):
+        target = {'shared': True, 'tenant_id': 'somebody_else'}
+        match_rule = policy._build_match_rule('create_network', target)
+        self.assertIs(policy._build_match_rule('create_network', target),
+                      match_rule)
+        self.assertIsNot(policy._build_match_rule('create_network', {}),
+                         match_rule)
+        policy._set_rules('{}')
+        self.assertIsNot(policy._build_match_rule('create_network', target),
+                         match_rule)
+
+    def test_parentresource_looked_up_once(self):
+        action = "create_port:mac"
+        with mock.patch.object(self.plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}) as get:
+            for i in range(2):
+                target = {'network_id': 'whatever'}
+                result = policy.enforce(self.context, action, target,
+                                        self.plugin)
+                self.assertTrue(result)
+        get.assert_called_once_with(self.context, 'whatever',
+                                    fields=['tenant_id'])
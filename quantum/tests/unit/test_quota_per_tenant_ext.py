@@ -9,6 +9,7 @@ from quantum.common import config
 from quantum.common import exceptions
 from quantum import context
 from quantum.db import api as db
+from quantum.db import quota_db
 from quantum import manager
 from quantum.openstack.common import cfg
 from quantum.plugins.linuxbridge.db import l2network_db_v2
@@ -197,3 +198,91 @@ class QuotaExtensionTestCase(testlib_api.WebTestCase):
 
 class QuotaExtensionTestCaseXML(QuotaExtensionTestCase):
     fmt = 'xml'
+
+
+class DbQuotaUsageDriverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(DbQuotaUsageDriverTestCase, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        self.driver = quota_db.DbQuotaUsageDriver()
+        self.context = context.get_admin_context()
+        self.resources = {'network': quota.CountableResource(
+            'network', None, 'quota_network')}
+        self.count = mock.Mock(return_value=0)
+
+    def _reserve(self, delta):
+        return self.driver.make_reservation(self.context, 'tenant_id1',
+                                            self.resources, 'network',
+                                            delta, self.count)
+
+    def _usage(self):
+        usage = self.driver._get_usage(self.context, 'tenant_id1', 'network')
+        return usage.in_use, usage.reserved
+
+    def test_reservation_counts_once(self):
+        self.count.return_value = 1
+        self.driver.commit_reservation(self.context, self._reserve(1))
+        self.assertRaises(exceptions.OverQuota, self._reserve, 1)
+        self.assertEqual(self.count.call_count, 1)
+        self.assertEqual(self._usage(), (2, 0))
+
+    def test_reservations_count_towards_quota(self):
+        self._reserve(2)
+        self.assertRaises(exceptions.OverQuota, self._reserve, 1)
+        self.assertEqual(self._usage(), (0, 2))
+
+    def test_cancel_reservation(self):
+        self.driver.cancel_reservation(self.context, self._reserve(2))
+        self.assertEqual(self._usage(), (0, 0))
+        self._reserve(2)
+
+    def test_delete_reservation(self):
+        self.driver.commit_reservation(self.context, self._reserve(2))
+        self.driver.commit_reservation(self.context, self._reserve(-1))
+        self.assertEqual(self._usage(), (1, 0))
+
+    def test_delete_reservation_without_usage(self):
+        self.assertIsNone(self._reserve(-1))
+        self.assertFalse(self.count.called)
+
+    def test_concurrent_creation_of_usage(self):
+        # another reservation created the usage in the meantime
+        other_ctx = context.get_admin_context()
+        with other_ctx.session.begin():
+            other_ctx.session.add(quota_db.QuotaUsage(
+                tenant_id='tenant_id1', resource='network', in_use=1,
+                reserved=0, dirty=False))
+        get_usage = self.driver._get_usage
+        calls = []
+
+        def _get_usage(*args):
+            # the first select ran before the usage was created
+            calls.append(args)
+            if len(calls) > 1:
+                return get_usage(*args)
+
+        with mock.patch.object(self.driver, '_get_usage',
+                               side_effect=_get_usage):
+            self.driver.commit_reservation(self.context, self._reserve(1))
+        self.assertEqual(self._usage(), (2, 0))
+
+    def test_resync_usages(self):
+        self.driver.commit_reservation(self.context, self._reserve(1))
+        self.driver.resync_usages(self.context)
+        self.assertIsNone(self._reserve(-1))
+        # The network was deleted without going through the API
+        self._reserve(2)
+        self.assertEqual(self.count.call_count, 2)
+        self.assertEqual(self._usage(), (0, 2))
+
+    def test_resync_usages_expires_reservations(self):
+        cfg.CONF.set_override('reservation_expire', -1, group='QUOTAS')
+        reservation = self._reserve(2)
+        self.driver.resync_usages(self.context)
+        self.driver.commit_reservation(self.context, reservation)
+        self._reserve(2)
+        self.assertEqual(self._usage(), (0, 2))
@@ -0,0 +1,102 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+
+import mock
+import unittest2 as unittest
+
+from quantum.rootwrap import daemon
+from quantum.rootwrap import filters
+
+
+class RootwrapDaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.socket_path = os.path.join(self.tempdir, 'rootwrap.sock')
+        self.server = daemon.RootwrapServer(self.socket_path, [])
+        self.addCleanup(self.server.server_close)
+        self.server.filters = [
+            filters.CommandFilter("/bin/cat", "root"),
+            filters.RegExpFilter("/bin/ls", "root", 'ls', '/[a-z]+')]
+
+    def _serve(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+
+    def test_socket_is_private(self):
+        mode = os.stat(self.socket_path).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0600)
+
+    def test_socket_replaced_by_symlink(self):
+        target = os.path.join(self.tempdir, 'target')
+        with open(target, 'w') as f:
+            f.write('foo')
+        os.chmod(target, 0644)
+
+        class SwappedServer(daemon.RootwrapServer):
+            def server_bind(self):
+                daemon.RootwrapServer.server_bind(self)
+                # the socket is swapped for a symlink to another file
+                os.unlink(self.server_address)
+                os.symlink(target, self.server_address)
+
+        socket_path = os.path.join(self.tempdir, 'swapped.sock')
+        with contextlib.nested(
+            mock.patch.object(os, 'chown'),
+            mock.patch.object(os, 'lchown')) as (chown, lchown):
+            self.assertRaises(OSError, SwappedServer, socket_path, [])
+        self.assertFalse(chown.called)
+        self.assertFalse(lchown.called)
+        self.assertFalse(os.path.lexists(socket_path))
+        self.assertEqual(stat.S_IMODE(os.stat(target).st_mode), 0644)
+        self.assertEqual(sorted(os.listdir(self.tempdir)),
+                         ['rootwrap.sock', 'target'])
+
+    def test_execute(self):
+        self.assertEqual(self.server.execute(['cat'], 'foo'),
+                         {'returncode': 0, 'stdout': 'foo', 'stderr': ''})
+
+    def test_execute_unauthorized(self):
+        reply = self.server.execute(['ls', 'root'])
+        self.assertEqual(reply['returncode'], daemon.RC_UNAUTHORIZED)
+
+    def test_client_execute(self):
+        self._serve()
+        self.assertEqual(daemon.execute(self.socket_path, ['cat'], 'foo'),
+                         (0, 'foo', ''))
+
+    def test_client_execute_unauthorized(self):
+        self._serve()
+        returncode, stdout, stderr = daemon.execute(self.socket_path,
+                                                    ['ls', 'root'])
+        self.assertEqual(returncode, daemon.RC_UNAUTHORIZED)
+
+    def test_client_execute_without_daemon(self):
+        self.assertRaises(socket.error, daemon.execute,
+                          os.path.join(self.tempdir, 'missing.sock'), ['ls'])
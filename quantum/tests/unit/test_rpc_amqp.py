@@ -0,0 +1,178 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import unittest2 as unittest
+
+from quantum.openstack.common import cfg
+from quantum.openstack.common import context
+from quantum.openstack.common.rpc import amqp as rpc_amqp
+from quantum.openstack.common.rpc import common as rpc_common
+from quantum.openstack.common.rpc import impl_kombu
+
+
+class TestMsgReply(unittest.TestCase):
+
+    def _test_msg_reply(self, reply_q, expected_queue, expected_msg):
+        with mock.patch.object(rpc_amqp, 'ConnectionContext') as ctxt_cls:
+            conn = ctxt_cls.return_value.__enter__.return_value
+            rpc_amqp.msg_reply(cfg.CONF, 'msg-id', reply_q, mock.Mock(),
+                               reply='result')
+        conn.direct_send.assert_called_once_with(
+            expected_queue, rpc_common.serialize_msg(expected_msg))
+
+    def test_msg_reply_to_msg_id_queue(self):
+        self._test_msg_reply(None, 'msg-id',
+                             {'result': 'result', 'failure': None})
+
+    def test_msg_reply_to_reply_queue(self):
+        self._test_msg_reply('reply_q', 'reply_q',
+                             {'result': 'result', 'failure': None,
+                              '_msg_id': 'msg-id'})
+
+    def test_unpack_context_reply_queue(self):
+        ctxt = rpc_amqp.unpack_context(cfg.CONF, {'_msg_id': 'msg-id',
+                                                  '_reply_q': 'reply_q'})
+        self.assertEqual(ctxt.msg_id, 'msg-id')
+        self.assertEqual(ctxt.reply_q, 'reply_q')
+        self.assertEqual(ctxt.deepcopy().reply_q, 'reply_q')
+
+
+class TestSingleReplyQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(cfg.CONF.reset)
+        self.connection_pool = mock.Mock()
+        self.connection_pool.reply_proxy = None
+        self.reply_proxy = mock.Mock()
+        self.reply_proxy.get_reply_q.return_value = 'reply_q'
+        self.waiters = {}
+        self.reply_proxy.add_call_waiter.side_effect = (
+            lambda waiter, msg_id: self.waiters.__setitem__(msg_id, waiter))
+        self.reply_proxy.del_call_waiter.side_effect = self.waiters.pop
+
+    def _waiter(self, timeout=None):
+        self.connection_pool.reply_proxy = self.reply_proxy
+        return rpc_amqp.MulticallProxyWaiter(cfg.CONF, 'msg-id', timeout,
+                                             self.connection_pool)
+
+    def test_waiter_returns_results_until_ending(self):
+        waiter = self._waiter()
+        waiter.put({'result': 'one', 'failure': None})
+        waiter.put({'result': 'two', 'failure': None})
+        waiter.put({'result': None, 'failure': None, 'ending': True})
+        self.assertEqual(list(waiter), ['one', 'two'])
+        self.assertEqual(self.waiters, {})
+
+    def test_waiter_timeout(self):
+        waiter = self._waiter(timeout=0.01)
+        self.assertRaises(rpc_common.Timeout, list, waiter)
+        self.assertEqual(self.waiters, {})
+
+    def test_multicall_uses_single_reply_queue(self):
+        cfg.CONF.set_override('amqp_rpc_single_reply_queue', True)
+        with mock.patch.object(rpc_amqp, 'ReplyProxy',
+                               return_value=self.reply_proxy) as proxy_cls:
+            with mock.patch.object(rpc_amqp,
+                                   'ConnectionContext') as ctxt_cls:
+                conn = ctxt_cls.return_value.__enter__.return_value
+                for i in range(2):
+                    msg = {'method': 'echo'}
+                    rpc_amqp.multicall(cfg.CONF,
+                                       context.RequestContext(),
+                                       'topic', msg, None,
+                                       self.connection_pool)
+                    self.assertEqual(msg['_reply_q'], 'reply_q')
+                    self.assertIn(msg['_msg_id'], self.waiters)
+        proxy_cls.assert_called_once_with(cfg.CONF, self.connection_pool)
+        self.assertEqual(conn.topic_send.call_count, 2)
+        self.assertFalse(conn.declare_direct_consumer.called)
+
+    def test_multicall_send_failure_removes_waiter(self):
+        cfg.CONF.set_override('amqp_rpc_single_reply_queue', True)
+        self.connection_pool.reply_proxy = self.reply_proxy
+        with mock.patch.object(rpc_amqp, 'ConnectionContext') as ctxt_cls:
+            conn = ctxt_cls.return_value.__enter__.return_value
+            conn.topic_send.side_effect = IOError()
+            self.assertRaises(IOError, rpc_amqp.multicall, cfg.CONF,
+                              context.RequestContext(), 'topic', {}, None,
+                              self.connection_pool)
+        self.assertEqual(self.waiters, {})
+
+
+class TestKombuPublisherCache(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.object(impl_kombu.Connection, 'reconnect'):
+            self.conn = impl_kombu.Connection(cfg.CONF)
+        self.conn.connection = mock.Mock()
+        self.conn.channel = mock.Mock()
+        self.conn.ensure = lambda error_callback, method: method()
+        self.publisher_cls = mock.Mock()
+
+    def test_publisher_reused(self):
+        self.conn.publisher_send(self.publisher_cls, 'topic', 'msg1')
+        self.conn.publisher_send(self.publisher_cls, 'topic', 'msg2')
+        self.publisher_cls.assert_called_once_with(cfg.CONF,
+                                                   self.conn.channel, 'topic')
+        publisher = self.publisher_cls.return_value
+        self.assertEqual(publisher.send.call_args_list,
+                         [mock.call('msg1'), mock.call('msg2')])
+
+    def test_publisher_per_topic(self):
+        self.conn.publisher_send(self.publisher_cls, 'topic1', 'msg')
+        self.conn.publisher_send(self.publisher_cls, 'topic2', 'msg')
+        self.assertEqual(self.publisher_cls.call_count, 2)
+
+    def test_failed_publisher_dropped(self):
+        self.publisher_cls.return_value.send.side_effect = IOError()
+        self.assertRaises(IOError, self.conn.publisher_send,
+                          self.publisher_cls, 'topic', 'msg')
+        self.assertEqual(len(self.conn.publishers), 0)
+
+    def test_cache_size_bounded(self):
+        for i in range(impl_kombu.PUBLISHER_CACHE_SIZE + 1):
+            self.conn.publisher_send(self.publisher_cls, 'topic%d' % i,
+                                     'msg')
+        self.assertEqual(len(self.conn.publishers),
+                         impl_kombu.PUBLISHER_CACHE_SIZE)
+        self.conn.publisher_send(self.publisher_cls, 'topic0', 'msg')
+        self.assertEqual(self.publisher_cls.call_count,
+                         impl_kombu.PUBLISHER_CACHE_SIZE + 2)
+        self.assertEqual(len(self.conn.publisher_keys),
+                         impl_kombu.PUBLISHER_CACHE_SIZE)
+
+    def test_cache_drops_least_recently_used(self):
+        for topic in ('topic0', 'topic1', 'topic0'):
+            self.conn.publisher_send(self.publisher_cls, topic, 'msg')
+        self.assertEqual([key[1] for key in self.conn.publisher_keys],
+                         ['topic1', 'topic0'])
+        self.assertEqual(self.publisher_cls.call_count, 2)
+
+    def test_reset_keeps_publishers_without_consumers(self):
+        channel = self.conn.channel
+        self.conn.publisher_send(self.publisher_cls, 'topic', 'msg')
+        self.conn.reset()
+        self.assertEqual(self.conn.channel, channel)
+        self.assertEqual(len(self.conn.publishers), 1)
+
+    def test_reset_drops_publishers_with_consumers(self):
+        self.conn.publisher_send(self.publisher_cls, 'topic', 'msg')
+        self.conn.consumers.append(mock.Mock())
+        self.conn.reset()
+        self.assertEqual(self.conn.consumers, [])
+        self.assertEqual(len(self.conn.publishers), 0)
@@ -51,6 +51,42 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
         super(SGServerRpcCallBackMixinTestCase, self).setUp()
         self.rpc = FakeSGCallback()
 
+    def test_select_ports_for_devices(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1):
+                sg1_id = sg1['security_group']['id']
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                port_id1 = self.deserialize(self.fmt, res1)['port']['id']
+                ctx = context.get_admin_context()
+                ports = self.rpc._select_ports_for_devices(
+                    ctx, {'fake_device': port_id1,
+                          'no_exist_device': 'no_exist_port'})
+                self.assertEqual(ports.keys(), [port_id1])
+                port = ports[port_id1]
+                self.assertEqual(port['device'], 'fake_device')
+                self.assertEqual(port['security_groups'], [sg1_id])
+                self.assertEqual(port['fixed_ips'], ['10.0.0.2'])
+                self.assertEqual(port['security_group_rules'], [])
+                self.assertEqual(port['security_group_source_groups'], [])
+                self._delete('ports', port_id1)
+
+    def test_select_ports_for_devices_with_prefix(self):
+        with self.network() as n:
+            with self.subnet(n):
+                res1 = self._create_port(self.fmt, n['network']['id'])
+                port_id1 = self.deserialize(self.fmt, res1)['port']['id']
+                ctx = context.get_admin_context()
+                ports = self.rpc._select_ports_for_devices(
+                    ctx, {'tap' + port_id1[:11]: port_id1[:11]},
+                    prefix_match=True)
+                self.assertEqual(ports[port_id1]['device'],
+                                 'tap' + port_id1[:11])
+                self._delete('ports', port_id1)
+
     def test_security_group_rules_for_devices_ipv4_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv4']
         with self.network() as n:
@@ -199,6 +235,58 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', source_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEquals(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=[port_id1])
+                port_rpc = info['devices'][port_id1]
+                expected = [{'direction': u'ingress',
+                             'protocol': u'tcp', 'ethertype': u'IPv4',
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'source_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            {'ethertype': 'IPv4', 'direction': 'egress'},
+                            ]
+                self.assertEquals(port_rpc['security_group_rules'],
+                                  expected)
+                self.assertEquals(port_rpc['security_group_source_groups'],
+                                  [sg2_id])
+                self.assertEquals(info['sg_member_ips'],
+                                  {sg2_id: {'IPv4': [u'10.0.0.3'],
+                                            'IPv6': []}})
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv6']
         with self.network() as n:
@@ -405,8 +493,11 @@ class SecurityGroupAgentRpcTestCase(unittest.TestCase):
         firewall_object = firewall_base.FirewallDriver()
         self.firewall.defer_apply.side_effect = firewall_object.defer_apply
         self.agent.firewall = self.firewall
-        rpc = mock.Mock()
-        self.agent.plugin_rpc = rpc
+        self.rpc = mock.Mock()
+        self.agent.plugin_rpc = self.rpc
+        cfg.CONF.set_override('refresh_firewall_delay', 0,
+                              group='SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
         self.fake_device = {'device': 'fake_device',
                             'security_groups': ['fake_sgid1', 'fake_sgid2'],
                             'security_group_source_groups': ['fake_sgid2'],
@@ -416,7 +507,7 @@ class SecurityGroupAgentRpcTestCase(unittest.TestCase):
                                                       'fake_sgid2'}]}
         fake_devices = {'fake_device': self.fake_device}
         self.firewall.ports = fake_devices
-        rpc.security_group_rules_for_devices.return_value = fake_devices
+        self.rpc.security_group_rules_for_devices.return_value = fake_devices
 
     def test_prepare_and_remove_devices_filter(self):
         self.agent.prepare_devices_filter(['fake_device'])
@@ -434,33 +525,71 @@ class SecurityGroupAgentRpcTestCase(unittest.TestCase):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_rule_updated(['fake_sgid1', 'fake_sgid3'])
-        self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['fake_device']))
 
     def test_security_groups_rule_not_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_rule_updated(['fake_sgid3', 'fake_sgid4'])
-        self.agent.refresh_firewall.assert_has_calls([])
+        self.assertFalse(self.agent.refresh_firewall.called)
 
     def test_security_groups_member_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_member_updated(['fake_sgid2', 'fake_sgid3'])
-        self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['fake_device']))
 
     def test_security_groups_member_not_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.prepare_devices_filter(['fake_port_id'])
         self.agent.security_groups_member_updated(['fake_sgid3', 'fake_sgid4'])
-        self.agent.refresh_firewall.assert_has_calls([])
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_groups_updated_only_refreshes_members(self):
+        other_device = {'device': 'other_device',
+                        'security_groups': ['fake_sgid3'],
+                        'security_group_source_groups': ['fake_sgid3'],
+                        'security_group_rules': []}
+        self.firewall.ports['other_device'] = other_device
+        self.rpc.security_group_rules_for_devices.return_value = {
+            'fake_device': self.fake_device,
+            'other_device': other_device}
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_device', 'other_device'])
+        self.agent.security_groups_member_updated(['fake_sgid3'])
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['other_device']))
+
+    def test_security_groups_removed_device_not_updated(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.remove_devices_filter(['fake_device'])
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_groups_member_updates_are_delayed(self):
+        cfg.CONF.set_override('refresh_firewall_delay', 1,
+                              group='SECURITYGROUP')
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        with mock.patch('eventlet.spawn_after') as spawn_after:
+            self.agent.security_groups_member_updated(['fake_sgid2'])
+            self.agent.security_groups_rule_updated(['fake_sgid1'])
+        spawn_after.assert_called_once_with(
+            1, self.agent._refresh_devices_to_refilter)
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.agent._refresh_devices_to_refilter()
+        self.agent.refresh_firewall.assert_called_once_with(
+            set(['fake_device']))
+        self.assertIsNone(self.agent.refresh_timer)
+        self.assertEqual(self.agent.devices_to_refilter, set())
 
     def test_security_groups_provider_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.security_groups_provider_updated()
-        self.agent.refresh_firewall.assert_has_calls(
-            [call.refresh_firewall()])
+        self.agent.refresh_firewall.assert_called_once_with()
 
     def test_refresh_firewall(self):
         self.agent.prepare_devices_filter(['fake_port_id'])
@@ -471,6 +600,58 @@ class SecurityGroupAgentRpcTestCase(unittest.TestCase):
                  call.update_port_filter(self.fake_device)]
         self.firewall.assert_has_calls(calls)
 
+    def test_refresh_firewall_devices(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.refresh_firewall(['fake_device', 'removed_device'])
+        self.rpc.security_group_rules_for_devices.assert_called_with(
+            None, ['fake_device'])
+        self.firewall.update_port_filter.assert_called_once_with(
+            self.fake_device)
+
+
+class SecurityGroupAgentRpcWithIpsetTestCase(unittest.TestCase):
+    def setUp(self):
+        cfg.CONF.set_override('enable_ipset', True, group='SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.agent.init_firewall()
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.agent.firewall = self.firewall
+        self.agent.plugin_rpc = mock.Mock()
+        self.fake_device = {'device': 'fake_device',
+                            'security_groups': ['fake_sgid1'],
+                            'security_group_source_groups': ['fake_sgid2'],
+                            'security_group_rules': [{'security_group_id':
+                                                      'fake_sgid1',
+                                                      'source_group_id':
+                                                      'fake_sgid2'}]}
+        fake_devices = {'fake_device': self.fake_device}
+        self.firewall.ports = fake_devices
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = {
+            'devices': fake_devices,
+            'sg_member_ips': {'fake_sgid2': {'IPv4': ['10.0.0.2'],
+                                             'IPv6': []}}}
+
+    def test_prepare_devices_filter_updates_members(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_members(
+                'fake_sgid2', {'IPv4': ['10.0.0.2'], 'IPv6': []}),
+             call.defer_apply(),
+             call.prepare_port_filter(self.fake_device)])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+
+    def test_refresh_firewall(self):
+        self.agent.refresh_firewall()
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', {'IPv4': ['10.0.0.2'], 'IPv6': []})
+        # the rules of the device did not change
+        self.assertFalse(self.firewall.update_port_filter.called)
+
 
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
@@ -493,6 +674,15 @@ class SecurityGroupServerRpcApiTestCase(unittest.TestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+                  {'args': {'devices': ['fake_device']},
+                   'method': 'security_group_info_for_devices'},
+                  version='1.2',
+                  topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -579,20 +769,20 @@ IPTABLES_FILTER_1 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
 -A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
@@ -616,13 +806,14 @@ IPTABLES_FILTER_1_2 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -630,7 +821,6 @@ IPTABLES_FILTER_1_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
@@ -658,13 +848,16 @@ IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -672,7 +865,6 @@ IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
@@ -683,7 +875,6 @@ IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-o_port1 -j RETURN
 -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -691,7 +882,6 @@ IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
 -A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
@@ -717,31 +907,16 @@ IPTABLES_FILTER_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
--A %(bn)s-i_port1 -m state --state INVALID -j DROP
--A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
--A %(bn)s-i_port1 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port1 ! -s 10.0.0.3 -j DROP
--A %(bn)s-o_port1 -p udp --sport 67 --dport 68 -j DROP
--A %(bn)s-o_port1 -m state --state INVALID -j DROP
--A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j RETURN
--A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -749,7 +924,6 @@ IPTABLES_FILTER_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
 -A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
@@ -759,6 +933,22 @@ IPTABLES_FILTER_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-o_port2 -j RETURN
 -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
+-A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
+-A %(bn)s-o_port1 ! -s 10.0.0.3 -j DROP
+-A %(bn)s-o_port1 -p udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port1 -m state --state INVALID -j DROP
+-A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-o_port1 -j RETURN
+-A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
@@ -775,13 +965,16 @@ IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -790,7 +983,6 @@ IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port1 -j RETURN -p icmp
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
@@ -801,7 +993,6 @@ IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-o_port1 -j RETURN
 -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
@@ -810,7 +1001,6 @@ IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-i_port2 -j RETURN -p icmp
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
 -A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
@@ -838,6 +1028,7 @@ IPTABLES_FILTER_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
+-A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
 IPTABLES_ARG['chains'] = CHAINS_1
@@ -852,18 +1043,18 @@ IPTABLES_FILTER_V6_1 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p icmpv6 -j RETURN
@@ -887,18 +1078,20 @@ IPTABLES_FILTER_V6_2 = """:%(bn)s-(%(chains)s) - [0:0]
 :quantum-filter-top - [0:0]
 -A FORWARD -j quantum-filter-top
 -A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A quantum-filter-top -j %(bn)s-local
 -A INPUT -j %(bn)s-INPUT
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
 -A %(bn)s-o_port1 -p icmpv6 -j RETURN
@@ -906,18 +1099,63 @@ IPTABLES_FILTER_V6_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
+-A %(bn)s-o_port2 -p icmpv6 -j RETURN
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain -j ACCEPT
+""" % IPTABLES_ARG
+
+IPTABLES_FILTER_V6_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:quantum-filter-top - [0:0]
+-A FORWARD -j quantum-filter-top
+-A OUTPUT -j quantum-filter-top
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A quantum-filter-top -j %(bn)s-local
+-A INPUT -j %(bn)s-INPUT
+-A OUTPUT -j %(bn)s-OUTPUT
+-A FORWARD -j %(bn)s-FORWARD
+-A %(bn)s-sg-fallback -j DROP
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
 -A %(bn)s-o_port2 -p icmpv6 -j RETURN
 -A %(bn)s-o_port2 -m state --state INVALID -j DROP
 -A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+-A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
+-A %(bn)s-o_port1 -p icmpv6 -j RETURN
+-A %(bn)s-o_port1 -m state --state INVALID -j DROP
+-A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
@@ -936,6 +1174,7 @@ IPTABLES_FILTER_V6_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
 -A OUTPUT -j %(bn)s-OUTPUT
 -A FORWARD -j %(bn)s-FORWARD
 -A %(bn)s-sg-fallback -j DROP
+-A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
 FIREWALL_BASE_PACKAGE = 'quantum.agent.linux.iptables_firewall.'
@@ -957,6 +1196,8 @@ class TestSecurityGroupAgentWithIptables(unittest.TestCase):
             'firewall_driver',
             self.FIREWALL_DRIVER,
             group='SECURITYGROUP')
+        cfg.CONF.set_override('refresh_firewall_delay', 0,
+                              group='SECURITYGROUP')
         self.addCleanup(mock.patch.stopall)
         self.addCleanup(self.mox.UnsetStubs)
 
@@ -1084,7 +1325,7 @@ class TestSecurityGroupAgentWithIptables(unittest.TestCase):
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
         self._replay_iptables(IPTABLES_FILTER_1_2, IPTABLES_FILTER_V6_1)
         self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_2, IPTABLES_FILTER_V6_2)
+        self._replay_iptables(IPTABLES_FILTER_2_2, IPTABLES_FILTER_V6_2_2)
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
         self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
         self.mox.ReplayAll()
@@ -15,6 +15,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+import os
+import signal
 import socket
 
 import mock
@@ -23,6 +26,7 @@ import unittest2 as unittest
 from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import exceptions as exception
+from quantum.openstack.common import service as common_service
 from quantum import wsgi
 
 
@@ -81,6 +85,109 @@ class TestWSGIServer(unittest.TestCase):
                             mock_listen.return_value)
                     ])
 
+    def test_start_with_workers(self):
+        server = wsgi.Server("test_workers")
+        with mock.patch.object(wsgi.eventlet, 'listen'):
+            with mock.patch.object(wsgi.common_service,
+                                   'ProcessLauncher') as launcher_cls:
+                with mock.patch.object(wsgi.api, 'dispose_db') as dispose_db:
+                    server.start(None, 1234, host="127.0.0.1", workers=3)
+                dispose_db.assert_called_once_with()
+                launcher = launcher_cls.return_value
+                launcher.launch_service.assert_called_once_with(
+                    server._server, workers=3)
+                self.assertIsInstance(server._server, wsgi.WorkerService)
+                server.wait()
+                launcher.wait.assert_called_once_with()
+
+
+class TestWorkerService(unittest.TestCase):
+    """WSGI worker process tests."""
+
+    def test_start_resets_connections(self):
+        server = mock.Mock()
+        with mock.patch.object(wsgi.api, 'forget_db_connections') as forget:
+            with mock.patch.object(wsgi.rpc, 'reset') as rpc_reset:
+                worker = wsgi.WorkerService(server, 'app')
+                worker.start()
+                forget.assert_called_once_with()
+                rpc_reset.assert_called_once_with()
+                server.pool.spawn.assert_called_once_with(
+                    server._run, 'app', server._socket)
+
+    def test_stop_waits_for_requests(self):
+        server = mock.Mock()
+        with mock.patch.object(wsgi.api, 'forget_db_connections'):
+            with mock.patch.object(wsgi.rpc, 'reset'):
+                worker = wsgi.WorkerService(server, 'app')
+                worker.start()
+                worker.stop()
+                server.pool.spawn.return_value.kill.assert_called_once_with()
+                server.pool.waitall.assert_called_once_with()
+
+
+class TestWorkerLauncher(unittest.TestCase):
+    """Respawning and restarting of the WSGI worker processes."""
+
+    def setUp(self):
+        super(TestWorkerLauncher, self).setUp()
+        for signo in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            self.addCleanup(signal.signal, signo, signal.getsignal(signo))
+        self.launcher = common_service.ProcessLauncher()
+        self.addCleanup(os.close, self.launcher.writepipe)
+        self.addCleanup(self.launcher.readpipe.close)
+        self.wrap = common_service.ServiceWrapper(mock.Mock(), 2)
+        for pid in (1001, 1002):
+            self.wrap.children.add(pid)
+            self.launcher.children[pid] = self.wrap
+        self.kill = mock.patch.object(common_service.os, 'kill').start()
+        self.addCleanup(mock.patch.stopall)
+        pids = itertools.count(2001)
+
+        def start_child(wrap):
+            pid = pids.next()
+            wrap.children.add(pid)
+            self.launcher.children[pid] = wrap
+            return pid
+
+        self.start_child = mock.patch.object(
+            self.launcher, '_start_child', side_effect=start_child).start()
+
+    def _wait(self, exited_pids):
+        exited_pids = list(exited_pids)
+
+        def wait_child():
+            if not exited_pids:
+                # Stop the loop, the remaining children are then killed
+                self.launcher.running = False
+                self.launcher.children.clear()
+                return None
+            pid = exited_pids.pop(0)
+            wrap = self.launcher.children.pop(pid)
+            wrap.children.remove(pid)
+            return wrap
+
+        with mock.patch.object(self.launcher, '_wait_child',
+                               side_effect=wait_child):
+            self.launcher.wait()
+
+    def test_dead_child_respawned(self):
+        self._wait([1001])
+        self.start_child.assert_called_once_with(self.wrap)
+        self.assertFalse(self.kill.called)
+
+    def test_sighup_restarts_children(self):
+        self.launcher._handle_sighup(signal.SIGHUP, None)
+        self.assertTrue(self.launcher.sighup_caught)
+        self._wait([1001, 1002])
+        self.assertFalse(self.launcher.sighup_caught)
+        self.assertEqual(sorted(args for args, kwargs
+                                in self.kill.call_args_list),
+                         [(1001, signal.SIGTERM), (1002, signal.SIGTERM)])
+        # Each killed child is started again
+        self.assertEqual(self.start_child.call_args_list,
+                         [mock.call(self.wrap), mock.call(self.wrap)])
+
 
 class SerializerTest(unittest.TestCase):
     def test_serialize_unknown_content_type(self):
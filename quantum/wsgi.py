@@ -32,8 +32,11 @@ import webob.exc
 from quantum.common import constants
 from quantum.common import exceptions as exception
 from quantum import context
+from quantum.db import api
 from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
+from quantum.openstack.common import rpc
+from quantum.openstack.common import service as common_service
 
 LOG = logging.getLogger(__name__)
 
@@ -44,15 +47,52 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Runs the WSGI server of a Server in a forked worker process."""
+
+    def __init__(self, service, application):
+        self._service = service
+        self._application = application
+        self._server = None
+
+    def start(self):
+        # The database and AMQP connections were opened by the parent
+        # process, they must not be shared with it: drop them without
+        # closing them so that the worker opens its own ones on demand.
+        api.forget_db_connections()
+        rpc.reset()
+        self._server = self._service.pool.spawn(self._service._run,
+                                                self._application,
+                                                self._service._socket)
+
+    def wait(self):
+        self._service.pool.waitall()
+
+    def stop(self):
+        # Stop accepting new connections and let the requests in progress
+        # complete before the worker exits
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+            self._service.pool.waitall()
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
     def __init__(self, name, threads=1000):
         self.pool = eventlet.GreenPool(threads)
         self.name = name
+        self._launcher = None
+
+    def start(self, application, port, host='0.0.0.0', backlog=128,
+              workers=0):
+        """Run a WSGI server with the given application.
 
-    def start(self, application, port, host='0.0.0.0', backlog=128):
-        """Run a WSGI server with the given application."""
+        When workers is greater than 0, the server is run in that number of
+        forked processes sharing the listening socket; they are respawned
+        by the parent process if they die.
+        """
         self._host = host
         self._port = port
 
@@ -75,7 +115,16 @@ class Server(object):
                           {'host': host, 'port': port})
             sys.exit(1)
 
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        if workers < 1:
+            self._server = self.pool.spawn(self._run, application,
+                                           self._socket)
+        else:
+            # The children inherit no database connection, the parent opens
+            # new ones when it needs them
+            api.dispose_db()
+            self._launcher = common_service.ProcessLauncher()
+            self._server = WorkerService(self, application)
+            self._launcher.launch_service(self._server, workers=workers)
 
     @property
     def host(self):
@@ -86,12 +135,19 @@ class Server(object):
         return self._socket.getsockname()[1] if self._socket else self._port
 
     def stop(self):
-        self._server.kill()
+        if self._launcher:
+            # The workers are stopped by the launcher when it is signaled
+            self._launcher.running = False
+        else:
+            self._server.kill()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if self._launcher:
+                self._launcher.wait()
+            else:
+                self.pool.waitall()
         except KeyboardInterrupt:
             pass
 
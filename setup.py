@@ -132,6 +132,7 @@ else:
 
     ProjectScripts = [
         'bin/quantum-rootwrap',
+        'bin/quantum-rootwrap-daemon',
     ]
 
 